@@ -0,0 +1,167 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Benchmark of memory use when uploading a large CSV to the datastore: reading every row into a list before
+uploading (old behaviour) versus streaming chunks from the csv.DictReader with Resource.create_datastore.
+
+Generates a CSV of the requested number of rows and serves it, along with a stub CKAN action API, from a local
+keep-alive HTTP server, so no network access is needed. Each mode runs in its own process and samples its resident
+set size (RSS) while uploading, so the peaks are comparable (Linux only as RSS is read from /proc).
+
+Usage: python benchmarks/benchmark_datastore_memory.py [number of rows] [modes eg. new,old]
+"""
+import csv
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from os.path import join, dirname, abspath
+from socketserver import ThreadingMixIn
+from threading import Thread, Event
+
+sys.path.insert(0, join(dirname(abspath(__file__)), '..'))
+
+from hdx.configuration import Configuration
+from hdx.data.resource import Resource
+
+
+class CKANHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    csv_path = None
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        body = json.dumps({'success': True, 'result': {}}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/csv')
+        self.send_header('Content-Length', str(os.path.getsize(CKANHandler.csv_path)))
+        self.end_headers()
+        with open(CKANHandler.csv_path, 'rb') as f:
+            shutil.copyfileobj(f, self.wfile, 1048576)
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def get_rss_mb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+class RSSSampler(Thread):
+    def __init__(self, interval=0.2):
+        super(RSSSampler, self).__init__(daemon=True)
+        self.interval = interval
+        self.samples = list()
+        self.stopped = Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.samples.append(get_rss_mb())
+            time.sleep(self.interval)
+
+
+def generate_csv(path, number_rows):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['code', 'title', 'value', 'latest_date', 'source'])
+        for i in range(number_rows):
+            writer.writerow(['C%d' % i, 'Indicator title %d' % (i % 1000), i * 0.5, '2016-06-%02d' % (i % 28 + 1),
+                             'Source %d' % (i % 50)])
+
+
+def old_create_datastore(resource):
+    """Upload as Resource.create_datastore did before streaming: all rows are read into a list first"""
+    url, path = resource.download()
+    try:
+        with open(path, 'r') as f:
+            reader = csv.DictReader(f)
+            schema = [{'id': fieldname, 'type': 'text'} for fieldname in reader.fieldnames]
+            resource._write_to_hdx('datastore_create', {'resource_id': resource['id'], 'force': True,
+                                                        'fields': schema, 'primary_key': None}, 'id')
+            rows = [row for row in reader]
+            chunksize = 1024
+            offset = 0
+            while offset < len(rows):
+                rowset = rows[offset:offset + chunksize]
+                resource._write_to_hdx('datastore_upsert', {'resource_id': resource['id'], 'force': True,
+                                                            'method': 'insert', 'records': rowset}, 'id')
+                offset += chunksize
+    finally:
+        os.unlink(path)
+
+
+def run_mode(mode, csv_path):
+    CKANHandler.csv_path = csv_path
+    server = ThreadingServer(('127.0.0.1', 0), CKANHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://127.0.0.1:%d/' % server.server_address[1]
+    keyfile = tempfile.NamedTemporaryFile('w', delete=False)
+    keyfile.write('12345')
+    keyfile.close()
+    configuration = Configuration(hdx_key_file=keyfile.name, project_config_dict={},
+                                  hdx_config_dict={'hdx_test_site': {'url': url, 'username': None,
+                                                                     'password': None}})
+    os.unlink(keyfile.name)
+    resource = Resource(configuration, {'id': 'benchmark', 'name': 'benchmark', 'url': '%sdata.csv' % url})
+    baseline = get_rss_mb()
+    sampler = RSSSampler()
+    sampler.start()
+    start = time.perf_counter()
+    if mode == 'old':
+        old_create_datastore(resource)
+    else:
+        resource.create_datastore()
+    elapsed = time.perf_counter() - start
+    sampler.stopped.set()
+    sampler.join()
+    server.shutdown()
+    samples = sampler.samples
+    quartiles = [samples[int(len(samples) * q / 4) - (1 if q == 4 else 0)] for q in range(1, 5)]
+    print(json.dumps({'mode': mode, 'seconds': elapsed, 'baseline_mb': baseline, 'peak_mb': max(samples),
+                      'quartiles_mb': quartiles}))
+
+
+def run(number_rows, modes):
+    folder = tempfile.mkdtemp()
+    try:
+        csv_path = join(folder, 'data.csv')
+        generate_csv(csv_path, number_rows)
+        size_mb = os.path.getsize(csv_path) / 1048576
+        print('CSV with %d rows (%.0f MB)' % (number_rows, size_mb))
+        for mode in modes:
+            output = subprocess.check_output([sys.executable, abspath(__file__), '--mode', mode, csv_path])
+            result = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+            print('  %-6s %6.1f s  RSS baseline %6.1f MB  peak %7.1f MB  at 25/50/75/100%% of run: %s' %
+                  (mode, result['seconds'], result['baseline_mb'], result['peak_mb'],
+                   ' / '.join('%.1f' % x for x in result['quartiles_mb'])))
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--mode':
+        run_mode(sys.argv[2], sys.argv[3])
+    else:
+        number_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2000000
+        modes = sys.argv[2].split(',') if len(sys.argv) > 2 else ['new', 'old']
+        run(number_rows, modes)
@@ -0,0 +1,137 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Benchmark of reading a large table back from the datastore: offset paging with datastore_search (LIMIT/OFFSET)
+versus keyset paging with Resource.iter_datastore_rows.
+
+Serves a stub CKAN action API from a local keep-alive HTTP server backed by an in-memory SQLite table of the
+requested number of rows, so no network access is needed. Like PostgreSQL, SQLite has to skip over all the rows
+before the offset, so offset pages get slower the deeper they are, while keyset pages use the primary key index.
+The rate in rows per second is reported for each tenth of the table.
+
+Usage: python benchmarks/benchmark_datastore_paging.py [number of rows] [page size]
+"""
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from os.path import join, dirname, abspath
+from socketserver import ThreadingMixIn
+from threading import Thread, Lock
+
+sys.path.insert(0, join(dirname(abspath(__file__)), '..'))
+
+from hdx.configuration import Configuration
+from hdx.data.resource import Resource
+
+RESOURCE_ID = 'benchmark'
+
+
+class CKANHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    connection = None
+    lock = Lock()
+
+    def query(self, sql, parameters=()):
+        with CKANHandler.lock:
+            cursor = CKANHandler.connection.execute(sql, parameters)
+            names = [description[0] for description in cursor.description]
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        data = json.loads(self.rfile.read(length).decode('utf-8'))
+        action = self.path.rsplit('/', 1)[-1]
+        if action == 'datastore_search_sql':
+            result = {'records': self.query(data['sql'])}
+        elif action == 'datastore_search':
+            records = self.query('SELECT * FROM "%s" ORDER BY "_id" LIMIT ? OFFSET ?' % RESOURCE_ID,
+                                 (data['limit'], data['offset']))
+            result = {'records': records}
+        else:
+            result = {}
+        body = json.dumps({'success': True, 'result': result}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def create_table(number_rows):
+    connection = sqlite3.connect(':memory:', check_same_thread=False)
+    connection.execute('CREATE TABLE "%s" ("_id" INTEGER PRIMARY KEY, "_full_text" TEXT, "code" TEXT, '
+                       '"title" TEXT, "value" REAL, "latest_date" TEXT)' % RESOURCE_ID)
+    connection.executemany('INSERT INTO "%s" VALUES (?, ?, ?, ?, ?, ?)' % RESOURCE_ID,
+                           ((i + 1, 'C%d Indicator title %d' % (i, i % 1000), 'C%d' % i,
+                             'Indicator title %d' % (i % 1000), i * 0.5, '2016-06-%02d' % (i % 28 + 1))
+                            for i in range(number_rows)))
+    connection.commit()
+    return connection
+
+
+def offset_rows(resource, page_size):
+    """Read rows with datastore_search offset paging"""
+    offset = 0
+    while True:
+        success, result = resource._read_from_hdx('datastore', resource['id'], 'resource_id', 'datastore_search',
+                                                  limit=page_size, offset=offset)
+        records = result['records']
+        for record in records:
+            yield record
+        if len(records) < page_size:
+            break
+        offset += page_size
+
+
+def measure(mode, rows, number_rows):
+    tenth = max(number_rows // 10, 1)
+    rates = list()
+    count = 0
+    start = time.perf_counter()
+    last = start
+    for _ in rows:
+        count += 1
+        if count % tenth == 0:
+            now = time.perf_counter()
+            rates.append(tenth / (now - last))
+            last = now
+    elapsed = time.perf_counter() - start
+    print('  %-7s %7.1f s  %9.0f rows/s overall  per tenth of table (rows/s): %s' %
+          (mode, elapsed, count / elapsed, ' '.join('%.0f' % rate for rate in rates)))
+
+
+def run(number_rows, page_size):
+    print('Creating table with %d rows' % number_rows)
+    CKANHandler.connection = create_table(number_rows)
+    server = ThreadingServer(('127.0.0.1', 0), CKANHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://127.0.0.1:%d/' % server.server_address[1]
+    keyfile = tempfile.NamedTemporaryFile('w', delete=False)
+    keyfile.write('12345')
+    keyfile.close()
+    configuration = Configuration(hdx_key_file=keyfile.name, project_config_dict={},
+                                  hdx_config_dict={'hdx_test_site': {'url': url, 'username': None,
+                                                                     'password': None}})
+    os.unlink(keyfile.name)
+    resource = Resource(configuration, {'id': RESOURCE_ID, 'name': 'benchmark'})
+    print('Page size %d' % page_size)
+    measure('keyset', resource.iter_datastore_rows(page_size=page_size), number_rows)
+    measure('offset', offset_rows(resource, page_size), number_rows)
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    number_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2000000
+    page_size = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    run(number_rows, page_size)
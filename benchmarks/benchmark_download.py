@@ -0,0 +1,130 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Benchmark of Download.stream_file and Download.hash_stream throughput: the old path (1 KiB chunks from
+iter_content with a flush after every chunk) versus reading into a reusable buffer of various sizes. Also compares
+getting a local copy and its checksums with two downloads (hash_stream then stream_file) against a single
+stream_file_with_hashes that hashes as it writes.
+
+Serves a generated file of the requested size from a local keep-alive HTTP server, so no network access is needed.
+The rate in MB/s is reported for downloading to a file and for hashing.
+
+Usage: python benchmarks/benchmark_download.py [size in MB] [buffer sizes in KiB eg. 1024,4096,8192]
+"""
+import hashlib
+import os
+import sys
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from os.path import join, dirname, abspath
+from socketserver import ThreadingMixIn
+from threading import Thread
+
+sys.path.insert(0, join(dirname(abspath(__file__)), '..'))
+
+from hdx.utilities.downloader import Download
+
+
+class FileHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    block = os.urandom(1048576)
+    size_mb = 0
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(len(self.block) * self.size_mb))
+        self.end_headers()
+        for _ in range(self.size_mb):
+            self.wfile.write(self.block)
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def old_stream_file(download, url, folder):
+    """Download as Download.stream_file did before: 1 KiB chunks with a flush after every chunk"""
+    path = download.get_path_for_url(url, folder)
+    with open(path, 'wb') as f:
+        for chunk in download.response.iter_content(chunk_size=1024):
+            if chunk:
+                f.write(chunk)
+                f.flush()
+    return path
+
+
+def old_hash_stream(download, url):
+    """Hash as Download.hash_stream did before: 1 KiB chunks"""
+    md5hash = hashlib.md5()
+    for chunk in download.response.iter_content(chunk_size=1024):
+        if chunk:
+            md5hash.update(chunk)
+    return md5hash.hexdigest()
+
+
+def measure(url, folder, size_mb, buffer_size):
+    rates = list()
+    with Download(buffer_size=buffer_size) as download:
+        for operation in ('stream_file', 'hash_stream'):
+            download.setup_stream(url)
+            start = time.perf_counter()
+            if buffer_size is None:
+                if operation == 'stream_file':
+                    os.unlink(old_stream_file(download, url, folder))
+                else:
+                    old_hash_stream(download, url)
+            else:
+                if operation == 'stream_file':
+                    os.unlink(download.stream_file(url, folder))
+                else:
+                    download.hash_stream(url)
+            rates.append(size_mb / (time.perf_counter() - start))
+    return rates
+
+
+def measure_hashing(url, folder, size_mb, algorithms):
+    with Download() as download:
+        start = time.perf_counter()
+        download.setup_stream(url)
+        download.hash_stream(url, algorithms)
+        download.setup_stream(url)
+        os.unlink(download.stream_file(url, folder))
+        two_pass = size_mb / (time.perf_counter() - start)
+        start = time.perf_counter()
+        download.setup_stream(url)
+        path, _ = download.stream_file_with_hashes(url, algorithms, folder)
+        os.unlink(path)
+        single_pass = size_mb / (time.perf_counter() - start)
+    print('  %-18s  two downloads %7.1f MB/s  single pass %7.1f MB/s' % (','.join(algorithms), two_pass,
+                                                                         single_pass))
+
+
+def run(size_mb, buffer_sizes):
+    FileHandler.size_mb = size_mb
+    server = ThreadingServer(('127.0.0.1', 0), FileHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://127.0.0.1:%d/data.bin' % server.server_address[1]
+    folder = tempfile.mkdtemp()
+    print('File of %d MB' % size_mb)
+    try:
+        for buffer_size in [None] + buffer_sizes:
+            name = 'old 1 KiB' if buffer_size is None else '%d KiB' % (buffer_size // 1024)
+            stream_rate, hash_rate = measure(url, folder, size_mb, buffer_size)
+            print('  %-10s  stream_file %7.1f MB/s  hash_stream %7.1f MB/s' % (name, stream_rate, hash_rate))
+        print('Local copy and checksums')
+        for algorithms in (['md5'], ['md5', 'sha1', 'sha256']):
+            measure_hashing(url, folder, size_mb, algorithms)
+    finally:
+        os.rmdir(folder)
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 1024
+    buffer_sizes = [int(x) * 1024 for x in sys.argv[2].split(',')] if len(sys.argv) > 2 else \
+        [65536, 1048576, 4194304, 8388608]
+    run(size_mb, buffer_sizes)
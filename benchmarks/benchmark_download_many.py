@@ -0,0 +1,98 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Benchmark of downloading many files from several hosts: one after the other with Download.download_file (as a
+loop over Resource.download does) versus Download.download_many with various per host limits.
+
+Serves generated files from local keep-alive HTTP servers, one per simulated host (each on its own port), that wait
+for the given latency before answering, so no network access is needed. The total time and files per second are
+reported.
+
+Usage: python benchmarks/benchmark_download_many.py [number of files] [number of hosts] [latency in ms] [size in KB]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from os.path import join, dirname, abspath
+from socketserver import ThreadingMixIn
+from threading import Thread
+
+sys.path.insert(0, join(dirname(abspath(__file__)), '..'))
+
+from hdx.utilities.downloader import Download
+
+
+class FileHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    content = b''
+    latency = 0.0
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/csv')
+        self.send_header('Content-Length', str(len(self.content)))
+        self.end_headers()
+        self.wfile.write(self.content)
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def measure(name, function, number_files):
+    folder = tempfile.mkdtemp()
+    try:
+        start = time.perf_counter()
+        function(folder)
+        elapsed = time.perf_counter() - start
+    finally:
+        shutil.rmtree(folder)
+    print('  %-28s %7.2f s  %7.1f files/s' % (name, elapsed, number_files / elapsed))
+
+
+def run(number_files, number_hosts, latency_ms, size_kb):
+    FileHandler.content = os.urandom(size_kb * 1024)
+    FileHandler.latency = latency_ms / 1000
+    servers = list()
+    for _ in range(number_hosts):
+        server = ThreadingServer(('127.0.0.1', 0), FileHandler)
+        Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+    urls = ['http://127.0.0.1:%d/file%d.csv' % (servers[i % number_hosts].server_address[1], i)
+            for i in range(number_files)]
+    print('%d files of %d KB from %d hosts with %d ms latency' % (number_files, size_kb, number_hosts, latency_ms))
+
+    def sequential(folder):
+        with Download() as download:
+            for url in urls:
+                download.download_file(url, folder)
+
+    def concurrent(per_host_limit, folder):
+        with Download() as download:
+            for url, path, error in download.download_many(urls, folder, max_workers=16,
+                                                           per_host_limit=per_host_limit):
+                if error is not None:
+                    raise error
+
+    try:
+        measure('sequential', sequential, number_files)
+        for per_host_limit in (1, 2, 4):
+            measure('download_many per host %d' % per_host_limit,
+                    lambda folder: concurrent(per_host_limit, folder), number_files)
+    finally:
+        for server in servers:
+            server.shutdown()
+
+
+if __name__ == '__main__':
+    number_files = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    number_hosts = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    latency_ms = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+    size_kb = int(sys.argv[4]) if len(sys.argv) > 4 else 256
+    run(number_files, number_hosts, latency_ms, size_kb)
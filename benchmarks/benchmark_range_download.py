@@ -0,0 +1,104 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Benchmark of segmented downloads with Download.download_file_segmented versus a single stream.
+
+Serves a generated file of the requested size from a local range-capable HTTP server that limits the bandwidth of
+each connection and delays the start of each response, as on a high-latency link where throughput is bound by the
+TCP window of each connection rather than by the total bandwidth. The rate in MB/s is reported for each number of
+segments.
+
+Usage: python benchmarks/benchmark_range_download.py [size in MB] [MB/s per connection] [segments eg. 1,2,4,8]
+"""
+import os
+import sys
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from os.path import join, dirname, abspath
+from socketserver import ThreadingMixIn
+from threading import Thread
+
+sys.path.insert(0, join(dirname(abspath(__file__)), '..'))
+
+from hdx.utilities.downloader import Download
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    content = b''
+    rate = 10.0
+    latency = 0.1
+    block_size = 65536
+
+    def send_content(self, include_body):
+        content = self.content
+        status = 200
+        headers = {'Accept-Ranges': 'bytes', 'ETag': '"benchmark"'}
+        requested_range = self.headers.get('Range')
+        start = 0
+        end = len(content) - 1
+        if requested_range:
+            start, end = (int(x) for x in requested_range.split('=')[1].split('-'))
+            headers['Content-Range'] = 'bytes %d-%d/%d' % (start, end, len(content))
+            status = 206
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        if not include_body:
+            return
+        time.sleep(self.latency)
+        view = memoryview(content)
+        seconds_per_block = self.block_size / (self.rate * 1048576)
+        next_time = time.perf_counter()
+        for offset in range(start, end + 1, self.block_size):
+            self.wfile.write(view[offset:min(offset + self.block_size, end + 1)])
+            next_time += seconds_per_block
+            delay = next_time - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    def do_GET(self):
+        self.send_content(True)
+
+    def do_HEAD(self):
+        self.send_content(False)
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def run(size_mb, rate, segment_counts):
+    RangeHandler.content = os.urandom(size_mb * 1048576)
+    RangeHandler.rate = rate
+    server = ThreadingServer(('127.0.0.1', 0), RangeHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://127.0.0.1:%d/data.bin' % server.server_address[1]
+    folder = tempfile.mkdtemp()
+    print('File of %d MB, each connection limited to %.0f MB/s' % (size_mb, rate))
+    try:
+        for segments in segment_counts:
+            with Download() as download:
+                start = time.perf_counter()
+                path = download.download_file(url, folder, segments=segments)
+                elapsed = time.perf_counter() - start
+            with open(path, 'rb') as f:
+                assert f.read() == RangeHandler.content
+            os.unlink(path)
+            print('  %d segment%s  %6.1f s  %7.1f MB/s' % (segments, ' ' if segments == 1 else 's', elapsed,
+                                                           size_mb / elapsed))
+    finally:
+        os.rmdir(folder)
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rate = float(sys.argv[2]) if len(sys.argv) > 2 else 20.0
+    segment_counts = [int(x) for x in sys.argv[3].split(',')] if len(sys.argv) > 3 else [1, 2, 4, 8]
+    run(size_mb, rate, segment_counts)
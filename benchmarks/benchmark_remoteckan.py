@@ -0,0 +1,118 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Benchmark of HDX object construction cost and connection reuse: one RemoteCKAN per object (old behaviour)
+versus the shared, pooled client from RemoteCKANRegistry.
+
+Runs against a local keep-alive HTTP server that emulates the CKAN action API, so no network access is needed.
+
+Usage: python benchmarks/benchmark_remoteckan.py [number of objects] [number of calls]
+"""
+import json
+import sys
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from os import unlink
+from os.path import join, dirname, abspath
+from socketserver import ThreadingMixIn
+from threading import Thread, Lock
+
+sys.path.insert(0, join(dirname(abspath(__file__)), '..'))
+
+import ckanapi
+
+from hdx.configuration import Configuration
+from hdx.data.dataset import Dataset
+from hdx.remoteckan import RemoteCKANRegistry
+from hdx.utilities.path import script_dir_plus_file
+
+
+class CKANHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    connections = 0
+    lock = Lock()
+
+    def setup(self):
+        with CKANHandler.lock:
+            CKANHandler.connections += 1
+        super(CKANHandler, self).setup()
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        body = json.dumps({'success': True, 'result': {'id': 'abc', 'name': 'abc'}}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def old_client(configuration):
+    version_file = open(script_dir_plus_file(join('..', 'version.txt'), Dataset))
+    version = version_file.read().strip()
+    return ckanapi.RemoteCKAN(configuration.get_hdx_site_url(), apikey=configuration.get_api_key(),
+                              user_agent='HDXPythonLibrary/%s' % version)
+
+
+def run(number_objects, number_calls):
+    server = ThreadingServer(('127.0.0.1', 0), CKANHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://127.0.0.1:%d/' % server.server_address[1]
+    keyfile = tempfile.NamedTemporaryFile('w', delete=False)
+    keyfile.write('12345')
+    keyfile.close()
+    configuration = Configuration(hdx_key_file=keyfile.name, project_config_dict={},
+                                  hdx_config_dict={'hdx_test_site': {'url': url, 'username': None,
+                                                                     'password': None}})
+    unlink(keyfile.name)
+
+    start = time.perf_counter()
+    for _ in range(number_objects):
+        old_client(configuration)
+    old_construct = time.perf_counter() - start
+    RemoteCKANRegistry.clear()
+    start = time.perf_counter()
+    for _ in range(number_objects):
+        RemoteCKANRegistry.get_remoteckan(configuration)
+    new_construct = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(number_objects):
+        Dataset(configuration)
+    dataset_construct = time.perf_counter() - start
+
+    CKANHandler.connections = 0
+    start = time.perf_counter()
+    for _ in range(number_calls):
+        old_client(configuration).call_action('package_show', {'id': 'abc'})
+    old_calls = time.perf_counter() - start
+    old_connections = CKANHandler.connections
+
+    CKANHandler.connections = 0
+    start = time.perf_counter()
+    for _ in range(number_calls):
+        Dataset(configuration).hdxpostsite.call_action('package_show', {'id': 'abc'})
+    new_calls = time.perf_counter() - start
+    new_connections = CKANHandler.connections
+    server.shutdown()
+
+    print('Client construction for %d objects:' % number_objects)
+    print('  one RemoteCKAN per object: %.1f us/object' % (old_construct / number_objects * 1e6))
+    print('  shared registry client:    %.1f us/object' % (new_construct / number_objects * 1e6))
+    print('  full Dataset construction: %.1f us/object' % (dataset_construct / number_objects * 1e6))
+    print('%d package_show calls each from a new object:' % number_calls)
+    print('  one RemoteCKAN per object: %.2f s, %d TCP connections' % (old_calls, old_connections))
+    print('  shared registry client:    %.2f s, %d TCP connections' % (new_calls, new_connections))
+
+
+if __name__ == '__main__':
+    arguments = [int(x) for x in sys.argv[1:]]
+    run(*(arguments + [10000, 500][len(arguments):]))
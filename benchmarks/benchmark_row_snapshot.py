@@ -0,0 +1,54 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Benchmark of diffing rows against a RowSnapshot as used by Resource.sync_datastore: time to build the snapshot
+on the first sync and to find the changed and deleted rows on a second sync where 1% of rows changed and 0.1% were
+removed.
+
+Usage: python benchmarks/benchmark_row_snapshot.py [number of rows]
+"""
+import os
+import sys
+import tempfile
+import time
+from os.path import join, dirname, abspath
+
+sys.path.insert(0, join(dirname(abspath(__file__)), '..'))
+
+from hdx.utilities.rowsnapshot import RowSnapshot
+
+
+def get_rows(number_rows, changed=False):
+    for i in range(number_rows):
+        if changed and i % 1000 == 0:
+            continue
+        value = i * 0.5
+        if changed and i % 100 == 1:
+            value = -1
+        yield {'code': 'C%d' % i, 'title': 'Indicator title %d' % (i % 1000), 'value': str(value),
+               'latest_date': '2016-06-%02d' % (i % 28 + 1), 'source': 'Source %d' % (i % 50)}
+
+
+def run(number_rows):
+    folder = tempfile.mkdtemp()
+    path = join(folder, 'snapshot.db')
+    try:
+        snapshot = RowSnapshot(path)
+        start = time.perf_counter()
+        changed = sum(1 for _ in snapshot.changed_rows(get_rows(number_rows), 'code'))
+        snapshot.commit()
+        print('First sync of %d rows: %d to upsert in %.1f s' % (number_rows, changed,
+                                                                time.perf_counter() - start))
+        start = time.perf_counter()
+        changed = sum(1 for _ in snapshot.changed_rows(get_rows(number_rows, True), 'code'))
+        deleted = sum(len(keys) for keys in snapshot.deleted_keys())
+        snapshot.commit()
+        print('Second sync: %d to upsert and %d to delete in %.1f s (snapshot file %.0f MB)' %
+              (changed, deleted, time.perf_counter() - start, os.path.getsize(path) / 1048576))
+        snapshot.close()
+    finally:
+        os.unlink(path)
+        os.rmdir(folder)
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
@@ -0,0 +1,137 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Benchmark of datastore schema inference and type coercion throughput on a wide CSV: vectorized NumPy parsing
+(TypeInferrer and coerce_rows) versus parsing each value in Python.
+
+Generates a CSV of the requested number of rows with 24 columns (text, int, float, timestamp and bool columns plus
+columns that only turn out to be text late in the file) and times reading it with csv.DictReader alone, reading and
+inferring every row and reading and coercing every row to the inferred schema.
+
+Usage: python benchmarks/benchmark_type_inference.py [number of rows] [modes eg. numpy,python]
+"""
+import csv
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+from os.path import join, dirname, abspath
+
+sys.path.insert(0, join(dirname(abspath(__file__)), '..'))
+
+from hdx.utilities.typeinference import TypeInferrer, coerce_rows
+
+BATCH_SIZE = 10000
+
+
+def generate_csv(path, number_rows):
+    fieldnames = list()
+    for i in range(4):
+        fieldnames.extend(['text%d' % i, 'int%d' % i, 'float%d' % i, 'date%d' % i, 'bool%d' % i, 'late%d' % i])
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(fieldnames)
+        for row in range(number_rows):
+            values = list()
+            for i in range(4):
+                late = str(row) if row < number_rows - 10 else 'n/a'
+                values.extend(['Name %d' % (row % 997), str(row * (i + 1)), '%.3f' % (row / 7.0),
+                               '2016-%02d-%02d' % (row % 12 + 1, row % 28 + 1), 'true' if row % 3 else 'false',
+                               late])
+            writer.writerow(values)
+    return fieldnames
+
+
+def python_is_type(value, column_type):
+    try:
+        if column_type == 'bool':
+            return value.lower() in ('true', 't', 'yes', 'y', 'false', 'f', 'no', 'n')
+        if column_type == 'int':
+            int(value)
+        elif column_type == 'float':
+            float(value)
+        else:
+            datetime.strptime(value[:10], '%Y-%m-%d')
+        return True
+    except ValueError:
+        return False
+
+
+def python_infer_schema(rows, fieldnames):
+    candidates = {fieldname: ['bool', 'int', 'float', 'timestamp'] for fieldname in fieldnames}
+    for row in rows:
+        for fieldname in fieldnames:
+            value = row[fieldname].strip()
+            if value and candidates[fieldname]:
+                candidates[fieldname] = [x for x in candidates[fieldname] if python_is_type(value, x)]
+    return [{'id': fieldname, 'type': candidates[fieldname][0] if candidates[fieldname] else 'text'}
+            for fieldname in fieldnames]
+
+
+def python_coerce_rows(rows, schema):
+    converters = {'int': int, 'float': float, 'bool': lambda x: x.lower() in ('true', 't', 'yes', 'y')}
+    for row in rows:
+        for field in schema:
+            converter = converters.get(field['type'])
+            if converter is not None:
+                value = row[field['id']].strip()
+                row[field['id']] = converter(value) if value else None
+    return rows
+
+
+def read_batches(path):
+    with open(path, newline='') as f:
+        batch = list()
+        for row in csv.DictReader(f):
+            batch.append(row)
+            if len(batch) == BATCH_SIZE:
+                yield batch
+                batch = list()
+        if batch:
+            yield batch
+
+
+def run(number_rows, modes):
+    folder = tempfile.mkdtemp()
+    try:
+        path = join(folder, 'wide.csv')
+        fieldnames = generate_csv(path, number_rows)
+        size_mb = os.path.getsize(path) / 1048576
+        print('CSV with %d rows x %d columns (%.0f MB)' % (number_rows, len(fieldnames), size_mb))
+        start = time.perf_counter()
+        for _ in read_batches(path):
+            pass
+        read_seconds = time.perf_counter() - start
+        print('  %-8s read only %6.1f s' % ('csv', read_seconds))
+        for mode in modes:
+            start = time.perf_counter()
+            if mode == 'numpy':
+                inferrer = TypeInferrer(fieldnames)
+                for batch in read_batches(path):
+                    inferrer.update(batch)
+                schema = inferrer.get_schema()
+            else:
+                schema = python_infer_schema((row for batch in read_batches(path) for row in batch), fieldnames)
+            infer_seconds = time.perf_counter() - start - read_seconds
+            start = time.perf_counter()
+            for batch in read_batches(path):
+                if mode == 'numpy':
+                    coerce_rows(batch, schema)
+                else:
+                    python_coerce_rows(batch, schema)
+            coerce_seconds = time.perf_counter() - start - read_seconds
+            types = dict()
+            for field in schema:
+                types[field['type']] = types.get(field['type'], 0) + 1
+            print('  %-8s infer %6.1f s (%7.0f rows/s)  coerce %6.1f s (%7.0f rows/s)  types: %s' %
+                  (mode, infer_seconds, number_rows / infer_seconds, coerce_seconds, number_rows / coerce_seconds,
+                   ', '.join('%s=%d' % x for x in sorted(types.items()))))
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    number_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    modes = sys.argv[2].split(',') if len(sys.argv) > 2 else ['numpy', 'python']
+    run(number_rows, modes)
@@ -4,16 +4,19 @@
 
 It also handles resource and gallery items.
 """
+import copy
 import datetime
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from os.path import join
-from typing import Any, List, Optional
+from threading import Lock
+from typing import Any, List, Optional, Iterator, Tuple, Dict
 
 from dateutil import parser
 
 from hdx.configuration import Configuration
 from hdx.data.galleryitem import GalleryItem
-from hdx.data.hdxobject import HDXObject, HDXError
+from hdx.data.hdxobject import HDXObject, HDXError, HDXAsyncIterator
 from hdx.data.resource import Resource
 from hdx.utilities.dictionary import merge_two_dictionaries
 from hdx.utilities.location import Location
@@ -21,6 +24,36 @@ from hdx.utilities.location import Location
 logger = logging.getLogger(__name__)
 
 
+class DatasetSearchResults(list):
+    """List of datasets returned by a search with the number of HTTP calls to HDX the search made in calls"""
+
+    def __init__(self, datasets: Optional[List['Dataset']] = None, calls: int = 0):
+        super(DatasetSearchResults, self).__init__(datasets or list())
+        self.calls = calls
+
+
+class DatasetSearchIterator(object):
+    """Iterator of datasets returned by a search with the number of HTTP calls to HDX made so far in calls"""
+
+    def __init__(self):
+        self.calls = 0
+        self.iterator = None
+
+    def __iter__(self) -> 'DatasetSearchIterator':
+        return self
+
+    def __next__(self) -> 'Dataset':
+        return next(self.iterator)
+
+    def close(self) -> None:
+        """Stop the search early, releasing any page being prefetched
+
+        Returns:
+            None
+        """
+        self.iterator.close()
+
+
 class Dataset(HDXObject):
     """Dataset class enabling operations on datasets and associated resources and gallery items.
 
@@ -30,6 +63,8 @@ class Dataset(HDXObject):
         include_gallery (Optional[bool]): Whether to include gallery items in dataset. Defaults to True.
     """
 
+    max_gallery_workers = 8
+
     update_frequencies = {
         '0': 'Never',
         '1': 'Every day',
@@ -65,6 +100,8 @@ class Dataset(HDXObject):
             initial_data = dict()
         super(Dataset, self).__init__(configuration, initial_data)
         self.include_gallery = include_gallery
+        self._gallery_pending = False
+        self._hdx_data = None
         self.init_resources()
         self.init_gallery()
 
@@ -78,6 +115,7 @@ class Dataset(HDXObject):
         return {
             'show': 'package_show',
             'update': 'package_update',
+            'patch': 'package_patch',
             'create': 'package_create',
             'delete': 'package_delete',
             'search': 'package_search'
@@ -187,6 +225,21 @@ class Dataset(HDXObject):
         """
         self.gallery = list()
 
+    @property
+    def gallery(self) -> List[GalleryItem]:
+        """Dataset's gallery. For datasets returned by a search, the gallery is read from HDX when first accessed
+        unless it was loaded in bulk (see load_galleries).
+
+        Returns:
+            List[GalleryItem]: List of GalleryItem objects
+        """
+        self._dataset_load_pending_gallery()
+        return self._gallery
+
+    @gallery.setter
+    def gallery(self, gallery: List[GalleryItem]) -> None:
+        self._gallery = gallery
+
     def add_update_galleryitem(self, galleryitem) -> None:
         """Add new or update existing gallery item in dataset with new metadata
 
@@ -236,7 +289,7 @@ class Dataset(HDXObject):
                 del self.gallery[i]
 
     def get_gallery(self) -> List[GalleryItem]:
-        """Get dataset's gallery
+        """Get dataset's gallery. For datasets returned by a search, the gallery is read from HDX on first access.
 
         Returns:
             List[GalleryItem]: List of GalleryItem objects
@@ -287,25 +340,109 @@ class Dataset(HDXObject):
             return dataset
         return None
 
-    def _dataset_create_resources_gallery(self) -> None:
+    @staticmethod
+    def read_many_from_hdx(configuration: Configuration, identifiers: List[str],
+                           max_workers: Optional[int] = None) -> Tuple[List[Optional['Dataset']], List[str],
+                                                                       Dict[str, Exception]]:
+        """Reads the datasets given by identifiers from HDX concurrently. A failed read does not stop the others.
+
+        Args:
+            configuration (Configuration): HDX Configuration
+            identifiers (List[str]): Identifiers of datasets
+            max_workers (Optional[int]): Maximum number of concurrent reads. Defaults to pool_maxsize configuration
+            value or 10.
+
+        Returns:
+            Tuple[List[Optional[Dataset]], List[str], Dict[str, Exception]]: (Datasets read, one per identifier at the
+            same index with None where not found or failed, identifiers not found, dictionary of identifiers to errors
+            for reads that failed)
+        """
+        return Dataset._read_many_from_hdx(Dataset.read_from_hdx, configuration, identifiers, max_workers)
+
+    def _dataset_create_resources_gallery(self, lazy_gallery: bool = False) -> None:
         """Creates resource and gallery item objects in dataset
+
+        Args:
+            lazy_gallery (bool): Whether to defer reading the gallery from HDX until it is needed. Defaults to False.
+
+        Returns:
+            None
         """
 
         if 'resources' in self.data:
             self.old_data['resources'] = self._copy_hdxobjects(self.resources, Resource)
             self.separate_resources()
         if self.include_gallery:
-            success, result = self._read_from_hdx('gallery', self.data['id'], 'id', GalleryItem.actions()['list'])
-            if success:
-                self.data['gallery'] = result
-                self.old_data['gallery'] = self._copy_hdxobjects(self.gallery, GalleryItem)
-                self.separate_gallery()
+            if lazy_gallery:
+                self._gallery_pending = True
+            else:
+                self._dataset_set_gallery(self._dataset_read_gallery())
+
+    def _dataset_read_gallery(self) -> Optional[List[dict]]:
+        """Reads the gallery of the dataset from HDX
 
-    def _dataset_load_from_hdx(self, id_or_name: str) -> bool:
+        Returns:
+            Optional[List[dict]]: List of gallery item metadata dictionaries or None if the gallery could not be read
+        """
+        success, result = self._read_from_hdx('gallery', self.data['id'], 'id', GalleryItem.actions()['list'])
+        if success:
+            return result
+        return None
+
+    def _dataset_set_gallery(self, gallery: Optional[List[dict]]) -> None:
+        """Creates gallery item objects in dataset from gallery read from HDX
+
+        Args:
+            gallery (Optional[List[dict]]): List of gallery item metadata dictionaries or None if not read
+
+        Returns:
+            None
+        """
+        self._gallery_pending = False
+        if gallery is not None:
+            self.data['gallery'] = gallery
+            self.old_data['gallery'] = self._copy_hdxobjects(self.gallery, GalleryItem)
+            self.separate_gallery()
+
+    def _dataset_load_pending_gallery(self) -> None:
+        """Reads the gallery from HDX if its loading was deferred
+
+        Returns:
+            None
+        """
+        if self._gallery_pending:
+            self._dataset_set_gallery(self._dataset_read_gallery())
+
+    @staticmethod
+    def load_galleries(datasets: List['Dataset'], max_workers: Optional[int] = None) -> int:
+        """Reads from HDX the galleries of all datasets (such as those returned by search) whose gallery has not yet
+        been loaded, making the calls concurrently
+
+        Args:
+            datasets (List[Dataset]): List of datasets
+            max_workers (Optional[int]): Maximum number of concurrent calls. Defaults to Dataset.max_gallery_workers.
+
+        Returns:
+            int: Number of calls made to HDX
+        """
+        pending = [dataset for dataset in datasets if dataset._gallery_pending]
+        if not pending:
+            return 0
+        if max_workers is None:
+            max_workers = Dataset.max_gallery_workers
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            galleries = list(executor.map(lambda dataset: dataset._dataset_read_gallery(), pending))
+        for dataset, gallery in zip(pending, galleries):
+            dataset._dataset_set_gallery(gallery)
+        return len(pending)
+
+    def _dataset_load_from_hdx(self, id_or_name: str, keep_hdx_data: bool = False) -> bool:
         """Loads the dataset given by either id or name from HDX
 
         Args:
             id_or_name (str): Either id or name of dataset
+            keep_hdx_data (bool): Whether to keep a copy of the metadata as read from HDX (for comparing against on
+            update). Defaults to False.
 
         Returns:
             bool: True if loaded, False if not
@@ -313,6 +450,8 @@ class Dataset(HDXObject):
 
         if not self._load_from_hdx('dataset', id_or_name):
             return False
+        if keep_hdx_data:
+            self._hdx_data = copy.deepcopy(self.data)
         self._dataset_create_resources_gallery()
         return True
 
@@ -334,22 +473,37 @@ class Dataset(HDXObject):
         for galleryitem in self.gallery:
             galleryitem.check_required_fields([self.configuration['galleryitem']['dataset_id']])
 
-    def _dataset_merge_hdx_update(self, update_resources: bool, update_gallery: bool) -> None:
-        """Helper method to check if dataset or its resources or gallery items exist and update them
+    def _dataset_merge_hdx_update(self, update_resources: bool, update_gallery: bool,
+                                  replace_lists: bool = False) -> str:
+        """Helper method to check if dataset or its resources or gallery items exist and update them. The dataset
+        is only written to HDX if it differs from what was read from HDX.
 
         Args:
             update_resources (bool): Whether to update resources
             update_gallery (bool): Whether to update gallery
+            replace_lists (bool): Whether lists in the local metadata replace those in HDX rather than being appended
+            to them. Defaults to False.
 
         Returns:
-            None
+            str: 'unchanged' if no write was needed, 'patched' if only changed fields were sent or 'updated'
         """
-        merge_two_dictionaries(self.data, self.old_data)
+        hdx_data = self._hdx_data
+        self._hdx_data = None
+        old_resources = self.old_data.get('resources', None)
+        changes = self._changed_fields(hdx_data, {key: value for key, value in self.old_data.items()
+                                                  if key not in ('resources', 'gallery')})
+        if update_resources and old_resources:
+            hdx_resources = {resource['name']: resource for resource in hdx_data.get('resources', list())}
+            for old_resource in old_resources:
+                hdx_resource = hdx_resources.get(old_resource['name'])
+                if hdx_resource is None or self._changed_fields(hdx_resource, old_resource.data):
+                    changes['resources'] = (old_resources, hdx_data.get('resources'))
+                    break
+        merge_two_dictionaries(self.data, self.old_data, replace_lists)
         if 'resources' in self.data:
             del self.data['resources']
         if 'gallery' in self.data:
             del self.data['gallery']
-        old_resources = self.old_data.get('resources', None)
         if update_resources and old_resources:
             resource_dataset_id = [self.configuration['resource']['dataset_id']]
             resource_names = set()
@@ -359,7 +513,7 @@ class Dataset(HDXObject):
                 for old_resource in old_resources:
                     if resource_name == old_resource['name']:
                         logger.warning('Resource exists. Updating %s' % resource_name)
-                        merge_two_dictionaries(resource, old_resource)
+                        merge_two_dictionaries(resource, old_resource, replace_lists)
                         resource.check_required_fields(resource_dataset_id)
                         break
             for old_resource in old_resources:
@@ -369,7 +523,9 @@ class Dataset(HDXObject):
         old_gallery = self.old_data.get('gallery', None)
         if self.resources:
             self.data['resources'] = self._convert_hdxobjects(self.resources)
-        self._save_to_hdx('update', 'id')
+        if 'resources' not in self.data and not hdx_data.get('resources'):
+            hdx_data.pop('resources', None)
+        update_type = self._save_changes_to_hdx(hdx_data, 'id', changes)
         self.init_resources()
         self.separate_resources()
         if self.include_gallery and update_gallery and old_gallery:
@@ -384,36 +540,41 @@ class Dataset(HDXObject):
                         logger.warning('Gallery item exists. Updating %s' % galleryitem_title)
                         merge_two_dictionaries(galleryitem, old_galleryitem)
                         galleryitem.check_required_fields([galleryitem_dataset_id])
-                        galleryitem.update_in_hdx()
+                        galleryitem.update_in_hdx(replace_lists)
             for old_galleryitem in old_gallery:
                 if not old_galleryitem['title'] in galleryitem_titles:
                     old_galleryitem[galleryitem_dataset_id] = self.data['id']
                     old_galleryitem.check_required_fields()
                     old_galleryitem.create_in_hdx()
                     self.gallery.append(old_galleryitem)
+        return update_type
 
-    def update_in_hdx(self, update_resources: Optional[bool] = True, update_gallery: Optional[bool] = True) -> None:
-        """Check if dataset exists in HDX and if so, update it
+    def update_in_hdx(self, update_resources: Optional[bool] = True, update_gallery: Optional[bool] = True,
+                      replace_lists: Optional[bool] = False) -> str:
+        """Check if dataset exists in HDX and if so, update it. Nothing is written if the metadata is the same as in
+        HDX and only the changed fields are sent if few have changed.
 
         Args:
             update_resources (Optional[bool]): Whether to update resources. Defaults to True.
             update_gallery (Optional[bool]): Whether to update resources. Defaults to True.
+            replace_lists (Optional[bool]): Whether lists (eg. tags) replace those in HDX rather than being appended to
+            them. Defaults to False.
 
         Returns:
-            None
+            str: 'unchanged' if no write was needed, 'patched' if only changed fields were sent or 'updated'
         """
         loaded = False
         if 'id' in self.data:
             self._check_existing_object('dataset', 'id')
-            if self._dataset_load_from_hdx(self.data['id']):
+            if self._dataset_load_from_hdx(self.data['id'], keep_hdx_data=True):
                 loaded = True
             else:
                 logger.warning('Failed to load dataset with id %s' % self.data['id'])
         if not loaded:
             self._check_existing_object('dataset', 'name')
-            if not self._dataset_load_from_hdx(self.data['name']):
+            if not self._dataset_load_from_hdx(self.data['name'], keep_hdx_data=True):
                 raise HDXError('No existing dataset to update!')
-        self._dataset_merge_hdx_update(update_resources, update_gallery)
+        return self._dataset_merge_hdx_update(update_resources, update_gallery, replace_lists)
 
     def create_in_hdx(self) -> None:
         """Check if dataset exists in HDX and if so, update it, otherwise create it
@@ -424,12 +585,12 @@ class Dataset(HDXObject):
         self.check_required_fields()
         loadedid = None
         if 'id' in self.data:
-            if self._dataset_load_from_hdx(self.data['id']):
+            if self._dataset_load_from_hdx(self.data['id'], keep_hdx_data=True):
                 loadedid = self.data['id']
             else:
                 logger.warning('Failed to load dataset with id %s' % self.data['id'])
         if not loadedid:
-            if self._dataset_load_from_hdx(self.data['name']):
+            if self._dataset_load_from_hdx(self.data['name'], keep_hdx_data=True):
                 loadedid = self.data['name']
         if loadedid:
             logger.warning('Dataset exists. Updating %s' % loadedid)
@@ -462,12 +623,20 @@ class Dataset(HDXObject):
         self._delete_from_hdx('dataset', 'id')
 
     @staticmethod
-    def search_in_hdx(configuration: Configuration, query: str, **kwargs) -> List['Dataset']:
-        """Searches for datasets in HDX
+    def search_in_hdx(configuration: Configuration, query: str, bulk_gallery: bool = False,
+                      max_workers: Optional[int] = None, **kwargs) -> DatasetSearchResults:
+        """Searches for datasets in HDX. The galleries of the datasets returned are read from HDX when first accessed
+        (eg. by gallery or get_gallery) unless bulk_gallery is True in which case they are read concurrently for all
+        datasets before returning. The number of HTTP calls to HDX made while searching (from the change in the
+        call_count of the shared CKAN client, so 0 if the response cache answered the search and including any bulk
+        gallery reads and calls made concurrently through the same client) is given by the calls attribute of the list
+        returned.
 
         Args:
             configuration (Configuration): HDX Configuration
             query (str): Query (in Solr format). Defaults to '*:*'.
+            bulk_gallery (bool): Whether to read galleries of all datasets concurrently. Defaults to False.
+            max_workers (Optional[int]): Maximum concurrent gallery reads. Defaults to Dataset.max_gallery_workers.
             **kwargs: See below
             fq (string): Any filter queries to apply
             sort (string): Sorting of the search results. Defaults to 'relevance asc, metadata_modified desc'.
@@ -480,25 +649,183 @@ class Dataset(HDXObject):
             use_default_schema (bool): Use default package schema instead of custom schema. Defaults to False.
 
         Returns:
-            List[Dataset]: List of datasets resulting from query
+            DatasetSearchResults: List of datasets resulting from query with the number of calls made in calls
         """
 
-        datasets = []
+        datasets = DatasetSearchResults()
         dataset = Dataset(configuration)
+        remoteckan = dataset.hdxpostsite
+        call_count = remoteckan.call_count
         success, result = dataset._read_from_hdx('dataset', query, 'q', **kwargs)
         if result:
             count = result.get('count', None)
             if count:
                 for datasetdict in result['results']:
-                    dataset = Dataset(configuration)
-                    dataset.old_data = dict()
-                    dataset.data = datasetdict
-                    dataset._dataset_create_resources_gallery()
-                    datasets.append(dataset)
+                    datasets.append(Dataset._dataset_from_search_result(configuration, datasetdict))
         else:
             logger.debug(result)
+        if bulk_gallery:
+            Dataset.load_galleries(datasets, max_workers)
+        datasets.calls = remoteckan.call_count - call_count
+        logger.debug('Search for %s made %d calls to HDX' % (query, datasets.calls))
         return datasets
 
+    @staticmethod
+    async def asearch_in_hdx(configuration: Configuration, query: str, **kwargs) -> List['Dataset']:
+        """Searches for datasets in HDX without blocking the event loop
+
+        Args:
+            configuration (Configuration): HDX Configuration
+            query (str): Query (in Solr format). Defaults to '*:*'.
+            **kwargs: As for search_in_hdx
+
+        Returns:
+            List[Dataset]: List of datasets resulting from query
+        """
+        return await Dataset._run_async(configuration, Dataset.search_in_hdx, configuration, query, **kwargs)
+
+    @staticmethod
+    def aiter_search(configuration: Configuration, query: str, **kwargs) -> HDXAsyncIterator:
+        """Searches for datasets in HDX page by page for use with async for. Pages are fetched in the thread pool
+        of the shared CKAN client so the event loop is not blocked.
+
+        Args:
+            configuration (Configuration): HDX Configuration
+            query (str): Query (in Solr format). Defaults to '*:*'.
+            **kwargs: As for iter_search_in_hdx
+
+        Returns:
+            HDXAsyncIterator: Asynchronous iterator of datasets resulting from query
+        """
+        return HDXAsyncIterator(configuration, Dataset.iter_search_in_hdx(configuration, query, **kwargs))
+
+    @staticmethod
+    def _dataset_from_search_result(configuration: Configuration, datasetdict: dict) -> 'Dataset':
+        """Creates Dataset object (with resources and deferred gallery) from a dataset dictionary returned by a search
+
+        Args:
+            configuration (Configuration): HDX Configuration
+            datasetdict (dict): Dataset metadata dictionary from search results
+
+        Returns:
+            Dataset: Dataset object
+        """
+        dataset = Dataset(configuration)
+        dataset.old_data = dict()
+        dataset.data = datasetdict
+        dataset._dataset_create_resources_gallery(lazy_gallery=True)
+        return dataset
+
+    @staticmethod
+    def iter_search_in_hdx(configuration: Configuration, query: str, page_size: int = 1000, prefetch: bool = True,
+                           bulk_gallery: bool = False, max_workers: Optional[int] = None,
+                           **kwargs) -> DatasetSearchIterator:
+        """Searches for datasets in HDX page by page, yielding datasets as they are needed. While the datasets in one
+        page are being consumed, the next page is fetched in the background if prefetch is True, so at most two pages
+        of search results are held in memory at any time. The number of HTTP calls to HDX made so far is given by the
+        calls attribute of the iterator returned. As for search_in_hdx, it is measured from the change in the
+        call_count of the shared CKAN client while each page (and any bulk gallery read) is fetched, so pages answered
+        by the response cache add nothing.
+
+        Args:
+            configuration (Configuration): HDX Configuration
+            query (str): Query (in Solr format). Defaults to '*:*'.
+            page_size (int): Number of datasets to request per call. Defaults to 1000.
+            prefetch (bool): Whether to fetch the next page in the background. Defaults to True.
+            bulk_gallery (bool): Whether to read galleries of each page concurrently. Defaults to False.
+            max_workers (Optional[int]): Maximum concurrent gallery reads. Defaults to Dataset.max_gallery_workers.
+            **kwargs: See below
+            rows (int): Maximum total number of datasets to return. Defaults to all matching datasets.
+            start (int): Offset in the complete result for where the returned datasets should begin. Defaults to 0.
+            Other arguments are as for search_in_hdx.
+
+        Returns:
+            DatasetSearchIterator: Iterator of datasets resulting from query with the number of calls made in calls
+        """
+        searchiterator = DatasetSearchIterator()
+        searchiterator.iterator = Dataset._iter_search_in_hdx(searchiterator, configuration, query, page_size,
+                                                              prefetch, bulk_gallery, max_workers, **kwargs)
+        return searchiterator
+
+    @staticmethod
+    def _iter_search_in_hdx(searchiterator: DatasetSearchIterator, configuration: Configuration, query: str,
+                            page_size: int, prefetch: bool, bulk_gallery: bool, max_workers: Optional[int],
+                            **kwargs) -> Iterator['Dataset']:
+        """Helper generator for iter_search_in_hdx that counts calls made in the calls attribute of searchiterator
+
+        Args:
+            searchiterator (DatasetSearchIterator): Iterator returned by iter_search_in_hdx
+            configuration (Configuration): HDX Configuration
+            query (str): Query (in Solr format)
+            page_size (int): Number of datasets to request per call
+            prefetch (bool): Whether to fetch the next page in the background
+            bulk_gallery (bool): Whether to read galleries of each page concurrently
+            max_workers (Optional[int]): Maximum concurrent gallery reads
+            **kwargs: As for iter_search_in_hdx
+
+        Returns:
+            Iterator[Dataset]: Iterator of datasets resulting from query
+        """
+        if page_size < 1:
+            raise HDXError('page_size must be at least 1!')
+        rows = kwargs.pop('rows', None)
+        start = kwargs.pop('start', 0)
+        end = None if rows is None else start + rows
+        if end is not None and end <= start:
+            return
+        dataset = Dataset(configuration)
+        remoteckan = dataset.hdxpostsite
+        calls_lock = Lock()
+
+        def read_page(offset: int) -> Tuple[List[dict], Optional[int]]:
+            page_rows = page_size if end is None else min(page_size, end - offset)
+            call_count = remoteckan.call_count
+            success, result = dataset._read_from_hdx('dataset', query, 'q', rows=page_rows, start=offset, **kwargs)
+            with calls_lock:
+                searchiterator.calls += remoteckan.call_count - call_count
+            if not success:
+                logger.debug(result)
+                return list(), None
+            results = result.get('results', list())
+            next_offset = offset + len(results)
+            if len(results) < page_rows or next_offset >= result.get('count', 0) or \
+                    (end is not None and next_offset >= end):
+                next_offset = None
+            return results, next_offset
+
+        executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+        try:
+            results, offset = read_page(start)
+            while True:
+                future = None
+                if executor is not None and offset is not None:
+                    future = executor.submit(read_page, offset)
+                if bulk_gallery:
+                    datasets = [Dataset._dataset_from_search_result(configuration, datasetdict)
+                                for datasetdict in results]
+                    results = None
+                    call_count = remoteckan.call_count
+                    Dataset.load_galleries(datasets, max_workers)
+                    with calls_lock:
+                        searchiterator.calls += remoteckan.call_count - call_count
+                    for pagedataset in datasets:
+                        yield pagedataset
+                    datasets = None
+                else:
+                    for datasetdict in results:
+                        yield Dataset._dataset_from_search_result(configuration, datasetdict)
+                if offset is None:
+                    logger.debug('Search for %s made %d calls to HDX' % (query, searchiterator.calls))
+                    break
+                results = None
+                if future is None:
+                    results, offset = read_page(offset)
+                else:
+                    results, offset = future.result()
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False)
+
     @staticmethod
     def get_all_resources(datasets: List['Dataset']) -> List['Resource']:
         """Get all resources from a list of datasets (such as returned by search)
@@ -89,13 +89,17 @@ class GalleryItem(HDXObject):
         """
         self._check_required_fields('galleryitem', ignore_fields)
 
-    def update_in_hdx(self) -> None:
+    def update_in_hdx(self, replace_lists: Optional[bool] = False) -> str:
         """Check if gallery item exists in HDX and if so, update it
 
+        Args:
+            replace_lists (Optional[bool]): Whether lists replace those in HDX rather than being appended to them.
+            Defaults to False.
+
         Returns:
-            None
+            str: 'unchanged' if no write was needed, 'patched' if only changed fields were sent or 'updated'
         """
-        self._update_in_hdx('galleryitem', 'id')
+        return self._update_in_hdx('galleryitem', 'id', replace_lists)
 
     def create_in_hdx(self) -> None:
         """Check if gallery item exists in HDX and if so, update it, otherwise create it
@@ -4,19 +4,20 @@
 New HDX objects should extend this in similar fashion to Resource for example.
 """
 import abc
+import asyncio
 import copy
 import logging
 from collections import UserDict
-from os.path import join
-from typing import Optional, List, Any, Tuple, TypeVar, Union
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Optional, List, Any, Tuple, TypeVar, Union, Callable, Dict, Iterator
 
-import ckanapi
 from ckanapi.errors import NotFound
 
 from hdx.configuration import Configuration
-from hdx.utilities.dictionary import merge_two_dictionaries
+from hdx.remoteckan import RemoteCKANRegistry, PooledRemoteCKAN
+from hdx.utilities.dictionary import merge_two_dictionaries, dict_diff_deep
 from hdx.utilities.loader import load_yaml_into_existing_dict, load_json_into_existing_dict
-from hdx.utilities.path import script_dir_plus_file
 
 logger = logging.getLogger(__name__)
 
@@ -36,6 +37,7 @@ class HDXObject(UserDict):
         initial_data (dict): Initial metadata dictionary
     """
     __metaclass__ = abc.ABCMeta
+    max_patch_fields = 5
 
     @staticmethod
     @abc.abstractmethod
@@ -51,11 +53,7 @@ class HDXObject(UserDict):
         super(HDXObject, self).__init__(initial_data)
         self.configuration = configuration
         self.old_data = None
-        version_file = open(script_dir_plus_file(join('..', 'version.txt'), HDXObject))
-        version = version_file.read().strip()
-        self.hdxpostsite = ckanapi.RemoteCKAN(configuration.get_hdx_site_url(),
-                                              apikey=configuration.get_api_key(),
-                                              user_agent='HDXPythonLibrary/%s' % version)
+        self.hdxpostsite = RemoteCKANRegistry.get_remoteckan(configuration)
 
     def get_old_data_dict(self) -> None:
         """Get previous internal dictionary
@@ -111,9 +109,18 @@ class HDXObject(UserDict):
                 action = self.actions()['show']
         data = {fieldname: value}
         data.update(kwargs)
+        response_cache = self.hdxpostsite.response_cache
+        if response_cache is not None and response_cache.is_cacheable(action):
+            found, result = response_cache.get(action, data)
+            if found:
+                return True, result
+        else:
+            response_cache = None
         try:
             result = self.hdxpostsite.call_action(action, data,
                                                   requests_kwargs={'auth': self.configuration._get_credentials()})
+            if response_cache is not None:
+                response_cache.put(action, data, result)
             return True, result
         except NotFound:
             return False, "%s=%s: not found!" % (fieldname, value)
@@ -152,6 +159,88 @@ class HDXObject(UserDict):
         """
         return
 
+    @staticmethod
+    def _read_many_from_hdx(read_from_hdx: Callable[[Configuration, str], Optional[HDXObjectUpperBound]],
+                            configuration: Configuration, identifiers: List[str],
+                            max_workers: Optional[int] = None) -> Tuple[List[Optional[HDXObjectUpperBound]],
+                                                                        List[str], Dict[str, Exception]]:
+        """Helper method to read many HDX objects concurrently using the given read_from_hdx method. A failed read
+        does not stop the others. The list of HDX objects is aligned with identifiers: the object read for each
+        identifier is at the same index, with None where the object was not found or the read failed.
+
+        Args:
+            read_from_hdx ((configuration, identifier) -> Optional[T <= HDXObject]): Method to read one HDX object
+            configuration (Configuration): HDX Configuration
+            identifiers (List[str]): Identifiers of HDX objects
+            max_workers (Optional[int]): Maximum number of concurrent reads. Defaults to pool_maxsize configuration
+            value or 10.
+
+        Returns:
+            Tuple[List[Optional[T <= HDXObject]], List[str], Dict[str, Exception]]: (HDX objects read or None, one
+            per identifier, identifiers not found, dictionary of identifiers to errors for reads that failed)
+        """
+        if max_workers is None:
+            max_workers = configuration.get('pool_maxsize', 10)
+
+        def read(identifier: str) -> Tuple[Optional[HDXObjectUpperBound], Optional[Exception]]:
+            try:
+                return read_from_hdx(configuration, identifier), None
+            except Exception as e:
+                logger.error('Failed to read %s: %s' % (identifier, e))
+                return None, e
+
+        hdxobjects = list()
+        not_found = list()
+        errors = dict()
+        if not identifiers:
+            return hdxobjects, not_found, errors
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for identifier, (hdxobject, error) in zip(identifiers, executor.map(read, identifiers)):
+                if error is not None:
+                    errors[identifier] = error
+                elif hdxobject is None:
+                    not_found.append(identifier)
+                hdxobjects.append(hdxobject)
+        return hdxobjects, not_found, errors
+
+    @staticmethod
+    async def _run_async(configuration: Configuration, function: Callable[..., Any], *args, **kwargs) -> Any:
+        """Helper method to run a blocking function from asyncio code by offloading it to the thread pool of the
+        shared CKAN client for the configuration. This is thread offloading rather than native asyncio I/O: each call
+        occupies a thread until it finishes. The size of the thread pool (pool_maxsize configuration value or 10)
+        limits how many calls run concurrently and they all use the client's connection pool. If called from one of
+        the pool's own threads, the function is run inline so that nested calls cannot deadlock the pool.
+
+        Args:
+            configuration (Configuration): HDX Configuration
+            function (Callable[..., Any]): Function to run
+            *args: Arguments to pass to function
+            **kwargs: Keyword arguments to pass to function
+
+        Returns:
+            Any: Return value of function
+        """
+        if PooledRemoteCKAN.in_executor_thread():
+            return function(*args, **kwargs)
+        executor = RemoteCKANRegistry.get_remoteckan(configuration).get_executor()
+        # get_event_loop returns the running loop when called from a coroutine (get_running_loop needs Python 3.7)
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(executor, partial(PooledRemoteCKAN.run_in_executor_thread, function, *args,
+                                                            **kwargs))
+
+    @classmethod
+    async def aread_from_hdx(cls, configuration: Configuration, identifier: str) -> Optional[HDXObjectUpperBound]:
+        """Reads the HDX object given by identifier from HDX without blocking the event loop and returns it
+
+        Args:
+            configuration (Configuration): HDX Configuration
+            identifier (str): HDX object identifier
+
+        Returns:
+            Optional[T <= HDXObject]: HDX object if successful read, None if not
+        """
+        return await HDXObject._run_async(configuration, cls.read_from_hdx, configuration, identifier)
+
     def _check_existing_object(self, object_type: str, id_field_name: str):
         if not self.data:
             raise HDXError("No data in %s!" % object_type)
@@ -197,59 +286,131 @@ class HDXObject(UserDict):
             if field not in self.data and field not in ignore_fields:
                 raise HDXError("Field %s is missing in %s!" % (field, object_type))
 
-    def _merge_hdx_update(self, object_type: str, id_field_name: str) -> None:
+    def _merge_hdx_update(self, object_type: str, id_field_name: str, replace_lists: bool = False) -> str:
         """Helper method to check if HDX object exists and update it
 
         Args:
             object_type (str): Description of HDX object type (for messages)
             id_field_name (str): Name of field containing HDX object identifier
+            replace_lists (bool): Whether lists in the local metadata replace those in HDX rather than being appended
+            to them. Defaults to False.
 
         Returns:
-            None
+            str: 'unchanged' if no write was needed, 'patched' if only changed fields were sent or 'updated'
         """
-        merge_two_dictionaries(self.data, self.old_data)
+        hdx_data = copy.deepcopy(self.data)
+        changes = self._changed_fields(hdx_data, self.old_data)
+        merge_two_dictionaries(self.data, self.old_data, replace_lists)
         self.check_required_fields(self.configuration['%s' % object_type].get('ignore_on_update', []))
+        return self._save_changes_to_hdx(hdx_data, id_field_name, changes)
+
+    @staticmethod
+    def _changed_fields(hdx_data: dict, local_data: dict) -> dict:
+        """Helper method to find which top level fields local metadata would change in metadata read from HDX. Lists
+        in the local metadata are compared as if they replaced those in HDX (see replace_list), so that local
+        metadata that matches HDX is unchanged however lists are merged for the update.
+
+        Args:
+            hdx_data (dict): HDX object metadata as read from HDX
+            local_data (dict): Local HDX object metadata
+
+        Returns:
+            dict: Comparison dictionary of changed fields (empty if nothing would change)
+        """
+        merged = merge_two_dictionaries(copy.deepcopy(hdx_data), copy.deepcopy(local_data), replace_lists=True)
+        return dict_diff_deep(merged, hdx_data)
+
+    def _save_changes_to_hdx(self, hdx_data: dict, id_field_name: str, changes: dict) -> str:
+        """Helper method to update an HDX object in HDX with only what has changed compared to the metadata last
+        read from HDX. If nothing has changed, nothing is written. If up to max_patch_fields top level fields have
+        changed and the object supports patching, only those fields are sent. Otherwise the whole object is sent.
+
+        Args:
+            hdx_data (dict): HDX object metadata as read from HDX
+            id_field_name (str): Name of field containing HDX object identifier
+            changes (dict): Comparison dictionary of fields changed by the local metadata (see _changed_fields)
+
+        Returns:
+            str: 'unchanged' if no write was needed, 'patched' if only changed fields were sent or 'updated'
+        """
+        if not changes:
+            logger.info('No changes to %s. Skipping update.' % self.data[id_field_name])
+            self.old_data = self.data
+            self.data = hdx_data
+            return 'unchanged'
+        if 'patch' in self.actions() and len(changes) <= self.max_patch_fields:
+            data = {key: self.data[key] for key in changes}
+            data[id_field_name] = self.data[id_field_name]
+            logger.debug('Patching %s with changed fields: %s' % (self.data[id_field_name], ', '.join(sorted(changes))))
+            result = self._write_to_hdx('patch', data, id_field_name)
+            self.old_data = self.data
+            self.data = result
+            return 'patched'
         self._save_to_hdx('update', id_field_name)
+        return 'updated'
 
     @abc.abstractmethod
-    def update_in_hdx(self) -> None:
+    def update_in_hdx(self) -> str:
         """Abstract method to check if HDX object exists in HDX and if so, update it
 
         Returns:
-            None
+            str: 'unchanged' if no write was needed, 'patched' if only changed fields were sent or 'updated'
         """
         return
 
-    def _update_in_hdx(self, object_type: str, id_field_name: str) -> None:
+    async def aupdate_in_hdx(self, *args, **kwargs) -> str:
+        """Check if HDX object exists in HDX and if so, update it, without blocking the event loop
+
+        Args:
+            *args: Arguments to pass to update_in_hdx
+            **kwargs: Keyword arguments to pass to update_in_hdx
+
+        Returns:
+            str: 'unchanged' if no write was needed, 'patched' if only changed fields were sent or 'updated'
+        """
+        return await self._run_async(self.configuration, self.update_in_hdx, *args, **kwargs)
+
+    def _update_in_hdx(self, object_type: str, id_field_name: str, replace_lists: bool = False) -> str:
         """Helper method to check if HDX object exists in HDX and if so, update it
 
         Args:
             object_type (str): Description of HDX object type (for messages)
             id_field_name (str): Name of field containing HDX object identifier
+            replace_lists (bool): Whether lists in the local metadata replace those in HDX rather than being appended
+            to them. Defaults to False.
 
         Returns:
-            None
+            str: 'unchanged' if no write was needed, 'patched' if only changed fields were sent or 'updated'
         """
 
         self._check_load_existing_object(object_type, id_field_name)
-        self._merge_hdx_update(object_type, id_field_name)
+        return self._merge_hdx_update(object_type, id_field_name, replace_lists)
 
-    def _write_to_hdx(self, action: str, data: dict, id_field_name: str) -> dict:
+    def _write_to_hdx(self, action: str, data: dict, id_field_name: str, timeout: Optional[float] = None) -> dict:
         """Creates or updates an HDX object in HDX and return HDX object metadata dict
 
         Args:
             action (str): Action to perform eg. 'create', 'update'
             data (dict): Data to write to HDX
             id_field_name (str): Name of field containing HDX object identifier
+            timeout (Optional[float]): Timeout for request in seconds. Defaults to None (no timeout).
 
         Returns:
             dict: HDX object metadata
         """
+        result = None
+        requests_kwargs = {'auth': self.configuration._get_credentials()}
+        if timeout is not None:
+            requests_kwargs['timeout'] = timeout
         try:
-            return self.hdxpostsite.call_action(self.actions()[action], data,
-                                                requests_kwargs={'auth': self.configuration._get_credentials()})
+            result = self.hdxpostsite.call_action(self.actions()[action], data, requests_kwargs=requests_kwargs)
+            return result
         except Exception as e:
             raise HDXError('Failed when trying to %s %s! (POST)' % (action, self.data[id_field_name])) from e
+        finally:
+            response_cache = self.hdxpostsite.response_cache
+            if response_cache is not None:
+                response_cache.invalidate(data, result)
 
     def _save_to_hdx(self, action: str, id_field_name: str) -> None:
         """Creates or updates an HDX object in HDX, saving current data and replacing with returned HDX object data
@@ -275,6 +436,19 @@ class HDXObject(UserDict):
         """
         return
 
+    async def acreate_in_hdx(self, *args, **kwargs) -> None:
+        """Check if HDX object exists in HDX and if so, update it, otherwise create it, without blocking the event
+        loop
+
+        Args:
+            *args: Arguments to pass to create_in_hdx
+            **kwargs: Keyword arguments to pass to create_in_hdx
+
+        Returns:
+            None
+        """
+        await self._run_async(self.configuration, self.create_in_hdx, *args, **kwargs)
+
     def _create_in_hdx(self, object_type: str, id_field_name: str, name_field_name: str) -> None:
         """Helper method to check if resource exists in HDX and if so, update it, otherwise create it
 
@@ -303,6 +477,14 @@ class HDXObject(UserDict):
         """
         return
 
+    async def adelete_from_hdx(self) -> None:
+        """Deletes HDX object from HDX without blocking the event loop
+
+        Returns:
+            None
+        """
+        await self._run_async(self.configuration, self.delete_from_hdx)
+
     def _delete_from_hdx(self, object_type: str, id_field_name: str) -> None:
         """Helper method to deletes a resource from HDX
 
@@ -414,3 +596,27 @@ class HDXObject(UserDict):
                 if not new_hdxobject[id_field] in hdxobject_names:
                     hdxobjects.append(hdxobjectclass(self.configuration, new_hdxobject))
             del self.data[hdxobjects_name]
+
+
+class HDXAsyncIterator(object):
+    """Asynchronous iterator that advances a blocking iterator (eg. of search results) by offloading each step to the
+    thread pool of the shared CKAN client, so that it can be used with async for
+
+    Args:
+        configuration (Configuration): HDX Configuration
+        iterator (Iterator[Any]): Blocking iterator
+    """
+    _end = object()
+
+    def __init__(self, configuration: Configuration, iterator: Iterator[Any]):
+        self.configuration = configuration
+        self.iterator = iterator
+
+    def __aiter__(self) -> 'HDXAsyncIterator':
+        return self
+
+    async def __anext__(self) -> Any:
+        item = await HDXObject._run_async(self.configuration, next, self.iterator, HDXAsyncIterator._end)
+        if item is HDXAsyncIterator._end:
+            raise StopAsyncIteration
+        return item
@@ -0,0 +1,315 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Persistent cache of dataset and resource metadata that is revalidated against HDX in batches"""
+import json
+import logging
+import sqlite3
+from threading import Lock
+from typing import Any, List, Optional, Tuple, Dict
+
+from ckanapi.errors import NotFound
+
+from hdx.configuration import Configuration
+from hdx.data.dataset import Dataset
+from hdx.data.resource import Resource
+from hdx.remoteckan import RemoteCKANRegistry
+
+logger = logging.getLogger(__name__)
+
+
+class MetadataCache(object):
+    """SQLite backed cache of dataset metadata (including the metadata of the datasets' resources) that survives
+    process restarts. When datasets are read, the cached copies are revalidated with a single package_search per
+    batch that only returns the id and metadata_modified of each dataset. Only datasets that have changed, or are not
+    yet in the cache, are fetched in full (again in batches using package_search, falling back to package_show for
+    datasets that search does not return). Searches include private datasets so that those the user can see are
+    revalidated in the same batches rather than being fetched again every time.
+
+    Calls are made directly through the shared CKAN client so that revalidation is never answered from the in-memory
+    response cache.
+
+    Args:
+        path (str): Path to SQLite database file (created if it does not exist). Use ':memory:' for a temporary cache.
+        batch_size (Optional[int]): Number of datasets per package_search call. Defaults to 1000.
+    """
+
+    def __init__(self, path: str, batch_size: Optional[int] = 1000):
+        self.path = path
+        self.batch_size = batch_size
+        self.call_count = 0
+        self._call_count_lock = Lock()
+        self._lock = Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute('CREATE TABLE IF NOT EXISTS datasets (id TEXT PRIMARY KEY, name TEXT, '
+                                     'metadata_modified TEXT, data TEXT)')
+            self._connection.execute('CREATE INDEX IF NOT EXISTS datasets_name ON datasets (name)')
+            self._connection.execute('CREATE TABLE IF NOT EXISTS resources (id TEXT PRIMARY KEY, package_id TEXT)')
+
+    def close(self) -> None:
+        """Close the database connection
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._connection.close()
+
+    def get(self, identifier: str) -> Optional[dict]:
+        """Get cached metadata of dataset without revalidating it
+
+        Args:
+            identifier (str): Id or name of dataset
+
+        Returns:
+            Optional[dict]: Dataset metadata dictionary or None if not in cache
+        """
+        with self._lock:
+            row = self._connection.execute('SELECT data FROM datasets WHERE id = ? OR name = ?',
+                                           (identifier, identifier)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    def get_metadata_modified(self, identifiers: List[str]) -> Dict[str, Tuple[str, str]]:
+        """Get ids and metadata_modified values of cached datasets
+
+        Args:
+            identifiers (List[str]): Ids or names of datasets
+
+        Returns:
+            Dict[str, Tuple[str, str]]: Dictionary of identifier to (id, metadata_modified) for cached datasets
+        """
+        cached = dict()
+        with self._lock:
+            for identifier in identifiers:
+                row = self._connection.execute('SELECT id, metadata_modified FROM datasets WHERE id = ? OR name = ?',
+                                               (identifier, identifier)).fetchone()
+                if row is not None:
+                    cached[identifier] = row
+        return cached
+
+    def put(self, datasetdicts: List[dict]) -> None:
+        """Store metadata of datasets, replacing any cached copies
+
+        Args:
+            datasetdicts (List[dict]): Dataset metadata dictionaries as returned by HDX
+
+        Returns:
+            None
+        """
+        with self._lock, self._connection:
+            for datasetdict in datasetdicts:
+                dataset_id = datasetdict['id']
+                self._connection.execute('DELETE FROM resources WHERE package_id = ?', (dataset_id,))
+                self._connection.execute('INSERT OR REPLACE INTO datasets VALUES (?, ?, ?, ?)',
+                                         (dataset_id, datasetdict.get('name'), datasetdict.get('metadata_modified'),
+                                          json.dumps(datasetdict)))
+                self._connection.executemany('INSERT OR REPLACE INTO resources VALUES (?, ?)',
+                                             [(resource['id'], dataset_id) for resource in
+                                              datasetdict.get('resources', list())])
+
+    def delete(self, identifier: str) -> None:
+        """Remove dataset from cache
+
+        Args:
+            identifier (str): Id or name of dataset
+
+        Returns:
+            None
+        """
+        with self._lock, self._connection:
+            row = self._connection.execute('SELECT id FROM datasets WHERE id = ? OR name = ?',
+                                           (identifier, identifier)).fetchone()
+            if row is not None:
+                self._connection.execute('DELETE FROM resources WHERE package_id = ?', row)
+                self._connection.execute('DELETE FROM datasets WHERE id = ?', row)
+
+    def clear(self) -> None:
+        """Remove all datasets from cache
+
+        Returns:
+            None
+        """
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM resources')
+            self._connection.execute('DELETE FROM datasets')
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM datasets').fetchone()[0]
+
+    @staticmethod
+    def get_filter_query(field: str, values: List[str]) -> str:
+        """Get Solr filter query matching any of the values in field
+
+        Args:
+            field (str): Field name eg. id
+            values (List[str]): Values to match
+
+        Returns:
+            str: Filter query eg. id:("a" OR "b")
+        """
+        quoted = ['"%s"' % value.replace('\\', '\\\\').replace('"', '\\"') for value in values]
+        return '%s:(%s)' % (field, ' OR '.join(quoted))
+
+    def _call_action(self, configuration: Configuration, action: str, data: dict) -> Any:
+        """Call CKAN action through the shared CKAN client bypassing the in-memory response cache
+
+        Args:
+            configuration (Configuration): HDX Configuration
+            action (str): CKAN action
+            data (dict): Parameters of action
+
+        Returns:
+            Any: Result of action
+        """
+        with self._call_count_lock:
+            self.call_count += 1
+        remoteckan = RemoteCKANRegistry.get_remoteckan(configuration)
+        return remoteckan.call_action(action, data, requests_kwargs={'auth': configuration._get_credentials()})
+
+    def _search(self, configuration: Configuration, fq: str, rows: int, fl: Optional[str] = None) -> List[dict]:
+        """Search for datasets (including private datasets the user can see) with filter query
+
+        Args:
+            configuration (Configuration): HDX Configuration
+            fq (str): Filter query
+            rows (int): Number of rows to return
+            fl (Optional[str]): Fields to return. Defaults to None (all fields).
+
+        Returns:
+            List[dict]: Dataset metadata dictionaries (restricted to fl fields if given)
+        """
+        data = {'q': '*:*', 'fq': fq, 'rows': rows, 'include_private': True}
+        if fl is not None:
+            data['fl'] = fl
+        return self._call_action(configuration, Dataset.actions()['search'], data)['results']
+
+    def revalidate(self, configuration: Configuration, identifiers: List[str]) -> List[str]:
+        """Check cached datasets against HDX using one lightweight package_search per batch that returns only id and
+        metadata_modified
+
+        Args:
+            configuration (Configuration): HDX Configuration
+            identifiers (List[str]): Ids or names of cached datasets
+
+        Returns:
+            List[str]: Identifiers of datasets that are stale ie. uncached, modified or not returned by search
+        """
+        cached = self.get_metadata_modified(identifiers)
+        stale = [identifier for identifier in identifiers if identifier not in cached]
+        ids = list(cached.items())
+        for start in range(0, len(ids), self.batch_size):
+            batch = ids[start:start + self.batch_size]
+            results = self._search(configuration, self.get_filter_query('id', [x[1][0] for x in batch]), len(batch),
+                                   'id,metadata_modified')
+            current = {result['id']: result.get('metadata_modified') for result in results}
+            for identifier, (dataset_id, metadata_modified) in batch:
+                if dataset_id not in current or current[dataset_id] != metadata_modified:
+                    stale.append(identifier)
+        return stale
+
+    def refresh(self, configuration: Configuration, identifiers: List[str]) -> List[str]:
+        """Fetch datasets in full from HDX and store them in the cache. Datasets are fetched in batches with
+        package_search and any not returned by search are read individually with package_show.
+
+        Args:
+            configuration (Configuration): HDX Configuration
+            identifiers (List[str]): Ids or names of datasets
+
+        Returns:
+            List[str]: Identifiers of datasets not found in HDX (these are removed from the cache)
+        """
+        not_found = list()
+        for start in range(0, len(identifiers), self.batch_size):
+            batch = identifiers[start:start + self.batch_size]
+            fq = '%s OR %s' % (self.get_filter_query('id', batch), self.get_filter_query('name', batch))
+            results = self._search(configuration, fq, len(batch))
+            self.put(results)
+            found = set()
+            for result in results:
+                found.add(result['id'])
+                found.add(result.get('name'))
+            for identifier in batch:
+                if identifier in found:
+                    continue
+                try:
+                    result = self._call_action(configuration, Dataset.actions()['show'], {'id': identifier})
+                    self.put([result])
+                except NotFound:
+                    self.delete(identifier)
+                    not_found.append(identifier)
+        return not_found
+
+    def read_datasets(self, configuration: Configuration, identifiers: List[str]) -> Tuple[List[Dataset], List[str]]:
+        """Reads datasets using the cache, revalidating cached copies and only fetching stale datasets from HDX.
+        Galleries are read from HDX when they are first needed.
+
+        Args:
+            configuration (Configuration): HDX Configuration
+            identifiers (List[str]): Ids or names of datasets
+
+        Returns:
+            Tuple[List[Dataset], List[str]]: (Datasets in order of identifiers, identifiers not found)
+        """
+        call_count = self.call_count
+        stale = self.revalidate(configuration, identifiers)
+        not_found = list()
+        if stale:
+            not_found = self.refresh(configuration, stale)
+        logger.debug('Read %d datasets (%d stale) using %d calls to HDX' % (len(identifiers), len(stale),
+                                                                          self.call_count - call_count))
+        datasets = list()
+        for identifier in identifiers:
+            if identifier in not_found:
+                continue
+            datasetdict = self.get(identifier)
+            if datasetdict is None:
+                not_found.append(identifier)
+                continue
+            datasets.append(Dataset._dataset_from_search_result(configuration, datasetdict))
+        return datasets, not_found
+
+    def read_dataset(self, configuration: Configuration, identifier: str) -> Optional[Dataset]:
+        """Reads dataset using the cache, revalidating any cached copy
+
+        Args:
+            configuration (Configuration): HDX Configuration
+            identifier (str): Id or name of dataset
+
+        Returns:
+            Optional[Dataset]: Dataset object if successful read, None if not
+        """
+        datasets, _ = self.read_datasets(configuration, [identifier])
+        if datasets:
+            return datasets[0]
+        return None
+
+    def read_resource(self, configuration: Configuration, identifier: str) -> Optional[Resource]:
+        """Reads resource using the cache, revalidating the cached copy of its dataset. If the resource is not in the
+        cache, it is read from HDX and its dataset is added to the cache.
+
+        Args:
+            configuration (Configuration): HDX Configuration
+            identifier (str): Id of resource
+
+        Returns:
+            Optional[Resource]: Resource object if successful read, None if not
+        """
+        with self._lock:
+            row = self._connection.execute('SELECT package_id FROM resources WHERE id = ?', (identifier,)).fetchone()
+        if row is None:
+            resource = Resource.read_from_hdx(configuration, identifier)
+            if resource is None:
+                return None
+            package_id = resource['package_id']
+        else:
+            package_id = row[0]
+        dataset = self.read_dataset(configuration, package_id)
+        if dataset is None:
+            return None
+        for resource in dataset.get_resources():
+            if resource['id'] == identifier:
+                return resource
+        return None
@@ -2,14 +2,31 @@
 # -*- coding: utf-8 -*-
 """Resource class containing all logic for creating, checking, and updating resources."""
 import csv
+import hashlib
+import json
 import logging
-from os import unlink
-from os.path import join
-from typing import Optional, List, Tuple
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice, chain
+from os import unlink, makedirs, replace
+from os.path import join, exists, dirname
+from tempfile import gettempdir
+from typing import Optional, List, Tuple, Dict, Iterator, Iterable, Callable, IO, Any, Union
+
+import requests
 
 from hdx.configuration import Configuration
+from hdx.remoteckan import RequestTooLargeError
+from hdx.utilities.chunking import ByteBudgetChunker
+from hdx.utilities.datastoresql import quote_identifier, quote_literal, get_conditions, get_select, format_sql, \
+    get_page_sql, get_sum, get_count, get_latest
+from hdx.utilities.downloadcache import DownloadCache
 from hdx.utilities.downloader import Download
 from hdx.utilities.loader import load_yaml, load_json
+from hdx.utilities.rowsnapshot import RowSnapshot
+from hdx.utilities.rowsource import RowSource, RowsContext
+from hdx.utilities.typeinference import TypeInferrer, coerce_rows
 from hdx.utilities.path import script_dir_plus_file
 from .hdxobject import HDXObject, HDXError
 
@@ -23,6 +40,8 @@ class Resource(HDXObject):
         configuration (Configuration): HDX Configuration
         initial_data (Optional[dict]): Initial resource metadata dictionary. Defaults to None.
     """
+    infer_sample_rows = 10000
+
     def __init__(self, configuration: Configuration, initial_data: Optional[dict] = None):
         if not initial_data:
             initial_data = dict()
@@ -38,10 +57,12 @@ class Resource(HDXObject):
         return {
             'show': 'resource_show',
             'update': 'resource_update',
+            'patch': 'resource_patch',
             'create': 'resource_create',
             'delete': 'resource_delete',
             'search': 'resource_search',
             'datastore_delete': 'datastore_delete',
+            'datastore_search_sql': 'datastore_search_sql',
             'datastore_create': 'datastore_create',
             'datastore_insert': 'datastore_insert',
             'datastore_upsert': 'datastore_upsert'
@@ -87,6 +108,25 @@ class Resource(HDXObject):
             return resource
         return None
 
+    @staticmethod
+    def read_many_from_hdx(configuration: Configuration, identifiers: List[str],
+                           max_workers: Optional[int] = None) -> Tuple[List[Optional['Resource']], List[str],
+                                                                       Dict[str, Exception]]:
+        """Reads the resources given by identifiers from HDX concurrently. A failed read does not stop the others.
+
+        Args:
+            configuration (Configuration): HDX Configuration
+            identifiers (List[str]): Identifiers of resources
+            max_workers (Optional[int]): Maximum number of concurrent reads. Defaults to pool_maxsize configuration
+            value or 10.
+
+        Returns:
+            Tuple[List[Optional[Resource]], List[str], Dict[str, Exception]]: (Resources read, one per identifier at the
+            same index with None where not found or failed, identifiers not found, dictionary of identifiers to errors
+            for reads that failed)
+        """
+        return Resource._read_many_from_hdx(Resource.read_from_hdx, configuration, identifiers, max_workers)
+
     def check_required_fields(self, ignore_fields: List[str] = list()) -> None:
         """Check that metadata for resource is complete
 
@@ -98,13 +138,17 @@ class Resource(HDXObject):
         """
         self._check_required_fields('resource', ignore_fields)
 
-    def update_in_hdx(self) -> None:
+    def update_in_hdx(self, replace_lists: Optional[bool] = False) -> str:
         """Check if resource exists in HDX and if so, update it
 
+        Args:
+            replace_lists (Optional[bool]): Whether lists replace those in HDX rather than being appended to them.
+            Defaults to False.
+
         Returns:
-            None
+            str: 'unchanged' if no write was needed, 'patched' if only changed fields were sent or 'updated'
         """
-        self._update_in_hdx('resource', 'id')
+        return self._update_in_hdx('resource', 'id', replace_lists)
 
     def create_in_hdx(self) -> None:
         """Check if resource exists in HDX and if so, update it, otherwise create it
@@ -150,6 +194,20 @@ class Resource(HDXObject):
             logger.debug(result)
         return resources
 
+    @staticmethod
+    async def asearch_in_hdx(configuration: Configuration, query: str, **kwargs) -> List['Resource']:
+        """Searches for resources in HDX without blocking the event loop. NOTE: Does not search dataset metadata!
+
+        Args:
+            configuration (Configuration): HDX Configuration
+            query (str): Query
+            **kwargs: As for search_in_hdx
+
+        Returns:
+            List[Resource]: List of resources resulting from query
+        """
+        return await Resource._run_async(configuration, Resource.search_in_hdx, configuration, query, **kwargs)
+
     def delete_datastore(self) -> None:
         """Delete a resource from the HDX datastore
 
@@ -162,11 +220,207 @@ class Resource(HDXObject):
         if not success:
             logger.debug(result)
 
-    def download(self, folder: Optional[str] = None) -> Tuple[str, str]:
+    def _search_datastore_sql(self, sql: str) -> dict:
+        """Run SQL SELECT statement on the HDX datastore
+
+        Args:
+            sql (str): SQL statement
+
+        Returns:
+            dict: Result of datastore_search_sql containing records and fields
+        """
+        success, result = self._read_from_hdx('datastore', sql, 'sql', self.actions()['datastore_search_sql'])
+        if not success:
+            raise HDXError('Datastore query on resource %s failed: %s' % (self.data['id'], result))
+        return result
+
+    def iter_datastore_rows(self, filters: Optional[dict] = None, fields: Optional[List[str]] = None,
+                            page_size: int = 10000, key: str = '_id', prefetch: bool = True) -> Iterator[dict]:
+        """Iterate over the rows of the resource in the HDX datastore a page at a time without downloading the
+        resource. Pages are read with keyset pagination: each page selects the rows ordered by key whose key is
+        greater than the last key of the previous page, which uses the key's index so that every page takes about
+        the same time however deep into the table it is (unlike offset paging, which gets slower as the offset
+        grows). As datastore_search only supports offset paging, pages are read with datastore_search_sql. While
+        the rows of one page are being consumed the next page is fetched in the background, so at most two pages are
+        held in memory.
+
+        Args:
+            filters (Optional[dict]): Filters of form {'FIELD': VALUE} or {'FIELD': [VALUE1, VALUE2]}. Defaults to None.
+            fields (Optional[List[str]]): Fields to return. Defaults to None (all fields).
+            page_size (int): Number of rows per page. Defaults to 10000.
+            key (str): Unique, non null, indexed field to page on eg. the primary key. Defaults to '_id'.
+            prefetch (bool): Whether to fetch the next page while the current one is consumed. Defaults to True.
+
+        Returns:
+            Iterator[dict]: Iterator of rows
+        """
+        if page_size < 1:
+            raise HDXError('page_size must be at least 1!')
+        conditions = get_conditions(filters)
+        select_fields = None
+        strip_key = False
+        if fields:
+            select_fields = list(fields)
+            if key not in select_fields:
+                select_fields.append(key)
+                strip_key = True
+        resource_id = self.data['id']
+
+        def get_page(last_key) -> List[dict]:
+            page_conditions = list(conditions)
+            if last_key is not None:
+                page_conditions.append('%s > %s' % (quote_identifier(key), quote_literal(last_key)))
+            sql = get_select(resource_id, select_fields, page_conditions, [key], page_size)
+            return self._search_datastore_sql(sql)['records']
+
+        def get_next_key(last_key, records: List[dict]):
+            return records[-1][key]
+
+        for records in self._iter_pages(get_page, get_next_key, page_size, prefetch):
+            for record in records:
+                record.pop('_full_text', None)
+                if strip_key:
+                    del record[key]
+                yield record
+
+    @staticmethod
+    def _iter_pages(get_page: Callable[[Any], List[dict]], get_next: Callable[[Any, List[dict]], Any],
+                    page_size: int, prefetch: bool = True) -> Iterator[List[dict]]:
+        """Iterate over pages of records until a page is not full. While a page is being consumed the next page is
+        fetched in the background if prefetch is True.
+
+        Args:
+            get_page (Callable[[Any], List[dict]]): Function taking the state returned by get_next (None for the first
+            page) and returning a page of records
+            get_next (Callable[[Any, List[dict]], Any]): Function taking the state and records of a full page and
+            returning the state for the next page
+            page_size (int): Number of records per page
+            prefetch (bool): Whether to fetch the next page while the current one is consumed. Defaults to True.
+
+        Returns:
+            Iterator[List[dict]]: Iterator of pages
+        """
+        executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+        try:
+            start = time.perf_counter()
+            number_rows = 0
+            state = None
+            records = get_page(state)
+            while records:
+                future = None
+                if len(records) == page_size:
+                    state = get_next(state, records)
+                    if executor is not None:
+                        future = executor.submit(get_page, state)
+                number_rows += len(records)
+                yield records
+                if len(records) < page_size:
+                    break
+                records = get_page(state) if future is None else future.result()
+            logger.debug('Read %d rows from datastore in %.1f s' % (number_rows, time.perf_counter() - start))
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False)
+
+    def query_datastore_sql(self, sql: str, params: Optional[Union[dict, list, tuple]] = None,
+                            page_size: Optional[int] = 10000, prefetch: bool = True) -> Iterator[dict]:
+        """Run SQL SELECT statement on the HDX datastore (the table of a resource is named by its id) and iterate over
+        the resulting rows. Parameters are substituted as quoted literals (see format_sql): use %(name)s placeholders
+        with a dictionary or %s with a list. So that results are not truncated by the datastore's limit on rows
+        returned, the statement is run a page at a time by appending LIMIT and OFFSET to it. It must then have a top
+        level ORDER BY clause giving a unique order (and no LIMIT or OFFSET of its own) so that the pages are
+        consistent. As with iter_datastore_rows, the next page is fetched while the current one is consumed.
+
+        Args:
+            sql (str): SQL SELECT statement
+            params (Optional[Union[dict, list, tuple]]): Parameters. Defaults to None.
+            page_size (Optional[int]): Number of rows per page. Defaults to 10000. None runs the statement unpaged.
+            prefetch (bool): Whether to fetch the next page while the current one is consumed. Defaults to True.
+
+        Returns:
+            Iterator[dict]: Iterator of rows
+        """
+        sql = format_sql(sql, params)
+        if page_size is None:
+            pages = iter([self._search_datastore_sql(sql)['records']])
+        else:
+            if page_size < 1:
+                raise HDXError('page_size must be at least 1!')
+            try:
+                get_page_sql(sql, page_size, 0)
+            except ValueError as e:
+                raise HDXError('Cannot page SQL! Add a top level ORDER BY or pass page_size=None.') from e
+
+            def get_page(offset) -> List[dict]:
+                return self._search_datastore_sql(get_page_sql(sql, page_size, offset or 0))['records']
+
+            def get_next_offset(offset, records: List[dict]):
+                return (offset or 0) + len(records)
+
+            pages = self._iter_pages(get_page, get_next_offset, page_size, prefetch)
+        for records in pages:
+            for record in records:
+                record.pop('_full_text', None)
+                yield record
+
+    def get_datastore_sums(self, value_fields: List[str], group_by: Optional[List[str]] = None,
+                           filters: Optional[dict] = None) -> Iterator[dict]:
+        """Sum numeric fields in the HDX datastore, optionally grouped by other fields, so that only the aggregated
+        rows are returned
+
+        Args:
+            value_fields (List[str]): Numeric fields to sum (each sum is named after its field)
+            group_by (Optional[List[str]]): Fields to group by. Defaults to None (sum over all rows).
+            filters (Optional[dict]): Filters of form {'FIELD': VALUE} or {'FIELD': [VALUE1, VALUE2]}. Defaults to None.
+
+        Returns:
+            Iterator[dict]: Iterator of rows of group fields and sums
+        """
+        return self.query_datastore_sql(get_sum(self.data['id'], value_fields, group_by, filters),
+                                        page_size=10000 if group_by else None)
+
+    def get_datastore_counts(self, group_by: Optional[List[str]] = None,
+                             filters: Optional[dict] = None) -> Iterator[dict]:
+        """Count rows in the HDX datastore, optionally grouped by fields
+
+        Args:
+            group_by (Optional[List[str]]): Fields to group by. Defaults to None (count all rows).
+            filters (Optional[dict]): Filters of form {'FIELD': VALUE} or {'FIELD': [VALUE1, VALUE2]}. Defaults to None.
+
+        Returns:
+            Iterator[dict]: Iterator of rows of group fields and count
+        """
+        return self.query_datastore_sql(get_count(self.data['id'], group_by, filters),
+                                        page_size=10000 if group_by else None)
+
+    def get_datastore_latest(self, date_field: str, group_by: List[str], fields: Optional[List[str]] = None,
+                             filters: Optional[dict] = None) -> Iterator[dict]:
+        """Get the row with the latest date for each group in the HDX datastore
+
+        Args:
+            date_field (str): Date field
+            group_by (List[str]): Fields to group by
+            fields (Optional[List[str]]): Fields to return. Defaults to None (all fields).
+            filters (Optional[dict]): Filters of form {'FIELD': VALUE} or {'FIELD': [VALUE1, VALUE2]}. Defaults to None.
+
+        Returns:
+            Iterator[dict]: Iterator of rows
+        """
+        return self.query_datastore_sql(get_latest(self.data['id'], date_field, group_by, fields, filters))
+
+    def download(self, folder: Optional[str] = None, segments: int = 1, resume: bool = False,
+                 cache: Optional[DownloadCache] = None) -> Tuple[str, str]:
         """Download resource store to provided folder or temporary folder if no folder supplied
 
         Args:
             folder (str): Folder to download resource to. Defaults to None.
+            segments (int): Number of byte ranges to download concurrently if the server supports them (see
+            Download.download_file_segmented). Defaults to 1 (single stream).
+            resume (bool): Whether to keep a partial file that a later call continues from if the download is
+            interrupted (see Download.download_file_resumable). Cannot be combined with segments > 1. Defaults to False.
+            cache (Optional[DownloadCache]): Cache of downloaded files that is revalidated with a conditional request
+            rather than downloading the resource again. Takes precedence over segments and resume. Defaults to None
+            (no caching).
 
         Returns:
             Tuple[str, str]: (URL downloaded, Path to downloaded file)
@@ -177,64 +431,533 @@ class Resource(HDXObject):
         if not url:
             raise HDXError('No URL to download!')
         logger.debug('Downloading %s' % url)
-        with Download() as download:
-            path = download.download_file(url, folder)
+        with Download(cache=cache) as download:
+            path = download.download_file(url, folder, segments=segments, resume=resume)
             return url, path
 
+    def _upload_chunks(self, chunks: Iterator[List[dict]], method: str, primary_key: Optional[str] = None,
+                       max_workers: int = 1, max_in_flight: Optional[int] = None,
+                       chunker: Optional[ByteBudgetChunker] = None, timeout: Optional[float] = None,
+                       start_offset: int = 0, checkpoint: Optional[Callable[[int], None]] = None) -> int:
+        """Upload chunks of rows to the datastore with datastore_upsert. With more than one worker, chunks are sent
+        concurrently with at most max_in_flight chunks read but not yet uploaded. In upsert mode, a chunk is only sent
+        once any in flight chunks sharing primary key values with it have been uploaded, so that later rows still win.
+        The first chunk to fail stops reading and cancels the chunks not yet started.
+
+        If a chunker is given, it is told how long each chunk took so that it can adapt its byte budget. A chunk
+        rejected as too large, or that times out in upsert mode, is split in half and retried after the chunker backs
+        off. (A timed out insert is not retried as the rows may have been committed.)
+
+        If a checkpoint function is given, it is called with the number of rows from the start of the source (counting
+        from start_offset) that have all been committed, every time that number advances.
+
+        Args:
+            chunks (Iterator[List[dict]]): Chunks of rows
+            method (str): Method for datastore_upsert: 'insert' or 'upsert'
+            primary_key (Optional[str]): Primary key (comma separated for multiple fields). Defaults to None.
+            max_workers (int): Number of chunks to upload concurrently. Defaults to 1.
+            max_in_flight (Optional[int]): Maximum number of chunks in memory. Defaults to None (2 x max_workers).
+            chunker (Optional[ByteBudgetChunker]): Chunker producing chunks. Defaults to None.
+            timeout (Optional[float]): Timeout for each request in seconds. Defaults to None (no timeout).
+            start_offset (int): Offset in source of first row of first chunk. Defaults to 0.
+            checkpoint (Optional[Callable[[int], None]]): Function called with offset of first uncommitted row.
+            Defaults to None.
+
+        Returns:
+            int: Number of rows uploaded
+        """
+        resource_id = self.data['id']
+
+        def upload(rowset: List[dict]) -> int:
+            data = {'resource_id': resource_id, 'force': True, 'method': method, 'records': rowset}
+            start = time.perf_counter()
+            try:
+                self._write_to_hdx('datastore_upsert', data, 'id', timeout)
+            except HDXError as e:
+                if chunker is None:
+                    raise
+                if isinstance(e.__cause__, RequestTooLargeError):
+                    reason = 'request too large'
+                elif isinstance(e.__cause__, requests.exceptions.Timeout):
+                    reason = 'request timed out'
+                else:
+                    raise
+                chunker.back_off(reason)
+                if len(rowset) < 2 or (reason == 'request timed out' and method != 'upsert'):
+                    raise
+                half = len(rowset) // 2
+                logger.debug('Retrying chunk of %d rows in two halves' % len(rowset))
+                return upload(rowset[:half]) + upload(rowset[half:])
+            if chunker is not None:
+                chunker.record(chunker.estimate_chunk_size(rowset), time.perf_counter() - start)
+            return len(rowset)
+
+        uploaded = 0
+        if max_workers <= 1:
+            for rowset in chunks:
+                uploaded += upload(rowset)
+                logger.debug('Uploading: %s' % uploaded)
+                if checkpoint is not None:
+                    checkpoint(start_offset + uploaded)
+            return uploaded
+
+        if max_in_flight is None:
+            max_in_flight = 2 * max_workers
+        keyfields = None
+        if method == 'upsert' and primary_key:
+            keyfields = RowSnapshot.get_key_fields(primary_key)
+        in_flight = dict()
+        committed = dict()
+        watermark = start_offset
+        offset = start_offset
+
+        def collect(done) -> None:
+            nonlocal uploaded, watermark
+            for future in done:
+                _, chunk_offset = in_flight.pop(future)
+                rows = future.result()
+                uploaded += rows
+                logger.debug('Uploading: %s' % uploaded)
+                committed[chunk_offset] = chunk_offset + rows
+            advanced = False
+            while watermark in committed:
+                watermark = committed.pop(watermark)
+                advanced = True
+            if advanced and checkpoint is not None:
+                checkpoint(watermark)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            try:
+                for rowset in chunks:
+                    keys = None
+                    if keyfields:
+                        keys = {tuple(row.get(field) for field in keyfields) for row in rowset}
+                        colliding = [future for future, (futurekeys, _) in in_flight.items() if keys & futurekeys]
+                        if colliding:
+                            collect(wait(colliding).done)
+                    collect([future for future in in_flight if future.done()])
+                    while len(in_flight) >= max_in_flight:
+                        collect(wait(in_flight, return_when=FIRST_COMPLETED).done)
+                    in_flight[executor.submit(upload, rowset)] = (keys, offset)
+                    offset += len(rowset)
+                collect(wait(in_flight).done)
+            except Exception:
+                for future in in_flight:
+                    future.cancel()
+                raise
+        return uploaded
+
+    @staticmethod
+    def _get_file_hash(path: str) -> str:
+        """Get MD5 hash of file
+
+        Args:
+            path (str): Path to file
+
+        Returns:
+            str: MD5 hash of file as hex string
+        """
+        md5hash = hashlib.md5()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1048576), b''):
+                md5hash.update(block)
+        return md5hash.hexdigest()
+
+    def _get_journal_paths(self, journal_folder: Optional[str] = None) -> Tuple[str, str]:
+        """Get paths of checkpoint journal and cached source file for datastore upload of resource
+
+        Args:
+            journal_folder (Optional[str]): Folder for journal and cached source. Defaults to None (hdx_datastore
+            folder in temporary folder).
+
+        Returns:
+            Tuple[str, str]: (Path to journal, Path to cached source file)
+        """
+        if journal_folder is None:
+            journal_folder = join(gettempdir(), 'hdx_datastore')
+        makedirs(journal_folder, exist_ok=True)
+        return (join(journal_folder, '%s.journal.json' % self.data['id']),
+                join(journal_folder, '%s.source' % self.data['id']))
+
+    def _load_journal(self, journal_path: str, source_path: str, primary_key: Optional[str]) -> Optional[dict]:
+        """Load checkpoint journal of an earlier datastore upload of resource if it can be resumed ie. it is for the
+        same url and primary key and the cached source file still matches the hash recorded in the journal. A journal
+        that cannot be resumed is removed along with its cached source.
+
+        Args:
+            journal_path (str): Path to journal
+            source_path (str): Path to cached source file
+            primary_key (Optional[str]): Primary key of schema
+
+        Returns:
+            Optional[dict]: Journal if upload can be resumed, None if not
+        """
+        if not exists(journal_path):
+            return None
+        try:
+            with open(journal_path) as f:
+                journal = json.load(f)
+            if journal['url'] == self.data.get('url') and journal['primary_key'] == primary_key and \
+                    exists(source_path) and self._get_file_hash(source_path) == journal['source_hash']:
+                return journal
+            logger.warning('Datastore upload journal for %s does not match source. Starting again.' %
+                           self.data['id'])
+        except (ValueError, KeyError):
+            logger.warning('Datastore upload journal for %s is corrupt. Starting again.' % self.data['id'])
+        for path in (journal_path, source_path):
+            if exists(path):
+                unlink(path)
+        return None
+
+    @staticmethod
+    def _save_journal(journal_path: str, journal: dict) -> None:
+        """Save checkpoint journal atomically (so that an interrupted save leaves the previous journal intact)
+
+        Args:
+            journal_path (str): Path to journal
+            journal (dict): Journal
+
+        Returns:
+            None
+        """
+        temp_path = '%s.tmp' % journal_path
+        with open(temp_path, 'w') as f:
+            json.dump(journal, f)
+        replace(temp_path, journal_path)
+
+    def get_row_reader(self, path: Optional[str] = None,
+                       file_format: Optional[str] = None) -> Callable[[str], RowsContext]:
+        """Get streaming row reader for resource file from file_format if given, otherwise from the extension of
+        path (the file actually downloaded), the resource's format or the extension of its url. Defaults to the CSV
+        reader.
+
+        Args:
+            path (Optional[str]): Path to file. Defaults to None.
+            file_format (Optional[str]): File format eg. xlsx. Defaults to None.
+
+        Returns:
+            Callable[[str], RowsContext]: Function taking a path and returning a context manager giving
+            (field names, iterator of rows)
+        """
+        return RowSource.get_reader(file_format, path, self.data.get('format'), self.data.get('url'))
+
+    def _delete_first(self, delete_first: int, primary_key: Optional[str] = None) -> None:
+        """Delete resource from the HDX datastore before creation if requested
+
+        Args:
+            delete_first (int): Delete datastore before creation. 0 = No, 1 = Yes, 2 = If no primary key.
+            primary_key (Optional[str]): Primary key of schema. Defaults to None.
+
+        Returns:
+            None
+        """
+        if delete_first == 1 or (delete_first == 2 and primary_key is None):
+            self.delete_datastore()
+
+    def _datastore_create(self, fieldnames: Optional[List[str]], schema: List[dict] = None,
+                          primary_key: Optional[str] = None) -> None:
+        """Create resource in the HDX datastore. If no schema is provided all fields are assumed to be text.
+
+        Args:
+            fieldnames (Optional[List[str]]): Field names used to create schema if none is provided
+            schema (List[dict]): List of fields and types of form {'id': 'FIELD', 'type': 'TYPE'}. Defaults to None.
+            primary_key (Optional[str]): Primary key of schema. Defaults to None.
+
+        Returns:
+            None
+        """
+        if schema is None:
+            if fieldnames is None:
+                raise HDXError('Field names are required when no schema is provided!')
+            schema = list()
+            for fieldname in fieldnames:
+                schema.append({'id': fieldname, 'type': 'text'})
+        data = {'resource_id': self.data['id'], 'force': True, 'fields': schema, 'primary_key': primary_key}
+        self._write_to_hdx('datastore_create', data, 'id')
+
+    def _infer_schema(self, rows: Iterable[dict], fieldnames: List[str]) -> Tuple[List[dict], Iterator[dict]]:
+        """Infer schema from the first infer_sample_rows rows. The sampled rows are held in memory and chained back
+        in front of the remaining rows. As later rows are not checked, values are converted to the inferred schema
+        leniently (see coerce_rows).
+
+        Args:
+            rows (Iterable[dict]): Rows eg. from csv.DictReader
+            fieldnames (List[str]): Field names in column order
+
+        Returns:
+            Tuple[List[dict], Iterator[dict]]: (Inferred schema, Iterator of all rows)
+        """
+        if fieldnames is None:
+            raise HDXError('Field names are required to infer schema!')
+        rows = iter(rows)
+        sample = list(islice(rows, self.infer_sample_rows))
+        schema = TypeInferrer.infer_schema(sample, fieldnames)
+        logger.info('Inferred datastore schema from %d rows: %s' % (len(sample), ', '.join(
+            '%s=%s' % (field['id'], field['type']) for field in schema)))
+        return schema, chain(sample, rows)
+
+    def _upload_rows(self, rows: Iterable[dict], primary_key: Optional[str] = None, max_workers: int = 1,
+                     max_in_flight: Optional[int] = None, chunk_bytes: int = 1048576, timeout: Optional[float] = None,
+                     start_offset: int = 0, checkpoint: Optional[Callable[[int], None]] = None,
+                     coerce_schema: Optional[List[dict]] = None, coerce_strict: bool = True) -> int:
+        """Upload rows to the HDX datastore in chunks sized by a ByteBudgetChunker, optionally converting the values
+        of each chunk to the types in a schema before it is serialised (see coerce_rows)
+
+        Args:
+            rows (Iterable[dict]): Rows to upload eg. from csv.DictReader
+            primary_key (Optional[str]): Primary key of schema. Defaults to None.
+            max_workers (int): Number of chunks to upload concurrently. Defaults to 1.
+            max_in_flight (Optional[int]): Maximum number of chunks in memory. Defaults to None (2 x max_workers).
+            chunk_bytes (int): Initial byte budget per chunk. Defaults to 1048576 (1 MiB).
+            timeout (Optional[float]): Timeout for each chunk upload in seconds. Defaults to None (no timeout).
+            start_offset (int): Number of rows already committed before these rows. Defaults to 0.
+            checkpoint (Optional[Callable[[int], None]]): Called with number of rows committed. Defaults to None.
+            coerce_schema (Optional[List[dict]]): Schema whose types values are converted to. Defaults to None.
+            coerce_strict (bool): Whether a value that cannot be converted fails the upload rather than becoming null.
+            Defaults to True.
+
+        Returns:
+            int: Number of rows uploaded
+        """
+        if primary_key is None:
+            method = 'insert'
+        else:
+            method = 'upsert'
+        chunker = ByteBudgetChunker(chunk_bytes)
+        chunks = chunker.chunks(rows)
+        if coerce_schema is not None:
+            chunks = (coerce_rows(chunk, coerce_schema, coerce_strict) for chunk in chunks)
+        compression_statistics = self.hdxpostsite.get_compression_statistics()
+        uploaded = self._upload_chunks(chunks, method, primary_key, max_workers, max_in_flight,
+                                       chunker, timeout, start_offset, checkpoint)
+        logger.info('Uploaded %d rows to datastore in %d chunks with byte budgets: %s' %
+                    (uploaded, chunker.number_chunks, ', '.join(str(x) for x in chunker.budgets)))
+        if self.hdxpostsite.compress_requests:
+            statistics = self.hdxpostsite.get_compression_statistics()
+            logger.info('Request bodies compressed from %d to %d bytes' % (
+                statistics['bytes_before'] - compression_statistics['bytes_before'],
+                statistics['bytes_after'] - compression_statistics['bytes_after']))
+        return uploaded
+
     def create_datastore(self, schema: List[dict] = None, primary_key: Optional[str] = None,
-                         delete_first: int = 0) -> None:
-        """Create a resource in the HDX datastore. If no schema is provided all fields are assumed to be text.
+                         delete_first: int = 0, max_workers: int = 1, max_in_flight: Optional[int] = None,
+                         chunk_bytes: int = 1048576, timeout: Optional[float] = None, resume: bool = False,
+                         journal_folder: Optional[str] = None, infer_types: bool = False,
+                         file_format: Optional[str] = None) -> None:
+        """Create a resource in the HDX datastore. If no schema is provided all fields are assumed to be text unless
+        infer_types is True, in which case the type of each column (bool, int, float, timestamp or text) is inferred
+        from the first infer_sample_rows rows and values are converted to the schema types before upload. Later values
+        that do not fit an inferred type are uploaded as null with a warning rather than failing part way through the
+        upload (values that do not fit a schema that is provided fail it). The
+        data is streamed from the downloaded file in chunks so memory use does not grow with the size of the file.
+        Chunks are sized by their estimated JSON size starting from chunk_bytes and adapting to the observed
+        throughput (see ByteBudgetChunker). Setting max_workers above 1 uploads chunks concurrently (keep it within
+        the pool_maxsize configuration value so that connections are reused). The file is read with the row reader for
+        file_format, the extension of the downloaded file, the resource's format or the extension of its url (see
+        RowSource) eg. CSV, XLSX, zipped CSV or JSON lines.
+
+        If resume is True, the downloaded file is kept in journal_folder along with a checkpoint journal recording
+        its hash and how many rows have been committed. If the upload fails, calling create_datastore again with
+        resume=True skips the download, delete and datastore creation and carries on from the first uncommitted row,
+        provided that the url, primary key and cached file are unchanged. The journal and cached file are removed when
+        the upload succeeds. Chunks committed after the last checkpoint are sent again when resuming, so resume
+        requires a primary key (making the upload an upsert that overwrites rather than duplicates those rows).
 
         Args:
             schema (List[dict]): List of fields and types of form {'id': 'FIELD', 'type': 'TYPE'}. Defaults to None.
             primary_key (Optional[str]): Primary key of schema. Defaults to None.
             delete_first (int): Delete datastore before creation. 0 = No, 1 = Yes, 2 = If no primary key. Defaults to 0.
+            max_workers (int): Number of chunks to upload concurrently. Defaults to 1.
+            max_in_flight (Optional[int]): Maximum number of chunks in memory. Defaults to None (2 x max_workers).
+            chunk_bytes (int): Initial byte budget per chunk. Defaults to 1048576 (1 MiB).
+            timeout (Optional[float]): Timeout for each chunk upload in seconds. Defaults to None (no timeout).
+            resume (bool): Whether to keep a checkpoint journal and resume from it. Requires primary_key. Defaults to
+            False.
+            journal_folder (Optional[str]): Folder for journal and cached source. Defaults to None (hdx_datastore
+            folder in temporary folder).
+            infer_types (bool): Infer types of columns if no schema is provided and convert values to the schema
+            types before upload. Defaults to False.
+            file_format (Optional[str]): File format eg. xlsx. Defaults to None (detect).
 
         Returns:
             None
         """
-        if delete_first == 0:
-            pass
-        elif delete_first == 1:
-            self.delete_datastore()
-        elif delete_first == 2:
-            if primary_key is None:
-                self.delete_datastore()
-        else:
+        if delete_first not in (0, 1, 2):
             raise HDXError('delete_first must be 0, 1 or 2! (0 = No, 1 = Yes, 2 = Delete if no primary key)')
-        # Download the resource
-        url, path = self.download()
+        if resume and not primary_key:
+            raise HDXError('Resuming a datastore upload requires a primary key so that resent rows are not duplicated!')
+        journal = None
+        journal_path = None
+        if resume:
+            journal_path, source_path = self._get_journal_paths(journal_folder)
+            journal = self._load_journal(journal_path, source_path, primary_key)
+        if journal is not None:
+            url = journal['url']
+            path = source_path
+            file_format = file_format or journal.get('file_format')
+            logger.info('Resuming upload of %s to datastore from row %d' % (url, journal['rows_committed']))
+        else:
+            self._delete_first(delete_first, primary_key)
+            # Download the resource
+            if resume:
+                url, path = self.download(dirname(source_path))
+                # the cached source has no extension so keep the format of the downloaded file
+                file_format = file_format or RowSource.get_format(path)
+                replace(path, source_path)
+                path = source_path
+                journal = {'url': self.data.get('url'), 'primary_key': primary_key, 'file_format': file_format,
+                           'source_hash': self._get_file_hash(path), 'rows_committed': 0, 'created': False}
+                self._save_journal(journal_path, journal)
+            else:
+                url, path = self.download()
+
+        def checkpoint(rows_committed: int) -> None:
+            journal['rows_committed'] = rows_committed
+            self._save_journal(journal_path, journal)
 
-        f = None
+        success = False
         try:
-            f = open(path, 'r')
-            reader = csv.DictReader(f)
-            if schema is None:
-                schema = list()
-                for fieldname in reader.fieldnames:
-                    schema.append({'id': fieldname, 'type': 'text'})
-            data = {'resource_id': self.data['id'], 'force': True, 'fields': schema, 'primary_key': primary_key}
-            self._write_to_hdx('datastore_create', data, 'id')
-            rows = [row for row in reader]
-            chunksize = 1024
-            offset = 0
-            if primary_key is None:
-                method = 'insert'
-            else:
-                method = 'upsert'
             logger.debug('Uploading data from %s to datastore' % url)
-            while offset < len(rows):
-                rowset = rows[offset:offset + chunksize]
-                data = {'resource_id': self.data['id'], 'force': True, 'method': method, 'records': rowset}
-                self._write_to_hdx('datastore_upsert', data, 'id')
-                offset += chunksize
-                logger.debug('Uploading: %s' % offset)
+            with self.get_row_reader(path, file_format)(path) as (fieldnames, rows):
+                coerce_schema = None
+                coerce_strict = True
+                if infer_types:
+                    if schema is None:
+                        schema, rows = self._infer_schema(rows, fieldnames)
+                        coerce_strict = False
+                    coerce_schema = schema
+                if journal is None:
+                    self._datastore_create(fieldnames, schema, primary_key)
+                    self._upload_rows(rows, primary_key, max_workers, max_in_flight, chunk_bytes, timeout,
+                                      coerce_schema=coerce_schema, coerce_strict=coerce_strict)
+                else:
+                    if not journal['created']:
+                        self._datastore_create(fieldnames, schema, primary_key)
+                        journal['created'] = True
+                        self._save_journal(journal_path, journal)
+                    start_offset = journal['rows_committed']
+                    self._upload_rows(islice(rows, start_offset, None), primary_key, max_workers, max_in_flight,
+                                      chunk_bytes, timeout, start_offset, checkpoint, coerce_schema, coerce_strict)
+            success = True
         except Exception as e:
             raise HDXError('Upload to datastore of %s failed!' % url) from e
         finally:
-            if f:
-                f.close()
-            unlink(path)
+            if not resume or success:
+                unlink(path)
+                if resume:
+                    unlink(journal_path)
+
+    async def acreate_datastore(self, *args, **kwargs) -> None:
+        """Create a resource in the HDX datastore without blocking the event loop
+
+        Args:
+            *args: Arguments to pass to create_datastore
+            **kwargs: Keyword arguments to pass to create_datastore
+
+        Returns:
+            None
+        """
+        await self._run_async(self.configuration, self.create_datastore, *args, **kwargs)
+
+    def create_datastore_from_rows(self, rows: Iterable[dict], fieldnames: Optional[List[str]] = None,
+                                   schema: List[dict] = None, primary_key: Optional[str] = None,
+                                   delete_first: int = 0, max_workers: int = 1, max_in_flight: Optional[int] = None,
+                                   chunk_bytes: int = 1048576, timeout: Optional[float] = None,
+                                   infer_types: bool = False) -> int:
+        """Create a resource in the HDX datastore from rows without downloading the resource. If no schema is
+        provided all fields (given by fieldnames) are assumed to be text unless infer_types is True. Rows are consumed
+        lazily in chunks as for create_datastore.
+
+        Args:
+            rows (Iterable[dict]): Rows to upload eg. from csv.DictReader or a generator of dictionaries
+            fieldnames (Optional[List[str]]): Field names. Required if no schema is provided. Defaults to None.
+            schema (List[dict]): List of fields and types of form {'id': 'FIELD', 'type': 'TYPE'}. Defaults to None.
+            primary_key (Optional[str]): Primary key of schema. Defaults to None.
+            delete_first (int): Delete datastore before creation. 0 = No, 1 = Yes, 2 = If no primary key. Defaults to 0.
+            max_workers (int): Number of chunks to upload concurrently. Defaults to 1.
+            max_in_flight (Optional[int]): Maximum number of chunks in memory. Defaults to None (2 x max_workers).
+            chunk_bytes (int): Initial byte budget per chunk. Defaults to 1048576 (1 MiB).
+            timeout (Optional[float]): Timeout for each chunk upload in seconds. Defaults to None (no timeout).
+            infer_types (bool): Infer types of columns if no schema is provided and convert values to the schema
+            types before upload. Defaults to False.
+
+        Returns:
+            int: Number of rows uploaded
+        """
+        if delete_first not in (0, 1, 2):
+            raise HDXError('delete_first must be 0, 1 or 2! (0 = No, 1 = Yes, 2 = Delete if no primary key)')
+        if schema is None and fieldnames is None:
+            raise HDXError('Field names are required when no schema is provided!')
+        self._delete_first(delete_first, primary_key)
+        try:
+            coerce_schema = None
+            coerce_strict = True
+            if infer_types:
+                if schema is None:
+                    schema, rows = self._infer_schema(rows, fieldnames)
+                    coerce_strict = False
+                coerce_schema = schema
+            self._datastore_create(fieldnames, schema, primary_key)
+            return self._upload_rows(rows, primary_key, max_workers, max_in_flight, chunk_bytes, timeout,
+                                     coerce_schema=coerce_schema, coerce_strict=coerce_strict)
+        except Exception as e:
+            raise HDXError('Upload to datastore of %s failed!' % self.data['id']) from e
+
+    def create_datastore_from_fileobj(self, f: IO[str], schema: List[dict] = None, primary_key: Optional[str] = None,
+                                      delete_first: int = 0, max_workers: int = 1,
+                                      max_in_flight: Optional[int] = None, chunk_bytes: int = 1048576,
+                                      timeout: Optional[float] = None, infer_types: bool = False) -> int:
+        """Create a resource in the HDX datastore from an open CSV file object (with a header row) without
+        downloading the resource. If no schema is provided all fields are assumed to be text. The file object is not
+        closed.
+
+        Args:
+            f (IO[str]): CSV file object opened in text mode
+            schema (List[dict]): List of fields and types of form {'id': 'FIELD', 'type': 'TYPE'}. Defaults to None.
+            primary_key (Optional[str]): Primary key of schema. Defaults to None.
+            delete_first (int): Delete datastore before creation. 0 = No, 1 = Yes, 2 = If no primary key. Defaults to 0.
+            max_workers (int): Number of chunks to upload concurrently. Defaults to 1.
+            max_in_flight (Optional[int]): Maximum number of chunks in memory. Defaults to None (2 x max_workers).
+            chunk_bytes (int): Initial byte budget per chunk. Defaults to 1048576 (1 MiB).
+            timeout (Optional[float]): Timeout for each chunk upload in seconds. Defaults to None (no timeout).
+            infer_types (bool): Infer types of columns if no schema is provided and convert values to the schema
+            types before upload. Defaults to False.
+
+        Returns:
+            int: Number of rows uploaded
+        """
+        reader = csv.DictReader(f)
+        return self.create_datastore_from_rows(reader, reader.fieldnames, schema, primary_key, delete_first,
+                                               max_workers, max_in_flight, chunk_bytes, timeout, infer_types)
+
+    def create_datastore_from_file(self, path: str, schema: List[dict] = None, primary_key: Optional[str] = None,
+                                   delete_first: int = 0, max_workers: int = 1, max_in_flight: Optional[int] = None,
+                                   chunk_bytes: int = 1048576, timeout: Optional[float] = None,
+                                   infer_types: bool = False, file_format: Optional[str] = None) -> int:
+        """Create a resource in the HDX datastore from a local file (CSV, XLSX, zipped CSV or JSON lines with a
+        header row or field names) without downloading the resource. The format is taken from file_format, the file
+        extension, the resource's format or its url in that order (see RowSource). If no schema is provided all
+        fields are assumed to be text. The file is not deleted.
+
+        Args:
+            path (str): Path to file
+            schema (List[dict]): List of fields and types of form {'id': 'FIELD', 'type': 'TYPE'}. Defaults to None.
+            primary_key (Optional[str]): Primary key of schema. Defaults to None.
+            delete_first (int): Delete datastore before creation. 0 = No, 1 = Yes, 2 = If no primary key. Defaults to 0.
+            max_workers (int): Number of chunks to upload concurrently. Defaults to 1.
+            max_in_flight (Optional[int]): Maximum number of chunks in memory. Defaults to None (2 x max_workers).
+            chunk_bytes (int): Initial byte budget per chunk. Defaults to 1048576 (1 MiB).
+            timeout (Optional[float]): Timeout for each chunk upload in seconds. Defaults to None (no timeout).
+            infer_types (bool): Infer types of columns if no schema is provided and convert values to the schema
+            types before upload. Defaults to False.
+            file_format (Optional[str]): File format eg. csv, xlsx, zip, jsonl. Defaults to None (detect).
+
+        Returns:
+            int: Number of rows uploaded
+        """
+        with self.get_row_reader(path, file_format)(path) as (fieldnames, rows):
+            return self.create_datastore_from_rows(rows, fieldnames, schema, primary_key, delete_first, max_workers,
+                                                   max_in_flight, chunk_bytes, timeout, infer_types)
 
     def create_datastore_from_dict_schema(self, data: dict, delete_first: int = 0) -> None:
         """Creates a resource in the HDX datastore from a YAML file containing a list of fields and types of
@@ -291,17 +1014,167 @@ class Resource(HDXObject):
         data = load_yaml(script_dir_plus_file(join('..', 'hdx_datasource_topline.yml'), Resource))
         self.create_datastore_from_dict_schema(data, delete_first)
 
-    def update_datastore(self, schema: List[dict] = None, primary_key: Optional[str] = None) -> None:
-        """Update a resource in the HDX datastore. If no schema is provided all fields are assumed to be text.
+    def update_datastore(self, schema: List[dict] = None, primary_key: Optional[str] = None,
+                         max_workers: int = 1, max_in_flight: Optional[int] = None,
+                         snapshot_path: Optional[str] = None) -> None:
+        """Update a resource in the HDX datastore. If no schema is provided all fields are assumed to be text. If
+        snapshot_path is given (which requires a primary key), only rows that changed since the last update are sent
+        (see sync_datastore).
 
         Args:
             schema (List[dict]): List of fields and types of form {'id': 'FIELD', 'type': 'TYPE'}. Defaults to None.
             primary_key (Optional[str]): Primary key of schema. Defaults to None.
+            max_workers (int): Number of chunks to upload concurrently. Defaults to 1.
+            max_in_flight (Optional[int]): Maximum number of chunks in memory. Defaults to None (2 x max_workers).
+            snapshot_path (Optional[str]): Path to snapshot of row hashes for incremental sync. Defaults to None.
+
+        Returns:
+            None
+        """
+        if snapshot_path is None:
+            self.create_datastore(schema, primary_key, 2, max_workers, max_in_flight)
+        else:
+            self.sync_datastore(primary_key, snapshot_path, schema, max_workers, max_in_flight)
+
+    @staticmethod
+    def _get_delete_filters(keyfields: List[str], keys: List[Union[str, Tuple[str, ...]]]) -> List[dict]:
+        """Get datastore_delete filters that delete exactly the rows with the given keys. For a composite key, keys
+        are grouped by the values of all but the last key field so that each filter matches one value of each of
+        those fields and a list of values of the last field.
+
+        Args:
+            keyfields (List[str]): Fields of primary key
+            keys (List[Union[str, Tuple[str, ...]]]): Keys (tuples of values for a composite key)
+
+        Returns:
+            List[dict]: List of filters
+        """
+        if len(keyfields) == 1:
+            return [{keyfields[0]: keys}]
+        groups = OrderedDict()
+        for key in keys:
+            groups.setdefault(key[:-1], list()).append(key[-1])
+        filters = list()
+        for prefix, values in groups.items():
+            keyfilter = dict(zip(keyfields[:-1], prefix))
+            keyfilter[keyfields[-1]] = values
+            filters.append(keyfilter)
+        return filters
+
+    def sync_datastore_from_rows(self, rows: Iterable[dict], primary_key: str, snapshot_path: str,
+                                 fieldnames: Optional[List[str]] = None, schema: List[dict] = None,
+                                 max_workers: int = 1, max_in_flight: Optional[int] = None,
+                                 chunk_bytes: int = 1048576, timeout: Optional[float] = None,
+                                 infer_types: bool = False) -> Tuple[int, int]:
+        """Incrementally sync a resource in the HDX datastore with rows. A snapshot of a content hash per row keyed
+        by primary key (which may be several comma separated fields) is kept in an SQLite file at snapshot_path. Only
+        rows that are new or have changed since the
+        last successful sync are upserted and rows whose keys have disappeared are deleted with datastore_delete
+        filters. The snapshot is only updated if the sync succeeds. The datastore is only created when there is no
+        snapshot for this resource and primary key (eg. the first sync), in which case all rows are upserted. Rows
+        already in the datastore that are not among them are then not deleted, so a warning is logged if the
+        resource's datastore is already active. Delete the snapshot file to force a full upload if the datastore is
+        changed by other means.
+
+        Args:
+            rows (Iterable[dict]): Rows to sync eg. from csv.DictReader
+            primary_key (str): Primary key of schema (comma separated fields for a composite key)
+            snapshot_path (str): Path to snapshot of row hashes (created if it does not exist)
+            fieldnames (Optional[List[str]]): Field names. Required if no schema is provided. Defaults to None.
+            schema (List[dict]): List of fields and types of form {'id': 'FIELD', 'type': 'TYPE'}. Defaults to None.
+            max_workers (int): Number of chunks to upload concurrently. Defaults to 1.
+            max_in_flight (Optional[int]): Maximum number of chunks in memory. Defaults to None (2 x max_workers).
+            chunk_bytes (int): Initial byte budget per chunk. Defaults to 1048576 (1 MiB).
+            timeout (Optional[float]): Timeout for each chunk upload in seconds. Defaults to None (no timeout).
+            infer_types (bool): Infer types of columns if no schema is provided and convert values to the schema
+            types before upload. Defaults to False.
+
+        Returns:
+            Tuple[int, int]: (Number of rows upserted, Number of rows deleted)
+        """
+        if primary_key is None:
+            raise HDXError('A primary key is required to sync datastore!')
+        snapshot = RowSnapshot(snapshot_path)
+        try:
+            new_snapshot = snapshot.get_meta('resource_id') != self.data['id'] or \
+                snapshot.get_meta('primary_key') != primary_key
+            if new_snapshot:
+                snapshot.clear()
+                if self.data.get('datastore_active'):
+                    logger.warning('Datastore of %s already exists but %s has no snapshot of it, so rows no longer '
+                                   'in the source will not be deleted. Delete the datastore first for a full reload.'
+                                   % (self.data['id'], snapshot_path))
+            coerce_schema = None
+            coerce_strict = True
+            if infer_types:
+                if schema is None:
+                    schema, rows = self._infer_schema(rows, fieldnames)
+                    coerce_strict = False
+                coerce_schema = schema
+            if new_snapshot:
+                self._datastore_create(fieldnames, schema, primary_key)
+            upserted = self._upload_rows(snapshot.changed_rows(rows, primary_key), primary_key, max_workers,
+                                         max_in_flight, chunk_bytes, timeout, coerce_schema=coerce_schema,
+                                         coerce_strict=coerce_strict)
+            keyfields = RowSnapshot.get_key_fields(primary_key)
+            deleted = 0
+            for keys in snapshot.deleted_keys(primary_key):
+                for filters in self._get_delete_filters(keyfields, keys):
+                    data = {'resource_id': self.data['id'], 'force': True, 'filters': filters}
+                    self._write_to_hdx('datastore_delete', data, 'resource_id')
+                deleted += len(keys)
+            snapshot.commit()
+            snapshot.set_meta('resource_id', self.data['id'])
+            snapshot.set_meta('primary_key', primary_key)
+            logger.info('Synced datastore: %d of %d rows upserted and %d deleted' % (upserted, snapshot.number_rows,
+                                                                                       deleted))
+            return upserted, deleted
+        except Exception as e:
+            raise HDXError('Sync of datastore of %s failed!' % self.data['id']) from e
+        finally:
+            snapshot.close()
+
+    def sync_datastore(self, primary_key: str, snapshot_path: str, schema: List[dict] = None,
+                       max_workers: int = 1, max_in_flight: Optional[int] = None, chunk_bytes: int = 1048576,
+                       timeout: Optional[float] = None, infer_types: bool = False) -> Tuple[int, int]:
+        """Download resource and incrementally sync it with the HDX datastore, upserting only new or changed rows
+        and deleting rows whose keys have disappeared (see sync_datastore_from_rows).
+
+        Args:
+            primary_key (str): Primary key of schema
+            snapshot_path (str): Path to snapshot of row hashes (created if it does not exist)
+            schema (List[dict]): List of fields and types of form {'id': 'FIELD', 'type': 'TYPE'}. Defaults to None.
+            max_workers (int): Number of chunks to upload concurrently. Defaults to 1.
+            max_in_flight (Optional[int]): Maximum number of chunks in memory. Defaults to None (2 x max_workers).
+            chunk_bytes (int): Initial byte budget per chunk. Defaults to 1048576 (1 MiB).
+            timeout (Optional[float]): Timeout for each chunk upload in seconds. Defaults to None (no timeout).
+            infer_types (bool): Infer types of columns if no schema is provided and convert values to the schema
+            types before upload. Defaults to False.
+
+        Returns:
+            Tuple[int, int]: (Number of rows upserted, Number of rows deleted)
+        """
+        if primary_key is None:
+            raise HDXError('A primary key is required to sync datastore!')
+        url, path = self.download()
+        try:
+            with self.get_row_reader(path)(path) as (fieldnames, rows):
+                return self.sync_datastore_from_rows(rows, primary_key, snapshot_path, fieldnames, schema,
+                                                     max_workers, max_in_flight, chunk_bytes, timeout, infer_types)
+        finally:
+            unlink(path)
+
+    async def aupdate_datastore(self, *args, **kwargs) -> None:
+        """Update a resource in the HDX datastore without blocking the event loop
+
+        Args:
+            *args: Arguments to pass to update_datastore
+            **kwargs: Keyword arguments to pass to update_datastore
 
         Returns:
             None
         """
-        self.create_datastore(schema, primary_key, 2)
+        await self._run_async(self.configuration, self.update_datastore, *args, **kwargs)
 
     def update_datastore_from_yaml_schema(self, path: str) -> None:
         """Update a resource in the HDX datastore from a YAML file containing a list of fields and types of
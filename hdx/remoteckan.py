@@ -0,0 +1,497 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Shared, pooled CKAN clients so that all HDX objects talking to the same HDX site reuse keep-alive connections"""
+import copy
+import gzip
+import json
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock, local
+from time import monotonic
+from typing import Optional, Any, Callable, Tuple, Set
+from urllib.parse import urlparse
+
+import ckanapi
+import ckanapi.errors
+import requests
+
+from hdx.configuration import Configuration
+from hdx.utilities.path import script_dir_plus_file
+from hdx.utilities.session import get_session
+
+logger = logging.getLogger(__name__)
+
+
+class RequestTooLargeError(ckanapi.errors.CKANAPIError):
+    """Raised when HDX rejects a request as too large (HTTP 413)"""
+    pass
+
+
+class ResponseCache(object):
+    """In-process cache of responses to CKAN read actions (those ending in _show, _list or _search) keyed on action
+    and parameters. It holds at most maxsize entries, evicting the least recently used first, and entries expire ttl
+    seconds after being stored. Each entry is tagged with the identifiers (ids and names) of the HDX objects involved
+    so that writes can invalidate just the affected entries. Search entries are invalidated by any write.
+
+    Args:
+        maxsize (Optional[int]): Maximum number of entries. Defaults to 1000.
+        ttl (Optional[float]): Time to live of entries in seconds. Defaults to 300.
+    """
+    cacheable_suffixes = ('_show', '_list', '_search')
+    identifier_fields = ('id', 'name', 'package_id', 'resource_id', 'dataset_id')
+
+    def __init__(self, maxsize: Optional[int] = 1000, ttl: Optional[float] = 300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    @staticmethod
+    def is_cacheable(action: str) -> bool:
+        """Check if responses to action can be cached
+
+        Args:
+            action (str): CKAN action
+
+        Returns:
+            bool: True if action is a read action whose responses can be cached, False if not
+        """
+        return action.endswith(ResponseCache.cacheable_suffixes)
+
+    @staticmethod
+    def get_key(action: str, data: dict) -> str:
+        """Get cache key for action and parameters
+
+        Args:
+            action (str): CKAN action
+            data (dict): Parameters of action
+
+        Returns:
+            str: Cache key
+        """
+        return '%s:%s' % (action, json.dumps(data, sort_keys=True, default=str))
+
+    @staticmethod
+    def get_identifiers(data: Optional[dict], result: Any = None) -> Set[str]:
+        """Get identifiers of HDX objects referred to by parameters and result of an action
+
+        Args:
+            data (Optional[dict]): Parameters of action
+            result (Any): Result of action. Defaults to None.
+
+        Returns:
+            Set[str]: Identifiers
+        """
+        identifiers = set()
+        dicts = list()
+        if isinstance(data, dict):
+            dicts.append(data)
+        if isinstance(result, dict):
+            dicts.append(result)
+            dicts.extend(x for x in result.get('resources', list()) if isinstance(x, dict))
+        elif isinstance(result, list):
+            dicts.extend(x for x in result if isinstance(x, dict))
+        for dictionary in dicts:
+            for field in ResponseCache.identifier_fields:
+                value = dictionary.get(field)
+                if isinstance(value, str) and value:
+                    identifiers.add(value)
+        return identifiers
+
+    def get(self, action: str, data: dict) -> Tuple[bool, Any]:
+        """Get cached response for action and parameters
+
+        Args:
+            action (str): CKAN action
+            data (dict): Parameters of action
+
+        Returns:
+            Tuple[bool, Any]: (True if found in cache else False, copy of cached result if found else None)
+        """
+        key = self.get_key(action, data)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expiry, result, _, _ = entry
+                if expiry > monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, copy.deepcopy(result)
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, action: str, data: dict, result: Any) -> None:
+        """Store response for action and parameters
+
+        Args:
+            action (str): CKAN action
+            data (dict): Parameters of action
+            result (Any): Result of action
+
+        Returns:
+            None
+        """
+        if self.maxsize < 1:
+            return
+        key = self.get_key(action, data)
+        identifiers = self.get_identifiers(data, result)
+        with self._lock:
+            self._entries[key] = (monotonic() + self.ttl, copy.deepcopy(result), action, identifiers)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, data: Optional[dict], result: Any = None) -> int:
+        """Remove entries affected by a write with the given parameters and result ie. entries that refer to any of
+        the same identifiers and all search entries
+
+        Args:
+            data (Optional[dict]): Parameters of write action
+            result (Any): Result of write action. Defaults to None.
+
+        Returns:
+            int: Number of entries removed
+        """
+        identifiers = self.get_identifiers(data, result)
+        with self._lock:
+            keys = [key for key, (_, _, action, entry_identifiers) in self._entries.items()
+                    if action.endswith('_search') or identifiers & entry_identifiers]
+            for key in keys:
+                del self._entries[key]
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self) -> None:
+        """Remove all entries
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def get_statistics(self) -> dict:
+        """Get cache statistics
+
+        Returns:
+            dict: Dictionary with size, maxsize, hits, misses, evictions and invalidations
+        """
+        with self._lock:
+            return {'size': len(self._entries), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions, 'invalidations': self.invalidations}
+
+
+class PooledRemoteCKAN(ckanapi.RemoteCKAN):
+    """RemoteCKAN that sends all requests through a supplied requests session rather than opening a new
+    connection for every call. The number of HTTP calls made is kept in call_count. If response_cache is set to a
+    ResponseCache, HDX objects will use it for read actions. Requests rejected as too large raise
+    RequestTooLargeError.
+
+    If compress_requests is True, JSON request bodies of at least compress_min_bytes are gzip compressed and sent
+    with a Content-Encoding: gzip header. If the server rejects a compressed request as one it cannot decode (HTTP
+    415, or HTTP 400 with a body decoding error) and accepts it uncompressed, the host is remembered and requests to
+    it are no longer compressed by any client. Other errors are returned as they are without resending the request.
+    The bytes sent before and after compression are counted (see get_compression_statistics).
+
+    Args:
+        address (str): HDX site url
+        session (requests.Session): Session to use for requests
+        apikey (Optional[str]): HDX api key. Defaults to None.
+        user_agent (Optional[str]): User agent. Defaults to None.
+        max_workers (Optional[int]): Maximum number of threads for asynchronous calls. Defaults to 10.
+        response_cache (Optional[ResponseCache]): Cache for read action responses. Defaults to None (no caching).
+        compress_requests (Optional[bool]): Whether to gzip compress request bodies. Defaults to False.
+        compress_min_bytes (Optional[int]): Smallest request body to compress. Defaults to 1024.
+        compress_level (Optional[int]): Gzip compression level (1 to 9). Defaults to 6.
+    """
+    # marks the threads that are running work offloaded to a client's thread pool (see run_in_executor_thread)
+    _executor_thread = local()
+    # substrings of HTTP 400 responses that mean the server could not decode a compressed body
+    rejected_compression_messages = ('JSON Error', 'decod')
+    _compression_rejected_hosts = set()
+    _compression_rejected_lock = Lock()
+
+    def __init__(self, address: str, session: requests.Session, apikey: Optional[str] = None,
+                 user_agent: Optional[str] = None, max_workers: Optional[int] = 10,
+                 response_cache: Optional[ResponseCache] = None, compress_requests: Optional[bool] = False,
+                 compress_min_bytes: Optional[int] = 1024, compress_level: Optional[int] = 6):
+        super(PooledRemoteCKAN, self).__init__(address, apikey=apikey, user_agent=user_agent)
+        self.session = session
+        self.max_workers = max_workers
+        self.response_cache = response_cache
+        self.compress_requests = compress_requests
+        self.compress_min_bytes = compress_min_bytes
+        self.compress_level = compress_level
+        self.call_count = 0
+        self._call_count_lock = Lock()
+        self._compression_statistics = {'requests': 0, 'bytes_before': 0, 'bytes_after': 0, 'fallbacks': 0}
+        self._compression_lock = Lock()
+        self._executor = None
+        self._executor_lock = Lock()
+
+    def get_executor(self) -> ThreadPoolExecutor:
+        """Get thread pool that the coroutine methods of HDX objects offload their blocking calls to, creating it if
+        needed. Its size bounds the number of concurrent asynchronous calls. It is dedicated to those calls: blocking
+        calls that do work in parallel (eg. concurrent datastore uploads or prefetching search pages) use thread pools
+        of their own, and a coroutine method called from work running in one of its threads runs inline (see
+        in_executor_thread) rather than waiting for another of its workers, so it cannot deadlock.
+
+        Returns:
+            ThreadPoolExecutor: Thread pool
+        """
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    @staticmethod
+    def run_in_executor_thread(function: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run function in a worker of the thread pool of a client (see get_executor), marking the current thread
+        as such while it runs
+
+        Args:
+            function (Callable[..., Any]): Function to run
+            *args: Arguments to pass to function
+            **kwargs: Keyword arguments to pass to function
+
+        Returns:
+            Any: Return value of function
+        """
+        PooledRemoteCKAN._executor_thread.active = True
+        try:
+            return function(*args, **kwargs)
+        finally:
+            PooledRemoteCKAN._executor_thread.active = False
+
+    @staticmethod
+    def in_executor_thread() -> bool:
+        """Check if the current thread is running work offloaded to the thread pool of a client (see
+        run_in_executor_thread)
+
+        Returns:
+            bool: True if current thread is running work of a client's thread pool, False if not
+        """
+        return getattr(PooledRemoteCKAN._executor_thread, 'active', False)
+
+    def close(self) -> None:
+        """Close session and shut down thread pool
+
+        Returns:
+            None
+        """
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+        self.session.close()
+
+    def _count_call(self) -> None:
+        with self._call_count_lock:
+            self.call_count += 1
+
+    def get_compression_statistics(self) -> dict:
+        """Get statistics of compressed requests: number of requests compressed, bytes before and after
+        compression, bytes saved, compression ratio and number of compressed requests that were rejected and resent
+        uncompressed
+
+        Returns:
+            dict: Compression statistics
+        """
+        with self._compression_lock:
+            statistics = dict(self._compression_statistics)
+        statistics['bytes_saved'] = statistics['bytes_before'] - statistics['bytes_after']
+        if statistics['bytes_before']:
+            statistics['ratio'] = statistics['bytes_after'] / statistics['bytes_before']
+        else:
+            statistics['ratio'] = 1.0
+        return statistics
+
+    @staticmethod
+    def is_compression_rejected(response: requests.Response) -> bool:
+        """Check if response is a rejection of a compressed request body that the server could not decode
+
+        Args:
+            response (requests.Response): Response to compressed request
+
+        Returns:
+            bool: True if the server could not decode the compressed body, False if not
+        """
+        if response.status_code == 415:
+            return True
+        if response.status_code == 400:
+            text = response.text or ''
+            return any(message in text for message in PooledRemoteCKAN.rejected_compression_messages)
+        return False
+
+    @staticmethod
+    def get_host(url: str) -> str:
+        """Get host (with port if any) of url in lower case
+
+        Args:
+            url (str): URL
+
+        Returns:
+            str: Host
+        """
+        return urlparse(url).netloc.lower()
+
+    @staticmethod
+    def accepts_compression(url: str) -> bool:
+        """Check if the host of url has not rejected a compressed request
+
+        Args:
+            url (str): URL
+
+        Returns:
+            bool: False if the host has rejected a compressed request, True if not
+        """
+        host = PooledRemoteCKAN.get_host(url)
+        with PooledRemoteCKAN._compression_rejected_lock:
+            return host not in PooledRemoteCKAN._compression_rejected_hosts
+
+    @staticmethod
+    def reset_compression_rejections() -> None:
+        """Forget which hosts have rejected compressed requests
+
+        Returns:
+            None
+        """
+        with PooledRemoteCKAN._compression_rejected_lock:
+            PooledRemoteCKAN._compression_rejected_hosts.clear()
+
+    def _post(self, url, data, headers, files, requests_kwargs) -> requests.Response:
+        self._count_call()
+        return self.session.post(url, data=data, headers=headers, files=files, allow_redirects=False,
+                                 **requests_kwargs)
+
+    def _post_compressed(self, url, data, headers, files, requests_kwargs) -> requests.Response:
+        compressed = gzip.compress(data, self.compress_level)
+        gzip_headers = dict(headers)
+        gzip_headers['Content-Encoding'] = 'gzip'
+        r = self._post(url, compressed, gzip_headers, files, requests_kwargs)
+        if self.is_compression_rejected(r):
+            uncompressed_r = self._post(url, data, headers, files, requests_kwargs)
+            if self.is_compression_rejected(uncompressed_r):
+                return uncompressed_r
+            host = self.get_host(url)
+            logger.warning('%s rejected gzip compressed request (HTTP %d) so requests to it will not be compressed' %
+                           (host, r.status_code))
+            with PooledRemoteCKAN._compression_rejected_lock:
+                PooledRemoteCKAN._compression_rejected_hosts.add(host)
+            with self._compression_lock:
+                self._compression_statistics['fallbacks'] += 1
+            return uncompressed_r
+        with self._compression_lock:
+            self._compression_statistics['requests'] += 1
+            self._compression_statistics['bytes_before'] += len(data)
+            self._compression_statistics['bytes_after'] += len(compressed)
+        logger.debug('Compressed request to %s from %d to %d bytes' % (url, len(data), len(compressed)))
+        return r
+
+    def _request_fn(self, url, data, headers, files, requests_kwargs):
+        if self.compress_requests and not files and isinstance(data, bytes) and len(data) >= self.compress_min_bytes \
+                and self.accepts_compression(url):
+            r = self._post_compressed(url, data, headers, files, requests_kwargs)
+        else:
+            r = self._post(url, data, headers, files, requests_kwargs)
+        if r.status_code == 413:
+            raise RequestTooLargeError(repr([url, r.status_code, r.text]))
+        return r.status_code, r.text
+
+    def _request_fn_get(self, url, data_dict, headers, requests_kwargs):
+        self._count_call()
+        r = self.session.get(url, params=data_dict, headers=headers, **requests_kwargs)
+        return r.status_code, r.text
+
+
+class RemoteCKANRegistry(object):
+    """Registry of PooledRemoteCKAN clients keyed by HDX site url, api key, credentials and the client options read
+    from the configuration. Every HDX object created with an equivalent configuration is handed the same client and
+    hence the same session, while configurations with different options get clients of their own.
+    """
+    _clients = dict()
+    _lock = Lock()
+    _user_agent = None
+
+    @staticmethod
+    def get_user_agent() -> str:
+        """Get user agent string for the library (version file is only read once)
+
+        Returns:
+            str: User agent string
+        """
+        if RemoteCKANRegistry._user_agent is None:
+            with open(script_dir_plus_file('version.txt', RemoteCKANRegistry)) as version_file:
+                version = version_file.read().strip()
+            RemoteCKANRegistry._user_agent = 'HDXPythonLibrary/%s' % version
+        return RemoteCKANRegistry._user_agent
+
+    @staticmethod
+    def get_key(configuration: Configuration) -> tuple:
+        """Get registry key for configuration
+
+        Args:
+            configuration (Configuration): HDX Configuration
+
+        Returns:
+            tuple: (HDX site url, HDX api key, HDX site credentials, pool size, response cache size, response cache
+            time to live, whether to compress requests, smallest request to compress, compression level)
+        """
+        return configuration.get_hdx_site_url(), configuration.get_api_key(), configuration._get_credentials(), \
+            configuration.get('pool_maxsize', 10), configuration.get('response_cache_maxsize', 0), \
+            configuration.get('response_cache_ttl', 300), configuration.get('compress_requests', False), \
+            configuration.get('compress_min_bytes', 1024), configuration.get('compress_level', 6)
+
+    @staticmethod
+    def get_remoteckan(configuration: Configuration) -> PooledRemoteCKAN:
+        """Get shared CKAN client for configuration, creating it if it does not exist. Configurations that differ in
+        any of the options below are given different clients. The pool size is taken from
+        the pool_maxsize key of the configuration (defaulting to 10). If the configuration has a positive
+        response_cache_maxsize, the client is given a ResponseCache of that size with entries expiring after
+        response_cache_ttl seconds (defaulting to 300). Request bodies are gzip compressed if compress_requests is
+        True, in which case compress_min_bytes (defaulting to 1024) and compress_level (defaulting to 6) are also read.
+
+        Args:
+            configuration (Configuration): HDX Configuration
+
+        Returns:
+            PooledRemoteCKAN: Shared CKAN client
+        """
+        key = RemoteCKANRegistry.get_key(configuration)
+        with RemoteCKANRegistry._lock:
+            remoteckan = RemoteCKANRegistry._clients.get(key)
+            if remoteckan is None:
+                url, apikey, _, pool_maxsize, response_cache_maxsize, response_cache_ttl, compress_requests, \
+                    compress_min_bytes, compress_level = key
+                logger.debug('Creating CKAN client for %s with pool size %d' % (url, pool_maxsize))
+                # the last 5xx response after retries reaches ckanapi so that it raises CKANAPIError as usual
+                session = get_session(pool_maxsize=pool_maxsize, raise_on_status=False)
+                response_cache = None
+                if response_cache_maxsize:
+                    response_cache = ResponseCache(response_cache_maxsize, response_cache_ttl)
+                remoteckan = PooledRemoteCKAN(url, session, apikey=apikey,
+                                              user_agent=RemoteCKANRegistry.get_user_agent(),
+                                              max_workers=pool_maxsize, response_cache=response_cache,
+                                              compress_requests=compress_requests,
+                                              compress_min_bytes=compress_min_bytes, compress_level=compress_level)
+                RemoteCKANRegistry._clients[key] = remoteckan
+            return remoteckan
+
+    @staticmethod
+    def clear() -> None:
+        """Close and remove all shared CKAN clients
+
+        Returns:
+            None
+        """
+        with RemoteCKANRegistry._lock:
+            for remoteckan in RemoteCKANRegistry._clients.values():
+                remoteckan.close()
+            RemoteCKANRegistry._clients = dict()
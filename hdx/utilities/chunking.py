@@ -0,0 +1,125 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Chunking utilities"""
+import logging
+from threading import Lock
+from typing import Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ByteBudgetChunker(object):
+    """Splits rows into chunks whose estimated JSON size is close to a byte budget rather than a fixed number of rows,
+    so that narrow and wide tables produce requests of similar size. The budget adapts to the throughput observed for
+    uploaded chunks: it grows while throughput improves, holds when it levels off, shrinks when it drops, and is
+    halved by back_off (eg. after a timeout or a request rejected as too large).
+
+    Args:
+        target_bytes (Optional[int]): Initial byte budget per chunk. Defaults to 1048576 (1 MiB).
+        min_bytes (Optional[int]): Smallest byte budget. Defaults to 65536 (64 KiB).
+        max_bytes (Optional[int]): Largest byte budget. Defaults to 8388608 (8 MiB).
+        growth (Optional[float]): Factor by which the budget grows or shrinks. Defaults to 1.5.
+    """
+
+    def __init__(self, target_bytes: Optional[int] = 1048576, min_bytes: Optional[int] = 65536,
+                 max_bytes: Optional[int] = 8388608, growth: Optional[float] = 1.5):
+        self.min_bytes = min_bytes
+        self.max_bytes = max_bytes
+        self.target_bytes = min(max(target_bytes, min_bytes), max_bytes)
+        self.growth = growth
+        self.best_throughput = None
+        self.number_chunks = 0
+        self.budgets = [self.target_bytes]
+        self._lock = Lock()
+
+    @staticmethod
+    def estimate_size(row: dict) -> int:
+        """Estimate size of row when serialised as JSON without serialising it
+
+        Args:
+            row (dict): Row
+
+        Returns:
+            int: Estimated size in bytes
+        """
+        size = 2
+        for key, value in row.items():
+            size += len(str(key)) + len(str(value)) + 8
+        return size
+
+    @staticmethod
+    def estimate_chunk_size(rowset: List[dict]) -> int:
+        """Estimate size of chunk of rows when serialised as JSON without serialising it
+
+        Args:
+            rowset (List[dict]): Chunk of rows
+
+        Returns:
+            int: Estimated size in bytes
+        """
+        return sum(ByteBudgetChunker.estimate_size(row) + 2 for row in rowset)
+
+    def chunks(self, rows: Iterable[dict]) -> Iterator[List[dict]]:
+        """Group rows into chunks of about the current byte budget, reading rows only as each chunk is needed so
+        that no more than one chunk is held in memory
+
+        Args:
+            rows (Iterable[dict]): Rows eg. from csv.DictReader
+
+        Returns:
+            Iterator[List[dict]]: Iterator of chunks of rows
+        """
+        rowset = list()
+        size = 0
+        for row in rows:
+            rowsize = self.estimate_size(row) + 2
+            if rowset and size + rowsize > self.target_bytes:
+                self.number_chunks += 1
+                yield rowset
+                rowset = list()
+                size = 0
+            rowset.append(row)
+            size += rowsize
+        if rowset:
+            self.number_chunks += 1
+            yield rowset
+
+    def _set_target(self, target_bytes: int, reason: str) -> None:
+        target_bytes = int(min(max(target_bytes, self.min_bytes), self.max_bytes))
+        if target_bytes != self.target_bytes:
+            logger.info('Chunk size budget %d -> %d bytes (%s)' % (self.target_bytes, target_bytes, reason))
+            self.target_bytes = target_bytes
+            self.budgets.append(target_bytes)
+
+    def record(self, nbytes: int, seconds: float) -> None:
+        """Record the time taken to upload a chunk and adapt the byte budget
+
+        Args:
+            nbytes (int): Estimated size of chunk in bytes
+            seconds (float): Time taken to upload chunk
+
+        Returns:
+            None
+        """
+        throughput = nbytes / max(seconds, 1e-6)
+        with self._lock:
+            if self.best_throughput is None or throughput > self.best_throughput * 1.05:
+                self.best_throughput = throughput
+                self._set_target(self.target_bytes * self.growth, 'throughput improved to %.0f bytes/s' % throughput)
+            elif throughput < self.best_throughput * 0.5:
+                self.best_throughput = throughput
+                self._set_target(self.target_bytes / self.growth, 'throughput dropped to %.0f bytes/s' % throughput)
+
+    def back_off(self, reason: str = 'request failed') -> int:
+        """Halve the byte budget eg. after a timeout or a request rejected as too large
+
+        Args:
+            reason (str): Reason for backing off (for logging). Defaults to 'request failed'.
+
+        Returns:
+            int: New byte budget
+        """
+        with self._lock:
+            self.best_throughput = None
+            self._set_target(self.target_bytes / 2, reason)
+            return self.target_bytes
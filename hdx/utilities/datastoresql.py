@@ -0,0 +1,260 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Building of SQL for the CKAN datastore_search_sql action with safely quoted identifiers and values"""
+import math
+from typing import Any, List, Optional, Union
+
+
+def quote_identifier(name: str) -> str:
+    """Quote identifier (eg. field name or resource id) for PostgreSQL so that it cannot break out of the quotes
+
+    Args:
+        name (str): Identifier
+
+    Returns:
+        str: Quoted identifier
+    """
+    if not isinstance(name, str) or not name or '\x00' in name:
+        raise ValueError('Invalid identifier: %r' % name)
+    return '"%s"' % name.replace('"', '""')
+
+
+def quote_literal(value: Any) -> str:
+    """Quote value as PostgreSQL literal. None becomes NULL, bools TRUE or FALSE, finite numbers are unquoted and
+    everything else is converted to a string quoted with single quotes (embedded quotes are doubled).
+
+    Args:
+        value (Any): Value
+
+    Returns:
+        str: Literal
+    """
+    if value is None:
+        return 'NULL'
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        if not math.isfinite(value):
+            raise ValueError('Invalid number: %r' % value)
+        return repr(value)
+    value = str(value)
+    if '\x00' in value:
+        raise ValueError('Invalid string: %r' % value)
+    return "'%s'" % value.replace("'", "''")
+
+
+def get_conditions(filters: Optional[dict]) -> List[str]:
+    """Get SQL conditions for filters of the form used by datastore_search ie. {'FIELD': VALUE} or
+    {'FIELD': [VALUE1, VALUE2]} to match any of several values. A value of None matches nulls.
+
+    Args:
+        filters (Optional[dict]): Filters
+
+    Returns:
+        List[str]: List of conditions to be joined with AND
+    """
+    conditions = list()
+    if not filters:
+        return conditions
+    for field, value in filters.items():
+        identifier = quote_identifier(field)
+        if value is None:
+            conditions.append('%s IS NULL' % identifier)
+        elif isinstance(value, (list, tuple, set, frozenset)):
+            if value:
+                conditions.append('%s IN (%s)' % (identifier, ', '.join(quote_literal(x) for x in value)))
+            else:
+                conditions.append('FALSE')
+        else:
+            conditions.append('%s = %s' % (identifier, quote_literal(value)))
+    return conditions
+
+
+def get_select(resource_id: str, fields: Optional[List[str]] = None, conditions: Optional[List[str]] = None,
+               order_by: Optional[List[str]] = None, limit: Optional[int] = None) -> str:
+    """Get SQL SELECT statement for datastore table
+
+    Args:
+        resource_id (str): Resource id (name of datastore table)
+        fields (Optional[List[str]]): Fields to return. Defaults to None (all fields).
+        conditions (Optional[List[str]]): Conditions to be joined with AND. Defaults to None.
+        order_by (Optional[List[str]]): Fields to sort by in ascending order. Defaults to None.
+        limit (Optional[int]): Maximum number of rows. Defaults to None.
+
+    Returns:
+        str: SQL statement
+    """
+    if fields:
+        columns = ', '.join(quote_identifier(field) for field in fields)
+    else:
+        columns = '*'
+    sql = 'SELECT %s FROM %s' % (columns, quote_identifier(resource_id))
+    if conditions:
+        sql = '%s WHERE %s' % (sql, ' AND '.join(conditions))
+    if order_by:
+        sql = '%s ORDER BY %s' % (sql, ', '.join(quote_identifier(field) for field in order_by))
+    if limit is not None:
+        sql = '%s LIMIT %d' % (sql, int(limit))
+    return sql
+
+
+def format_sql(sql: str, params: Optional[Union[dict, list, tuple]] = None) -> str:
+    """Substitute parameters into SQL as quoted literals, as datastore_search_sql does not take bind parameters.
+    Placeholders are %(name)s for a dictionary of parameters or %s for a list (use %% for a literal percent sign).
+    If params is None, SQL is returned unchanged.
+
+    Args:
+        sql (str): SQL statement with placeholders
+        params (Optional[Union[dict, list, tuple]]): Parameters. Defaults to None.
+
+    Returns:
+        str: SQL statement
+    """
+    if params is None:
+        return sql
+    if isinstance(params, dict):
+        return sql % {name: quote_literal(value) for name, value in params.items()}
+    return sql % tuple(quote_literal(value) for value in params)
+
+
+def _get_top_level_words(sql: str) -> List[str]:
+    """Get the words of an SQL statement that are not inside parentheses, quotes or comments, in upper case
+
+    Args:
+        sql (str): SQL statement
+
+    Returns:
+        List[str]: Top level words
+    """
+    words = list()
+    depth = 0
+    i = 0
+    length = len(sql)
+    while i < length:
+        char = sql[i]
+        if char in '\'"':
+            end = sql.find(char, i + 1)
+            while end != -1 and sql[end + 1:end + 2] == char:
+                end = sql.find(char, end + 2)
+            i = length if end == -1 else end + 1
+        elif sql.startswith('--', i):
+            end = sql.find('\n', i)
+            i = length if end == -1 else end + 1
+        elif sql.startswith('/*', i):
+            end = sql.find('*/', i + 2)
+            i = length if end == -1 else end + 2
+        elif char == '(':
+            depth += 1
+            i += 1
+        elif char == ')':
+            depth -= 1
+            i += 1
+        elif char.isalpha() or char == '_':
+            end = i + 1
+            while end < length and (sql[end].isalnum() or sql[end] in '_$'):
+                end += 1
+            if depth == 0:
+                words.append(sql[i:end].upper())
+            i = end
+        else:
+            i += 1
+    return words
+
+
+def get_page_sql(sql: str, limit: int, offset: int) -> str:
+    """Get SQL for one page of the results of a statement by appending LIMIT and OFFSET to it. PostgreSQL only
+    guarantees a consistent order of rows across pages for the statement's own ORDER BY, so it must have a top level
+    ORDER BY clause (which should give a unique order eg. by including _id) and no top level LIMIT, OFFSET or FETCH.
+
+    Args:
+        sql (str): SQL statement
+        limit (int): Number of rows per page
+        offset (int): Offset of page
+
+    Returns:
+        str: SQL statement for page
+    """
+    sql = sql.strip().rstrip(';').rstrip()
+    words = _get_top_level_words(sql)
+    if not any(word == 'ORDER' and next_word == 'BY' for word, next_word in zip(words, words[1:])):
+        raise ValueError('Statement must have a top level ORDER BY clause to be paged: %s' % sql)
+    if any(word in ('LIMIT', 'OFFSET', 'FETCH') for word in words):
+        raise ValueError('Statement to be paged cannot have its own LIMIT, OFFSET or FETCH: %s' % sql)
+    return '%s LIMIT %d OFFSET %d' % (sql, int(limit), int(offset))
+
+
+def _get_where(filters: Optional[dict]) -> str:
+    conditions = get_conditions(filters)
+    if not conditions:
+        return ''
+    return ' WHERE %s' % ' AND '.join(conditions)
+
+
+def get_sum(resource_id: str, value_fields: List[str], group_by: Optional[List[str]] = None,
+            filters: Optional[dict] = None) -> str:
+    """Get SQL that sums numeric fields, optionally grouped by other fields. Each sum is named after its field.
+
+    Args:
+        resource_id (str): Resource id (name of datastore table)
+        value_fields (List[str]): Numeric fields to sum
+        group_by (Optional[List[str]]): Fields to group by. Defaults to None (sum over all rows).
+        filters (Optional[dict]): Filters of form {'FIELD': VALUE} or {'FIELD': [VALUE1, VALUE2]}. Defaults to None.
+
+    Returns:
+        str: SQL statement
+    """
+    if not value_fields:
+        raise ValueError('At least one field to sum is required!')
+    groups = [quote_identifier(field) for field in group_by or list()]
+    sums = ['SUM(%s) AS %s' % (quote_identifier(field), quote_identifier(field)) for field in value_fields]
+    sql = 'SELECT %s FROM %s%s' % (', '.join(groups + sums), quote_identifier(resource_id), _get_where(filters))
+    if groups:
+        sql = '%s GROUP BY %s ORDER BY %s' % (sql, ', '.join(groups), ', '.join(groups))
+    return sql
+
+
+def get_count(resource_id: str, group_by: Optional[List[str]] = None, filters: Optional[dict] = None) -> str:
+    """Get SQL that counts rows, optionally grouped by fields. The count is named count.
+
+    Args:
+        resource_id (str): Resource id (name of datastore table)
+        group_by (Optional[List[str]]): Fields to group by. Defaults to None (count all rows).
+        filters (Optional[dict]): Filters of form {'FIELD': VALUE} or {'FIELD': [VALUE1, VALUE2]}. Defaults to None.
+
+    Returns:
+        str: SQL statement
+    """
+    groups = [quote_identifier(field) for field in group_by or list()]
+    sql = 'SELECT %s FROM %s%s' % (', '.join(groups + ['COUNT(*) AS "count"']), quote_identifier(resource_id),
+                                   _get_where(filters))
+    if groups:
+        sql = '%s GROUP BY %s ORDER BY %s' % (sql, ', '.join(groups), ', '.join(groups))
+    return sql
+
+
+def get_latest(resource_id: str, date_field: str, group_by: List[str], fields: Optional[List[str]] = None,
+               filters: Optional[dict] = None) -> str:
+    """Get SQL that selects the row with the latest date for each group using PostgreSQL's DISTINCT ON. Rows with
+    no date are only chosen if their group has no dated rows.
+
+    Args:
+        resource_id (str): Resource id (name of datastore table)
+        date_field (str): Date field
+        group_by (List[str]): Fields to group by
+        fields (Optional[List[str]]): Fields to return. Defaults to None (all fields).
+        filters (Optional[dict]): Filters of form {'FIELD': VALUE} or {'FIELD': [VALUE1, VALUE2]}. Defaults to None.
+
+    Returns:
+        str: SQL statement
+    """
+    if not group_by:
+        raise ValueError('At least one field to group by is required!')
+    groups = ', '.join(quote_identifier(field) for field in group_by)
+    if fields:
+        columns = ', '.join(quote_identifier(field) for field in fields)
+    else:
+        columns = '*'
+    return 'SELECT DISTINCT ON (%s) %s FROM %s%s ORDER BY %s, %s DESC NULLS LAST' % \
+           (groups, columns, quote_identifier(resource_id), _get_where(filters), groups, quote_identifier(date_field))
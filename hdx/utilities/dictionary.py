@@ -1,21 +1,73 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 """Dict utilities"""
+import copy
 from collections import UserDict
 
-from typing import List, Optional, TypeVar
+from typing import List, Optional, TypeVar, Any, Tuple
 
 DictUpperBound = TypeVar('T', bound='dict')
 
 
-def merge_two_dictionaries(a: DictUpperBound, b: DictUpperBound) -> DictUpperBound:
-    """Merges b into a and returns merged result
+def get_list_item_identifiers(item: Any) -> List[Tuple[str, Any]]:
+    """Get the identifying (id and name) fields of a list item if it is a dictionary
+
+    Args:
+        item (Any): List item
+
+    Returns:
+        List[Tuple[str, Any]]: List of (field, value) for id and name fields that are present
+    """
+    if not isinstance(item, (dict, UserDict)):
+        return list()
+    return [(key, item[key]) for key in ('id', 'name') if isinstance(item.get(key), (str, int))]
+
+
+def replace_list(a: list, b: list) -> list:
+    """Replaces list a with list b, except that dictionaries in b that identify a dictionary in a (by id or name) are
+    merged into a copy of that dictionary. Items given only by name (eg. {'name': 'conflict'}) then equal the full
+    items in a. If b has exactly the items of a, the order of a is kept.
+
+    Args:
+        a (list): List to replace
+        b (list): List to replace with
+
+    Returns:
+        list: Replacement list
+    """
+    index = dict()
+    for i, item in enumerate(a):
+        for identifier in get_list_item_identifiers(item):
+            index.setdefault(identifier, i)
+    result = list()
+    matched = list()
+    for item in b:
+        i = next((index[identifier] for identifier in get_list_item_identifiers(item) if identifier in index), None)
+        if i is None:
+            result.append(item)
+            continue
+        result.append(merge_two_dictionaries(copy.deepcopy(a[i]), item, replace_lists=True))
+        matched.append(i)
+    if len(result) == len(a) and sorted(matched) == list(range(len(a))):
+        ordered = [None] * len(a)
+        for i, item in zip(matched, result):
+            ordered[i] = item
+        return ordered
+    return result
+
+
+def merge_two_dictionaries(a: DictUpperBound, b: DictUpperBound, replace_lists: bool = False) -> DictUpperBound:
+    """Merges b into a and returns merged result. By default lists in b are appended to those in a. If replace_lists
+    is True, they replace them instead (see replace_list), which is how local metadata is merged into what was read
+    from HDX when updating.
 
     NOTE: tuples and arbitrary objects are not handled as it is totally ambiguous what should happen
 
     Args:
         a (DictUpperBound): dictionary to merge into
         b: (DictUpperBound): dictionary to merge from
+        replace_lists (bool): Whether lists in b replace those in a rather than being appended to them. Defaults to
+        False.
 
     Returns:
         DictUpperBound: Merged dictionary
@@ -29,8 +81,13 @@ def merge_two_dictionaries(a: DictUpperBound, b: DictUpperBound) -> DictUpperBou
             # border case for first run or if a is a primitive
             a = b
         elif isinstance(a, list):
-            # lists can be only appended
-            if isinstance(b, list):
+            # lists can be only appended unless they are to be replaced
+            if replace_lists:
+                if isinstance(b, list):
+                    a = replace_list(a, b)
+                else:
+                    a = b
+            elif isinstance(b, list):
                 # merge lists
                 a.extend(b)
             else:
@@ -41,7 +98,7 @@ def merge_two_dictionaries(a: DictUpperBound, b: DictUpperBound) -> DictUpperBou
             if isinstance(b, dict) or isinstance(b, UserDict):
                 for key in b:
                     if key in a:
-                        a[key] = merge_two_dictionaries(a[key], b[key])
+                        a[key] = merge_two_dictionaries(a[key], b[key], replace_lists)
                     else:
                         a[key] = b[key]
             else:
@@ -88,3 +145,23 @@ def dict_diff(d1: dict, d2: dict, no_key: Optional[str] = '<KEYNOTFOUND>') -> di
     diff.update({k: (d1[k], no_key) for k in d1keys - both})
     diff.update({k: (no_key, d2[k]) for k in d2keys - both})
     return diff
+
+
+def dict_diff_deep(d1: dict, d2: dict, no_key: Optional[str] = '<KEYNOTFOUND>') -> dict:
+    """Compares two dictionaries recursively. Where the values of a key in both dictionaries are themselves
+    dictionaries, the comparison dictionary contains their (nested) comparison dictionary instead of the pair of values.
+
+    Args:
+        d1 (dict): First dictionary to compare
+        d2 (dict): Second dictionary to compare
+        no_key (Optional[str]): What value to use if key is not found Defaults to '<KEYNOTFOUND>'.
+
+    Returns:
+        dict: Comparison dictionary (empty if dictionaries are equal)
+
+    """
+    diff = dict_diff(d1, d2, no_key)
+    for k, (v1, v2) in diff.items():
+        if isinstance(v1, dict) and isinstance(v2, dict):
+            diff[k] = dict_diff_deep(v1, v2, no_key)
+    return diff
@@ -0,0 +1,270 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Cache of downloaded files that are revalidated with conditional requests"""
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from os.path import join, exists, getsize, splitext
+from posixpath import basename
+from threading import Lock
+from typing import Optional
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+
+class DownloadCache(object):
+    """Folder of downloaded files keyed by url along with their ETag and Last-Modified headers, indexed in a SQLite
+    database in the folder so that it survives process restarts. Before a cached url is downloaded again, the server
+    is asked with If-None-Match and If-Modified-Since whether it has changed, and if it has not (HTTP 304) the file is
+    served from disk. The total size of the cached files is kept within max_bytes by evicting the least recently used
+    files first. Counts of hits (served from disk), misses (downloaded), revalidations (conditional requests made)
+    and evictions are kept (see get_statistics). Cached files are served by hard linking them into place where
+    possible, so deleting a served file is fine but it should not be modified in place.
+
+    Args:
+        folder (str): Folder for cached files (created if it does not exist)
+        max_bytes (Optional[int]): Maximum total size of cached files. Defaults to 1073741824 (1 GiB).
+    """
+
+    def __init__(self, folder: str, max_bytes: Optional[int] = 1073741824):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+        os.makedirs(folder, exist_ok=True)
+        self._lock = Lock()
+        self._connection = sqlite3.connect(join(folder, 'index.db'), check_same_thread=False)
+        with self._connection:
+            self._connection.execute('CREATE TABLE IF NOT EXISTS entries (url TEXT PRIMARY KEY, filename TEXT, '
+                                     'etag TEXT, last_modified TEXT, size INTEGER, last_used REAL)')
+            self._connection.execute('CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)')
+
+    def close(self) -> None:
+        """Close the index database connection
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._connection.close()
+
+    @staticmethod
+    def get_filename(url: str) -> str:
+        """Get name of cached file for url (hash of url with the extension of the url's file name)
+
+        Args:
+            url (str): URL
+
+        Returns:
+            str: File name
+        """
+        extension = splitext(basename(urlparse(url).path))[1]
+        return '%s%s' % (hashlib.sha1(url.encode('utf-8')).hexdigest(), extension)
+
+    def _get_entry(self, url: str) -> Optional[tuple]:
+        row = self._connection.execute('SELECT filename, etag, last_modified FROM entries WHERE url = ?',
+                                       (url,)).fetchone()
+        if row is None:
+            return None
+        if not exists(join(self.folder, row[0])):
+            with self._connection:
+                self._connection.execute('DELETE FROM entries WHERE url = ?', (url,))
+            return None
+        return row
+
+    def get_path(self, url: str) -> Optional[str]:
+        """Get path of cached file for url
+
+        Args:
+            url (str): URL
+
+        Returns:
+            Optional[str]: Path of cached file or None if url is not cached
+        """
+        with self._lock:
+            entry = self._get_entry(url)
+        if entry is None:
+            return None
+        return join(self.folder, entry[0])
+
+    def get_conditional_headers(self, url: str) -> dict:
+        """Get headers for a conditional request for url ie. If-None-Match with the cached ETag and If-Modified-Since
+        with the cached Last-Modified date. Each call that returns headers counts as a revalidation.
+
+        Args:
+            url (str): URL
+
+        Returns:
+            dict: Headers (empty if url is not cached)
+        """
+        headers = dict()
+        with self._lock:
+            entry = self._get_entry(url)
+            if entry is None:
+                return headers
+            _, etag, last_modified = entry
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+            if headers:
+                self.revalidations += 1
+        return headers
+
+    def record_hit(self, url: str) -> Optional[str]:
+        """Record that cached file for url is unchanged (the server returned 304) and mark it as recently used
+
+        Args:
+            url (str): URL
+
+        Returns:
+            Optional[str]: Path of cached file or None if it is no longer cached
+        """
+        with self._lock:
+            entry = self._get_entry(url)
+            if entry is None:
+                return None
+            with self._connection:
+                self._connection.execute('UPDATE entries SET last_used = ? WHERE url = ?', (time.time(), url))
+            self.hits += 1
+        return join(self.folder, entry[0])
+
+    def record_miss(self) -> None:
+        """Record download of a url that cannot be cached (eg. the server gave neither ETag nor Last-Modified)
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self.misses += 1
+
+    def get_temp_path(self, url: str) -> str:
+        """Get path of a new temporary file in the cache folder to download url into before it is stored with put
+
+        Args:
+            url (str): URL
+
+        Returns:
+            str: Path of temporary file
+        """
+        fd, path = tempfile.mkstemp(suffix='.tmp', prefix='%s.' % self.get_filename(url), dir=self.folder)
+        os.close(fd)
+        return path
+
+    def _evict(self, keep_url: str) -> None:
+        total = self._connection.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        cursor = self._connection.execute('SELECT url, filename, size FROM entries WHERE url != ? '
+                                          'ORDER BY last_used', (keep_url,))
+        for url, filename, size in cursor.fetchall():
+            if total <= self.max_bytes:
+                break
+            path = join(self.folder, filename)
+            if exists(path):
+                os.unlink(path)
+            with self._connection:
+                self._connection.execute('DELETE FROM entries WHERE url = ?', (url,))
+            total -= size
+            self.evictions += 1
+            logger.debug('Evicted %s (%d bytes) from download cache' % (url, size))
+
+    def put(self, url: str, temp_path: str, etag: Optional[str], last_modified: Optional[str]) -> Optional[str]:
+        """Store downloaded file for url in the cache, moving it from its temporary path, and evict least recently
+        used files until the total size is within max_bytes. Counts as a miss.
+
+        Args:
+            url (str): URL
+            temp_path (str): Path of downloaded file (from get_temp_path)
+            etag (Optional[str]): ETag header of response
+            last_modified (Optional[str]): Last-Modified header of response
+
+        Returns:
+            Optional[str]: Path of cached file or None if the file is larger than max_bytes (and was not moved)
+        """
+        size = getsize(temp_path)
+        with self._lock:
+            self.misses += 1
+            if size > self.max_bytes:
+                self._remove(url)
+                return None
+            filename = self.get_filename(url)
+            path = join(self.folder, filename)
+            os.replace(temp_path, path)
+            with self._connection:
+                self._connection.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)',
+                                         (url, filename, etag, last_modified, size, time.time()))
+            self._evict(url)
+        return path
+
+    def _remove(self, url: str) -> None:
+        row = self._connection.execute('SELECT filename FROM entries WHERE url = ?', (url,)).fetchone()
+        if row is None:
+            return
+        path = join(self.folder, row[0])
+        if exists(path):
+            os.unlink(path)
+        with self._connection:
+            self._connection.execute('DELETE FROM entries WHERE url = ?', (url,))
+
+    def remove(self, url: str) -> None:
+        """Remove cached file for url
+
+        Args:
+            url (str): URL
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._remove(url)
+
+    def clear(self) -> None:
+        """Remove all cached files
+
+        Returns:
+            None
+        """
+        with self._lock:
+            for (filename,) in self._connection.execute('SELECT filename FROM entries').fetchall():
+                path = join(self.folder, filename)
+                if exists(path):
+                    os.unlink(path)
+            with self._connection:
+                self._connection.execute('DELETE FROM entries')
+
+    @staticmethod
+    def link_or_copy(source: str, destination: str) -> None:
+        """Hard link source to destination so that serving a cached file is instant and deleting the destination
+        does not affect the cache, falling back to copying if hard links are not possible (eg. across file systems)
+
+        Args:
+            source (str): Path of cached file
+            destination (str): Destination path
+
+        Returns:
+            None
+        """
+        try:
+            os.link(source, destination)
+        except OSError:
+            shutil.copyfile(source, destination)
+
+    def get_statistics(self) -> dict:
+        """Get cache statistics
+
+        Returns:
+            dict: Dictionary with entries, bytes, max_bytes, hits, misses, revalidations and evictions
+        """
+        with self._lock:
+            entries, total = self._connection.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) '
+                                                      'FROM entries').fetchone()
+            return {'entries': entries, 'bytes': total, 'max_bytes': self.max_bytes, 'hits': self.hits,
+                    'misses': self.misses, 'revalidations': self.revalidations, 'evictions': self.evictions}
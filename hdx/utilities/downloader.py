@@ -1,16 +1,27 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 """Downloading utilities for urls"""
+import copy
 import hashlib
-from os.path import splitext, join, exists
+import json
+import logging
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from os.path import splitext, join, exists, getsize
 from posixpath import basename
 from tempfile import gettempdir
-from typing import Optional
+from threading import Lock
+from typing import Optional, Iterator, Iterable, Tuple, List, Dict, Union, Any
 from urllib.parse import urlparse
 
 import requests
-from requests.adapters import HTTPAdapter
-from requests.packages.urllib3 import Retry
+from requests.packages.urllib3.exceptions import HTTPError as URLLibHTTPError
+
+from hdx.utilities.downloadcache import DownloadCache
+from hdx.utilities.session import get_session
+
+logger = logging.getLogger(__name__)
 
 
 class DownloadError(Exception):
@@ -18,14 +29,30 @@ class DownloadError(Exception):
 
 
 class Download(object):
-    def __init__(self):
-        s = requests.Session()
-        retries = Retry(total=5, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504], raise_on_redirect=True,
-                        raise_on_status=True)
-        s.mount('http://', HTTPAdapter(max_retries=retries))
-        s.mount('https://', HTTPAdapter(max_retries=retries))
-        self.session = s
+    """Downloads from urls using a pooled session. Streamed downloads are read into a reusable buffer of buffer_size
+    bytes so that large files are copied in a few large reads and writes rather than many small ones. If a cache is
+    given, download_file revalidates cached files with conditional requests rather than downloading them again.
+
+    Args:
+        buffer_size (Optional[int]): Size of read buffer in bytes. Defaults to 1048576 (1 MiB).
+        cache (Optional[DownloadCache]): Cache of downloaded files. Defaults to None (no caching).
+    """
+    default_buffer_size = 1048576
+    default_min_segment_size = 4194304
+    _write_lock = Lock()
+    # errors after which a resumable download is retried from where it stopped
+    transfer_errors = (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError,
+                       requests.exceptions.Timeout, URLLibHTTPError)
+
+    def __init__(self, buffer_size: Optional[int] = None, cache: Optional[DownloadCache] = None):
+        self.session = get_session()
         self.response = None
+        self.cache = cache
+        if buffer_size is None:
+            buffer_size = self.default_buffer_size
+        if buffer_size < 1:
+            raise ValueError('buffer_size must be at least 1!')
+        self.buffer_size = buffer_size
 
     def __enter__(self):
         return self
@@ -75,32 +102,93 @@ class Download(object):
         except Exception as e:
             raise DownloadError('Setup of Streaming Download of %s failed!' % url) from e
 
-    def hash_stream(self, url: str) -> str:
-        """Stream file from url and hash it using MD5. Must call setup_streaming_download method first.
+    def _iter_buffers(self, response: Optional[requests.Response] = None) -> Iterator[memoryview]:
+        """Read streamed response into a buffer of buffer_size bytes that is reused for every read. If the response
+        is not content encoded, the raw stream is read straight into the buffer, otherwise it is decoded by requests
+        in chunks of buffer_size. Each view yielded is only valid until the next one is requested.
+
+        Args:
+            response (Optional[requests.Response]): Streamed response. Defaults to None (response from setup_stream).
+
+        Returns:
+            Iterator[memoryview]: Iterator of views of data read
+        """
+        if response is None:
+            response = self.response
+        encoding = response.headers.get('Content-Encoding', 'identity').strip().lower()
+        if encoding not in ('', 'identity'):
+            for chunk in response.iter_content(chunk_size=self.buffer_size):
+                if chunk:  # filter out keep-alive new chunks
+                    yield memoryview(chunk)
+            return
+        raw = response.raw
+        buffer = bytearray(self.buffer_size)
+        view = memoryview(buffer)
+        while True:
+            nbytes = raw.readinto(view)
+            if not nbytes:
+                break
+            yield view[:nbytes]
+
+    @staticmethod
+    def get_hashers(algorithms: List[str]) -> Dict[str, Any]:
+        """Get hash objects for algorithms eg. md5, sha1, sha256. Variable length algorithms like shake_128 are not
+        supported as their digests need a length.
+
+        Args:
+            algorithms (List[str]): Names of hash algorithms (see hashlib.algorithms_available)
+
+        Returns:
+            Dict[str, Any]: Dictionary of algorithm name to hash object
+        """
+        hashers = dict()
+        for algorithm in algorithms:
+            algorithm = algorithm.lower()
+            if algorithm not in hashlib.algorithms_available:
+                raise ValueError('Unknown hash algorithm %s!' % algorithm)
+            hasher = hashlib.new(algorithm)
+            if hasher.digest_size == 0:
+                raise ValueError('Unknown hash algorithm %s!' % algorithm)
+            hashers[algorithm] = hasher
+        return hashers
+
+    def hash_stream(self, url: str, algorithms: Optional[List[str]] = None) -> Union[str, Dict[str, str]]:
+        """Stream file from url and hash it using MD5 or any number of hash algorithms, all computed in one pass over
+        the data. Must call setup_streaming_download method first.
 
         Args:
             url (str): URL to download
+            algorithms (Optional[List[str]]): Hash algorithms eg. ['md5', 'sha256']. Defaults to None (MD5 only).
 
         Returns:
-            str: MD5 hash of file
+            Union[str, Dict[str, str]]: MD5 hash of file if no algorithms given otherwise dictionary of algorithm to
+            hex digest
 
         """
-        md5hash = hashlib.md5()
+        if algorithms is None:
+            hashers = self.get_hashers(['md5'])
+        else:
+            hashers = self.get_hashers(algorithms)
         try:
-            for chunk in self.response.iter_content(chunk_size=1024):
-                if chunk:  # filter out keep-alive new chunks
-                    md5hash.update(chunk)
-            return md5hash.hexdigest()
+            updates = [hasher.update for hasher in hashers.values()]
+            for data in self._iter_buffers():
+                for update in updates:
+                    update(data)
+            digests = {algorithm: hasher.hexdigest() for algorithm, hasher in hashers.items()}
         except Exception as e:
             raise DownloadError('Download of %s failed in retrieval of stream!' % url) from e
+        if algorithms is None:
+            return digests['md5']
+        return digests
 
-    def stream_file(self, url: str, folder: Optional[str] = None) -> str:
-        """Stream file from url and store in provided folder or temporary folder if no folder supplied.
-        Must call setup_streaming_download method first.
+    def _write_stream(self, url: str, folder: Optional[str], updates: List[Any]) -> str:
+        """Write streamed file to provided folder or temporary folder if no folder supplied, passing each buffer
+        written to the given update functions.
 
         Args:
             url (str): URL to download
-            folder (Optional[str]): Folder to download it to. Defaults to None.
+            folder (Optional[str]): Folder to download it to
+            updates (List[Any]): Functions to call with each buffer eg. hash object update methods
 
         Returns:
             str: Path of downloaded file
@@ -110,10 +198,10 @@ class Download(object):
         f = None
         try:
             f = open(path, 'wb')
-            for chunk in self.response.iter_content(chunk_size=1024):
-                if chunk:  # filter out keep-alive new chunks
-                    f.write(chunk)
-                    f.flush()
+            for data in self._iter_buffers():
+                f.write(data)
+                for update in updates:
+                    update(data)
             return f.name
         except Exception as e:
             raise DownloadError('Download of %s failed in retrieval of stream!' % url) from e
@@ -121,21 +209,590 @@ class Download(object):
             if f:
                 f.close()
 
-    def download_file(self, url: str, folder: Optional[str] = None, timeout: Optional[float] = None) -> str:
-        """Download file from url and store in provided folder or temporary folder if no folder supplied
+    def stream_file(self, url: str, folder: Optional[str] = None) -> str:
+        """Stream file from url and store in provided folder or temporary folder if no folder supplied.
+        Must call setup_streaming_download method first.
+
+        Args:
+            url (str): URL to download
+            folder (Optional[str]): Folder to download it to. Defaults to None.
+
+        Returns:
+            str: Path of downloaded file
+
+        """
+        return self._write_stream(url, folder, list())
+
+    def stream_file_with_hashes(self, url: str, hash_algorithms: List[str],
+                                folder: Optional[str] = None) -> Tuple[str, Dict[str, str]]:
+        """Stream file from url and store in provided folder or temporary folder if no folder supplied, hashing it
+        as it is written so that getting checksums does not need a second download. Must call
+        setup_streaming_download method first.
+
+        Args:
+            url (str): URL to download
+            hash_algorithms (List[str]): Hash algorithms eg. ['md5', 'sha1', 'sha256']
+            folder (Optional[str]): Folder to download it to. Defaults to None.
+
+        Returns:
+            Tuple[str, Dict[str, str]]: (Path of downloaded file, dictionary of algorithm to hex digest)
+
+        """
+        hashers = self.get_hashers(hash_algorithms)
+        path = self._write_stream(url, folder, [hasher.update for hasher in hashers.values()])
+        return path, {algorithm: hasher.hexdigest() for algorithm, hasher in hashers.items()}
+
+    def download_file(self, url: str, folder: Optional[str] = None, timeout: Optional[float] = None,
+                      segments: int = 1, resume: bool = False) -> str:
+        """Download file from url and store in provided folder or temporary folder if no folder supplied. If the
+        Download has a cache, the file is downloaded with download_file_cached (and segments and resume are ignored).
+        A resumable download is a single stream, so resume cannot be combined with more than one segment.
 
         Args:
             url (str): URL to download
             folder (Optional[str]): Folder to download it to. Defaults to None.
             timeout (Optional[float]): Timeout for connecting to URL. Defaults to None (no timeout).
+            segments (int): Number of byte ranges to download concurrently (see download_file_segmented). Defaults to
+            1 (single stream).
+            resume (bool): Whether to keep a partial file that later attempts continue from (see
+            download_file_resumable). Defaults to False.
 
         Returns:
             str: Path of downloaded file
 
         """
+        if resume and segments > 1:
+            raise ValueError('A resumable download cannot be segmented!')
+        if self.cache is not None:
+            return self.download_file_cached(url, folder, timeout)
+        if resume:
+            return self.download_file_resumable(url, folder, timeout)
+        if segments > 1:
+            return self.download_file_segmented(url, folder, timeout, segments)
         self.setup_stream(url, timeout)
         return self.stream_file(url, folder)
 
+    def download_file_cached(self, url: str, folder: Optional[str] = None, timeout: Optional[float] = None) -> str:
+        """Download file from url through the cache and store in provided folder or temporary folder if no folder
+        supplied. If url is cached, the request carries If-None-Match and If-Modified-Since and if the server replies
+        304 Not Modified the cached file is served from disk. Otherwise the file is downloaded into the cache (if the
+        response has an ETag or Last-Modified date to revalidate it with later) and served from there.
+
+        Args:
+            url (str): URL to download
+            folder (Optional[str]): Folder to download it to. Defaults to None.
+            timeout (Optional[float]): Timeout for connecting to URL. Defaults to None (no timeout).
+
+        Returns:
+            str: Path of downloaded file
+        """
+        cache = self.cache
+        headers = cache.get_conditional_headers(url)
+        self.response = None
+        try:
+            self.response = self.session.get(url, headers=headers, stream=True, timeout=timeout)
+            self.response.raise_for_status()
+        except Exception as e:
+            raise DownloadError('Setup of Streaming Download of %s failed!' % url) from e
+        if headers and self.response.status_code == 304:
+            self.response.close()
+            cached_path = cache.record_hit(url)
+            if cached_path is not None:
+                path = self.get_path_for_url(url, folder)
+                try:
+                    cache.link_or_copy(cached_path, path)
+                    logger.debug('%s not modified so served from download cache' % url)
+                    return path
+                except FileNotFoundError:  # evicted by another thread
+                    pass
+            cache.remove(url)
+            return self.download_file_cached(url, folder, timeout)
+        etag = self.response.headers.get('ETag')
+        last_modified = self.response.headers.get('Last-Modified')
+        if not etag and not last_modified:
+            cache.remove(url)
+            cache.record_miss()
+            return self.stream_file(url, folder)
+        temp_path = cache.get_temp_path(url)
+        try:
+            with open(temp_path, 'wb') as f:
+                for data in self._iter_buffers():
+                    f.write(data)
+        except Exception as e:
+            os.unlink(temp_path)
+            raise DownloadError('Download of %s failed in retrieval of stream!' % url) from e
+        cached_path = cache.put(url, temp_path, etag, last_modified)
+        path = self.get_path_for_url(url, folder)
+        if cached_path is None:  # too large to cache
+            # the cache folder may be on a different filesystem to folder so os.replace cannot be used
+            shutil.move(temp_path, path)
+        else:
+            cache.link_or_copy(cached_path, path)
+        return path
+
+    def get_range_support(self, url: str, timeout: Optional[float] = None) -> Tuple[Optional[int], Optional[str]]:
+        """Probe url with a HEAD request to find out if byte ranges of it can be downloaded
+
+        Args:
+            url (str): URL to download
+            timeout (Optional[float]): Timeout for connecting to URL. Defaults to None (no timeout).
+
+        Returns:
+            Tuple[Optional[int], Optional[str]]: (Length in bytes or None if ranges are not supported, Strong ETag or
+            Last-Modified date to send in If-Range headers or None)
+        """
+        try:
+            response = self.session.head(url, allow_redirects=True, timeout=timeout)
+            response.raise_for_status()
+        except Exception:
+            return None, None
+        headers = response.headers
+        if headers.get('Accept-Ranges', '').strip().lower() != 'bytes':
+            return None, None
+        if headers.get('Content-Encoding', 'identity').strip().lower() not in ('', 'identity'):
+            return None, None
+        try:
+            length = int(headers['Content-Length'])
+        except (KeyError, ValueError):
+            return None, None
+        validator = headers.get('ETag')
+        if validator is None or validator.startswith('W/'):  # weak ETags cannot be used in If-Range
+            validator = headers.get('Last-Modified')
+        return length, validator
+
+    @staticmethod
+    def _write_at(fd: int, data: memoryview, offset: int) -> None:
+        """Write data to file descriptor at offset without moving a shared file position
+
+        Args:
+            fd (int): File descriptor
+            data (memoryview): Data to write
+            offset (int): Offset in file
+
+        Returns:
+            None
+        """
+        while data:
+            if hasattr(os, 'pwrite'):
+                written = os.pwrite(fd, data, offset)
+            else:
+                with Download._write_lock:
+                    os.lseek(fd, offset, os.SEEK_SET)
+                    written = os.write(fd, data)
+            data = data[written:]
+            offset += written
+
+    def _download_range(self, url: str, fd: int, start: int, end: int, validator: Optional[str],
+                        timeout: Optional[float] = None) -> Optional[int]:
+        """Download byte range of url and write it to file descriptor at the same offset
+
+        Args:
+            url (str): URL to download
+            fd (int): File descriptor
+            start (int): First byte of range
+            end (int): Last byte of range (inclusive)
+            validator (Optional[str]): ETag or Last-Modified date for If-Range header
+            timeout (Optional[float]): Timeout for connecting to URL. Defaults to None (no timeout).
+
+        Returns:
+            Optional[int]: Number of bytes written or None if the server did not return the range
+        """
+        headers = {'Range': 'bytes=%d-%d' % (start, end), 'Accept-Encoding': 'identity'}
+        if validator:
+            headers['If-Range'] = validator
+        response = self.session.get(url, headers=headers, stream=True, timeout=timeout)
+        try:
+            response.raise_for_status()
+            if response.status_code != 206 or \
+                    not response.headers.get('Content-Range', '').startswith('bytes %d-%d/' % (start, end)):
+                return None
+            offset = start
+            for data in self._iter_buffers(response):
+                if offset + len(data) > end + 1:
+                    raise DownloadError('Download of %s returned more data than range %d-%d!' % (url, start, end))
+                self._write_at(fd, data, offset)
+                offset += len(data)
+            return offset - start
+        finally:
+            response.close()
+
+    def download_file_segmented(self, url: str, folder: Optional[str] = None, timeout: Optional[float] = None,
+                                segments: int = 4, min_segment_size: Optional[int] = None) -> str:
+        """Download file from url as several byte ranges fetched concurrently and store in provided folder or
+        temporary folder if no folder supplied. The server is probed for Accept-Ranges and Content-Length, the file is
+        preallocated and each range is written at its offset as it arrives. The ranges are requested with If-Range
+        so that if the file changes during the download the server returns all of it instead. If the server does not
+        support ranges, does not return them or the file is smaller than two segments, it is downloaded as a single
+        stream. Keep segments within the session's pool size so that connections are reused.
+
+        Args:
+            url (str): URL to download
+            folder (Optional[str]): Folder to download it to. Defaults to None.
+            timeout (Optional[float]): Timeout for connecting to URL. Defaults to None (no timeout).
+            segments (int): Maximum number of ranges to download concurrently. Defaults to 4.
+            min_segment_size (Optional[int]): Minimum size of each range in bytes. Defaults to None
+            (default_min_segment_size ie. 4 MiB).
+
+        Returns:
+            str: Path of downloaded file
+        """
+        if min_segment_size is None:
+            min_segment_size = self.default_min_segment_size
+        length, validator = self.get_range_support(url, timeout)
+        if length is None:
+            number_segments = 1
+        else:
+            number_segments = min(segments, length // max(min_segment_size, 1))
+        if number_segments < 2:
+            logger.debug('Downloading %s as a single stream' % url)
+            return self.download_file(url, folder, timeout)
+        path = self.get_path_for_url(url, folder)
+        segment_size = -(-length // number_segments)
+        ranges = [(start, min(start + segment_size, length) - 1) for start in range(0, length, segment_size)]
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o666)
+        success = False
+        try:
+            try:
+                os.posix_fallocate(fd, 0, length)
+            except (AttributeError, OSError):
+                os.ftruncate(fd, length)
+            with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+                futures = [executor.submit(self._download_range, url, fd, start, end, validator, timeout)
+                           for start, end in ranges]
+                try:
+                    results = [future.result() for future in futures]
+                except Exception:
+                    for future in futures:
+                        future.cancel()
+                    raise
+            if None not in results:
+                if sum(results) != length:
+                    raise DownloadError('Download of %s received %d bytes not %d!' % (url, sum(results), length))
+                success = True
+        except DownloadError:
+            raise
+        except Exception as e:
+            raise DownloadError('Segmented download of %s failed!' % url) from e
+        finally:
+            os.close(fd)
+            if not success:
+                os.unlink(path)
+        if not success:
+            logger.debug('Server did not return ranges of %s so downloading as a single stream' % url)
+            return self.download_file(url, folder, timeout)
+        size = getsize(path)
+        if size != length:
+            os.unlink(path)
+            raise DownloadError('Downloaded file %s is %d bytes not %d!' % (path, size, length))
+        logger.debug('Downloaded %s in %d segments' % (url, len(ranges)))
+        return path
+
+    @staticmethod
+    def get_part_paths(url: str, folder: Optional[str] = None) -> Tuple[str, str]:
+        """Get paths of partial file and its sidecar (recording url, ETag or Last-Modified date and length) for a
+        resumable download from url. Unlike get_path_for_url, the paths are the same every time. The partial file is
+        named after the url's file name and a hash of the whole url (name.ext.HASH.part or HASH.part if the url has no
+        file name) so that urls with the same file name do not share a partial file.
+
+        Args:
+            url (str): URL to download
+            folder (Optional[str]): Folder to download it to. Defaults to None.
+
+        Returns:
+            Tuple[str, str]: (Path of partial file, Path of sidecar)
+        """
+        if not folder:
+            folder = gettempdir()
+        urlhash = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        filename = basename(urlparse(url).path)
+        if filename:
+            part_path = join(folder, '%s.%s.part' % (filename, urlhash))
+        else:
+            part_path = join(folder, '%s.part' % urlhash)
+        return part_path, '%s.json' % part_path
+
+    @staticmethod
+    def _load_part_info(url: str, part_path: str, info_path: str) -> Optional[dict]:
+        """Load sidecar of partial file if it is for url and can be resumed, otherwise remove partial file and sidecar
+
+        Args:
+            url (str): URL to download
+            part_path (str): Path of partial file
+            info_path (str): Path of sidecar
+
+        Returns:
+            Optional[dict]: Sidecar information or None if download must start from the beginning
+        """
+        info = None
+        if exists(part_path) and exists(info_path):
+            try:
+                with open(info_path, 'r') as f:
+                    info = json.load(f)
+            except ValueError:
+                info = None
+            if info is not None and (info.get('url') != url or not info.get('validator')):
+                info = None
+        if info is None:
+            Download._remove_part(part_path, info_path)
+        return info
+
+    @staticmethod
+    def _remove_part(part_path: str, info_path: str) -> None:
+        """Remove partial file and its sidecar if they exist
+
+        Args:
+            part_path (str): Path of partial file
+            info_path (str): Path of sidecar
+
+        Returns:
+            None
+        """
+        for path in (part_path, info_path):
+            if exists(path):
+                os.unlink(path)
+
+    @staticmethod
+    def _save_part_info(info_path: str, info: dict) -> None:
+        """Save sidecar of partial file atomically
+
+        Args:
+            info_path (str): Path of sidecar
+            info (dict): Sidecar information
+
+        Returns:
+            None
+        """
+        tmp_path = '%s.tmp' % info_path
+        with open(tmp_path, 'w') as f:
+            json.dump(info, f)
+        os.replace(tmp_path, info_path)
+
+    def _stream_part(self, url: str, part_path: str, info_path: str, timeout: Optional[float] = None) -> bool:
+        """Stream url into partial file, continuing from the end of the partial file if its sidecar is for url and
+        the file on the server has not changed (checked by the server using If-Range)
+
+        Args:
+            url (str): URL to download
+            part_path (str): Path of partial file
+            info_path (str): Path of sidecar
+            timeout (Optional[float]): Timeout for connecting to URL. Defaults to None (no timeout).
+
+        Returns:
+            bool: True if the partial file is complete, False if not
+        """
+        info = self._load_part_info(url, part_path, info_path)
+        offset = 0 if info is None else getsize(part_path)
+        if info is not None and offset == info['length']:
+            return True
+        headers = {'Accept-Encoding': 'identity'}
+        if offset:
+            headers['Range'] = 'bytes=%d-' % offset
+            headers['If-Range'] = info['validator']
+        response = self.session.get(url, headers=headers, stream=True, timeout=timeout)
+        try:
+            if offset and response.status_code == 416:
+                logger.info('Partial download of %s is not a valid range so starting again' % url)
+                self._remove_part(part_path, info_path)
+                return False
+            try:
+                response.raise_for_status()
+            except Exception as e:
+                raise DownloadError('Setup of resumable download of %s failed!' % url) from e
+            if offset and response.status_code == 206 and \
+                    response.headers.get('Content-Range', '').startswith('bytes %d-' % offset):
+                logger.info('Resuming download of %s from byte %d' % (url, offset))
+                mode = 'ab'
+            else:
+                if offset:
+                    logger.info('%s has changed so downloading from the start' % url)
+                mode = 'wb'
+                validator = response.headers.get('ETag')
+                if validator is None or validator.startswith('W/'):  # weak ETags cannot be used in If-Range
+                    validator = response.headers.get('Last-Modified')
+                length = response.headers.get('Content-Length')
+                encoding = response.headers.get('Content-Encoding', 'identity').strip().lower()
+                if length is not None and encoding in ('', 'identity'):
+                    length = int(length)
+                else:
+                    length = None
+                info = {'url': url, 'validator': validator, 'length': length}
+                self._save_part_info(info_path, info)
+            with open(part_path, mode) as f:
+                for data in self._iter_buffers(response):
+                    f.write(data)
+        finally:
+            response.close()
+        if info['length'] is None:
+            return True
+        size = getsize(part_path)
+        if size > info['length']:
+            self._remove_part(part_path, info_path)
+            raise DownloadError('Download of %s is %d bytes, more than the expected %d!' % (url, size,
+                                                                                            info['length']))
+        return size == info['length']
+
+    def download_file_resumable(self, url: str, folder: Optional[str] = None, timeout: Optional[float] = None,
+                                attempts: int = 3) -> str:
+        """Download file from url and store in provided folder or temporary folder if no folder supplied, keeping
+        the data received so far in a partial file (name.ext.part) alongside a sidecar recording the url, the ETag
+        (or Last-Modified date) and the length. If the transfer is interrupted, it is continued from the end of the
+        partial file with a Range request, up to attempts times, and the partial file is kept if all attempts fail so
+        that a later call continues from it. The Range request carries If-Range, so if the file on the server has
+        changed it is downloaded from the start rather than appended to (as it is if the server gives neither an ETag
+        nor a Last-Modified date). Once complete, the partial file is renamed atomically to the path given by
+        get_path_for_url.
+
+        Args:
+            url (str): URL to download
+            folder (Optional[str]): Folder to download it to. Defaults to None.
+            timeout (Optional[float]): Timeout for connecting to URL. Defaults to None (no timeout).
+            attempts (int): Number of attempts to make. Defaults to 3.
+
+        Returns:
+            str: Path of downloaded file
+        """
+        part_path, info_path = self.get_part_paths(url, folder)
+        for attempt in range(1, attempts + 1):
+            try:
+                if self._stream_part(url, part_path, info_path, timeout):
+                    break
+                reason = 'incomplete'
+            except DownloadError:
+                raise
+            except self.transfer_errors as e:
+                reason = str(e)
+                if attempt == attempts:
+                    raise DownloadError('Download of %s failed after %d attempts! Partial file kept at %s.' %
+                                        (url, attempts, part_path)) from e
+            except Exception as e:
+                raise DownloadError('Download of %s failed!' % url) from e
+            if attempt == attempts:
+                raise DownloadError('Download of %s incomplete after %d attempts! Partial file kept at %s.' %
+                                    (url, attempts, part_path))
+            logger.info('Download of %s interrupted (attempt %d of %d): %s' % (url, attempt, attempts, reason))
+        path = self.get_path_for_url(url, folder)
+        os.replace(part_path, path)
+        os.unlink(info_path)
+        return path
+
+    def _download_worker(self, url: str, folder: Optional[str], timeout: Optional[float], resume: bool) -> str:
+        """Download file from url with a copy of this Download that shares its session, cache and buffer size but has
+        its own response, so that several files can be downloaded at once
+
+        Args:
+            url (str): URL to download
+            folder (Optional[str]): Folder to download it to
+            timeout (Optional[float]): Timeout for connecting to URL
+            resume (bool): Whether to keep a partial file that later attempts continue from
+
+        Returns:
+            str: Path of downloaded file
+        """
+        download = copy.copy(self)
+        download.response = None
+        try:
+            return download.download_file(url, folder, timeout, resume=resume)
+        finally:
+            if download.response is not None:
+                download.response.close()
+
+    def iter_download_many(self, urls: Iterable[str], folder: Optional[str] = None, max_workers: int = 8,
+                           per_host_limit: int = 2, timeout: Optional[float] = None,
+                           resume: bool = False) -> Iterator[Tuple[int, str, Optional[str], Optional[DownloadError]]]:
+        """Download files from urls concurrently on this Download's pooled session, storing them in provided folder or
+        temporary folder if no folder supplied, and yield each one as soon as it completes. At most max_workers files
+        are downloaded at once and at most per_host_limit from any one host (eg. example.com:8080). A download is only
+        started once its host has a free slot, so a busy host does not hold up workers that could be fetching from
+        others, and otherwise urls are started in the order given. Urls that would be saved under the same file name
+        are downloaded one after the other so that each gets its own path. A failed download does not stop the
+        others: its error is yielded in place of a path. Stopping iteration early waits for the downloads in progress
+        and does not start any more.
+
+        Connections to each host are reused from the session's pool for that host, so keep per_host_limit within its
+        size and the number of hosts within the number of pools (both 10 by default, see get_session).
+
+        Args:
+            urls (Iterable[str]): URLs to download
+            folder (Optional[str]): Folder to download them to. Defaults to None.
+            max_workers (int): Maximum number of files to download at once. Defaults to 8.
+            per_host_limit (int): Maximum number of files to download at once from one host. Defaults to 2.
+            timeout (Optional[float]): Timeout for connecting to URL. Defaults to None (no timeout).
+            resume (bool): Whether to keep partial files that later calls continue from (see
+            download_file_resumable). Defaults to False.
+
+        Returns:
+            Iterator[Tuple[int, str, Optional[str], Optional[DownloadError]]]: Iterator in order of completion of
+            (index of url, url, path of downloaded file or None, error or None)
+        """
+        if max_workers < 1:
+            raise ValueError('max_workers must be at least 1!')
+        if per_host_limit < 1:
+            raise ValueError('per_host_limit must be at least 1!')
+        pending = list()
+        for index, url in enumerate(urls):
+            parsed = urlparse(url)
+            pending.append((index, url, parsed.netloc.lower(), basename(parsed.path)))
+        host_counts = dict()
+        filenames = set()
+        futures = dict()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while pending or futures:
+                waiting = list()
+                for task in pending:
+                    index, url, host, filename = task
+                    if len(futures) < max_workers and host_counts.get(host, 0) < per_host_limit and \
+                            filename not in filenames:
+                        future = executor.submit(self._download_worker, url, folder, timeout, resume)
+                        futures[future] = task
+                        host_counts[host] = host_counts.get(host, 0) + 1
+                        filenames.add(filename)
+                    else:
+                        waiting.append(task)
+                pending = waiting
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, url, host, filename = futures.pop(future)
+                    host_counts[host] -= 1
+                    filenames.discard(filename)
+                    error = future.exception()
+                    if error is None:
+                        yield index, url, future.result(), None
+                        continue
+                    if not isinstance(error, DownloadError):
+                        cause = error
+                        error = DownloadError('Download of %s failed!' % url)
+                        error.__cause__ = cause
+                    logger.debug('Download of %s failed: %s' % (url, error))
+                    yield index, url, None, error
+
+    def download_many(self, urls: Iterable[str], folder: Optional[str] = None, max_workers: int = 8,
+                      per_host_limit: int = 2, timeout: Optional[float] = None,
+                      resume: bool = False) -> List[Tuple[str, Optional[str], Optional[DownloadError]]]:
+        """Download files from urls concurrently on this Download's pooled session with at most max_workers at once
+        and at most per_host_limit from any one host, and store them in provided folder or temporary folder if no
+        folder supplied (see iter_download_many, which gives each file as soon as it completes). A failed download
+        does not stop the others.
+
+        Args:
+            urls (Iterable[str]): URLs to download
+            folder (Optional[str]): Folder to download them to. Defaults to None.
+            max_workers (int): Maximum number of files to download at once. Defaults to 8.
+            per_host_limit (int): Maximum number of files to download at once from one host. Defaults to 2.
+            timeout (Optional[float]): Timeout for connecting to URL. Defaults to None (no timeout).
+            resume (bool): Whether to keep partial files that later calls continue from (see
+            download_file_resumable). Defaults to False.
+
+        Returns:
+            List[Tuple[str, Optional[str], Optional[DownloadError]]]: List in the order of urls of (url, path of
+            downloaded file or None, error or None)
+        """
+        urls = list(urls)
+        results = [None] * len(urls)
+        for index, url, path, error in self.iter_download_many(urls, folder, max_workers, per_host_limit, timeout,
+                                                                resume):
+            results[index] = (url, path, error)
+        return results
+
     def download(self, url: str, timeout: Optional[float] = None) -> requests.Response:
         """Download url
 
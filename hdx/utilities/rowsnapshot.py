@@ -0,0 +1,204 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Snapshot of row content hashes keyed by primary key used to find changed rows"""
+import hashlib
+import json
+import logging
+import sqlite3
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+
+class RowSnapshot(object):
+    """SQLite backed snapshot of an 8 byte content hash per row keyed by primary key, which may be several comma
+    separated fields (eg. 'code,date') in which case rows are keyed by the values of all of them. Rows are compared
+    against the snapshot in batches (one indexed lookup per batch) as they stream past, so only rows that are new or
+    changed need to be kept or sent on and memory use does not depend on the number of rows. The hashes of the rows
+    seen are staged and only replace the snapshot when commit is called, so an interrupted sync leaves the previous
+    snapshot intact.
+
+    Each lookup binds one SQL variable per key, so lookups are split into groups of at most max_variables keys (the
+    default SQLITE_MAX_VARIABLE_NUMBER of SQLite versions before 3.32) whatever the batch size.
+
+    Args:
+        path (str): Path to SQLite database file (created if it does not exist). Use ':memory:' for a temporary one.
+        batch_size (Optional[int]): Number of rows per batch. Defaults to 999.
+    """
+    max_variables = 999
+
+    def __init__(self, path: str, batch_size: Optional[int] = 999):
+        self.path = path
+        self.batch_size = batch_size
+        self.number_rows = 0
+        self.number_changed = 0
+        self._connection = sqlite3.connect(path)
+        with self._connection:
+            self._connection.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+            self._connection.execute('CREATE TABLE IF NOT EXISTS snapshot (key TEXT PRIMARY KEY, hash BLOB) '
+                                     'WITHOUT ROWID')
+            self._connection.execute('CREATE TABLE IF NOT EXISTS staging (key TEXT PRIMARY KEY, hash BLOB) '
+                                     'WITHOUT ROWID')
+
+    def close(self) -> None:
+        """Close the database connection
+
+        Returns:
+            None
+        """
+        self._connection.close()
+
+    def __len__(self) -> int:
+        return self._connection.execute('SELECT COUNT(*) FROM snapshot').fetchone()[0]
+
+    def get_meta(self, key: str) -> Optional[str]:
+        """Get metadata value stored with snapshot
+
+        Args:
+            key (str): Metadata key
+
+        Returns:
+            Optional[str]: Metadata value or None if not set
+        """
+        row = self._connection.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        return row[0]
+
+    def set_meta(self, key: str, value: str) -> None:
+        """Set metadata value stored with snapshot
+
+        Args:
+            key (str): Metadata key
+            value (str): Metadata value
+
+        Returns:
+            None
+        """
+        with self._connection:
+            self._connection.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)', (key, value))
+
+    def clear(self) -> None:
+        """Remove all rows from snapshot
+
+        Returns:
+            None
+        """
+        with self._connection:
+            self._connection.execute('DELETE FROM snapshot')
+            self._connection.execute('DELETE FROM staging')
+
+    @staticmethod
+    def get_hash(row: dict) -> bytes:
+        """Get 8 byte hash of row content that does not depend on the order of the fields
+
+        Args:
+            row (dict): Row
+
+        Returns:
+            bytes: Hash of row
+        """
+        content = '\x1e'.join('%s\x1f%s' % (key, row[key]) for key in sorted(row))
+        return hashlib.md5(content.encode('utf-8')).digest()[:8]
+
+    @staticmethod
+    def get_key_fields(primary_key: str) -> List[str]:
+        """Get fields of primary key, which may be several comma separated fields
+
+        Args:
+            primary_key (str): Primary key eg. 'code' or 'code,date'
+
+        Returns:
+            List[str]: Fields of primary key
+        """
+        return [field.strip() for field in primary_key.split(',')]
+
+    @staticmethod
+    def get_key(row: dict, keyfields: List[str]) -> str:
+        """Get snapshot key of row: the value of a single key field as a string or a JSON list of the values of
+        several key fields as strings
+
+        Args:
+            row (dict): Row
+            keyfields (List[str]): Fields of primary key
+
+        Returns:
+            str: Snapshot key
+        """
+        if len(keyfields) == 1:
+            return str(row[keyfields[0]])
+        return json.dumps([str(row[field]) for field in keyfields])
+
+    def _diff_batch(self, batch: List[dict], keyfields: List[str]) -> List[dict]:
+        keys = [self.get_key(row, keyfields) for row in batch]
+        hashes = [self.get_hash(row) for row in batch]
+        old = dict()
+        for start in range(0, len(keys), self.max_variables):
+            lookup = keys[start:start + self.max_variables]
+            old.update(self._connection.execute('SELECT key, hash FROM snapshot WHERE key IN (%s)' %
+                                                ','.join('?' * len(lookup)), lookup).fetchall())
+        self._connection.executemany('INSERT OR REPLACE INTO staging VALUES (?, ?)', zip(keys, hashes))
+        changed = [row for row, key, rowhash in zip(batch, keys, hashes) if old.get(key) != rowhash]
+        self.number_rows += len(batch)
+        self.number_changed += len(changed)
+        return changed
+
+    def changed_rows(self, rows: Iterable[dict], primary_key: str) -> Iterator[dict]:
+        """Get rows that are new or have changed since the snapshot was committed. The hashes of all rows are staged
+        for commit.
+
+        Args:
+            rows (Iterable[dict]): Rows eg. from csv.DictReader
+            primary_key (str): Field or comma separated fields that uniquely identify each row
+
+        Returns:
+            Iterator[dict]: Iterator of new or changed rows
+        """
+        keyfields = self.get_key_fields(primary_key)
+        with self._connection:
+            self._connection.execute('DELETE FROM staging')
+        self.number_rows = 0
+        self.number_changed = 0
+        batch = list()
+        for row in rows:
+            batch.append(row)
+            if len(batch) == self.batch_size:
+                for changed in self._diff_batch(batch, keyfields):
+                    yield changed
+                batch = list()
+        if batch:
+            for changed in self._diff_batch(batch, keyfields):
+                yield changed
+        self._connection.commit()
+
+    def deleted_keys(self, primary_key: Optional[str] = None) -> Iterator[List[Union[str, Tuple[str, ...]]]]:
+        """Get keys in the snapshot that are not among the rows staged by changed_rows in batches. If primary_key has
+        several comma separated fields, each key is a tuple of the values of those fields.
+
+        Args:
+            primary_key (Optional[str]): Primary key given to changed_rows. Defaults to None (a single field).
+
+        Returns:
+            Iterator[List[Union[str, Tuple[str, ...]]]]: Iterator of batches of deleted keys
+        """
+        composite = primary_key is not None and len(self.get_key_fields(primary_key)) > 1
+        cursor = self._connection.execute('SELECT key FROM snapshot WHERE key NOT IN (SELECT key FROM staging)')
+        while True:
+            batch = cursor.fetchmany(self.batch_size)
+            if not batch:
+                break
+            if composite:
+                yield [tuple(json.loads(row[0])) for row in batch]
+            else:
+                yield [row[0] for row in batch]
+
+    def commit(self) -> None:
+        """Replace snapshot with the row hashes staged by changed_rows
+
+        Returns:
+            None
+        """
+        with self._connection:
+            self._connection.execute('DELETE FROM snapshot')
+            self._connection.execute('INSERT INTO snapshot SELECT key, hash FROM staging')
+            self._connection.execute('DELETE FROM staging')
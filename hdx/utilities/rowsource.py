@@ -0,0 +1,268 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Streaming readers that yield the rows of tabular files (CSV, XLSX, zipped CSV and JSON lines) as dictionaries"""
+import csv
+import io
+import json
+import zipfile
+from contextlib import contextmanager
+from datetime import datetime, date, time
+from os.path import splitext, basename
+from typing import Optional, List, Tuple, Iterator, Callable, IO, Any
+from urllib.parse import urlparse
+
+import openpyxl
+
+RowsContext = Iterator[Tuple[List[str], Iterator[dict]]]
+
+
+class RowSourceError(Exception):
+    pass
+
+
+@contextmanager
+def read_csv_fileobj(f: IO[bytes]) -> RowsContext:
+    """Read rows from binary CSV file object with a header row (UTF-8 with optional byte order mark)
+
+    Args:
+        f (IO[bytes]): Binary file object
+
+    Returns:
+        Iterator[Tuple[List[str], Iterator[dict]]]: Context manager giving (field names, iterator of rows)
+    """
+    textf = io.TextIOWrapper(f, encoding='utf-8-sig', newline='')
+    try:
+        reader = csv.DictReader(textf)
+        yield reader.fieldnames, reader
+    finally:
+        textf.detach()
+
+
+@contextmanager
+def read_jsonl_fileobj(f: IO[bytes], fieldnames: Optional[List[str]] = None) -> RowsContext:
+    """Read rows from binary JSON lines file object (one JSON object per line). Unless fieldnames is given, the field
+    names are the sorted keys of the first object only, so keys that only appear in later objects are not among them
+    and are dropped by uploads that use the field names.
+
+    Args:
+        f (IO[bytes]): Binary file object
+        fieldnames (Optional[List[str]]): Field names. Defaults to None (sorted keys of first object).
+
+    Returns:
+        Iterator[Tuple[List[str], Iterator[dict]]]: Context manager giving (field names, iterator of rows)
+    """
+    textf = io.TextIOWrapper(f, encoding='utf-8-sig')
+    try:
+        def get_rows():
+            for number, line in enumerate(textf, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                row = json.loads(line)
+                if not isinstance(row, dict):
+                    raise RowSourceError('Line %d is not a JSON object!' % number)
+                yield row
+
+        rows = get_rows()
+        first = next(rows, None)
+        if first is None:
+            yield fieldnames or list(), iter(())
+        else:
+            yield fieldnames or sorted(first.keys()), _prepend(first, rows)
+    finally:
+        textf.detach()
+
+
+def _prepend(first: dict, rows: Iterator[dict]) -> Iterator[dict]:
+    yield first
+    for row in rows:
+        yield row
+
+
+def get_cell_value(value: Any) -> Any:
+    """Convert spreadsheet cell value to a value that can be serialised as JSON. Dates and times become ISO 8601
+    strings.
+
+    Args:
+        value (Any): Cell value
+
+    Returns:
+        Any: Converted value
+    """
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    return value
+
+
+@contextmanager
+def read_xlsx(path: str, sheet: Optional[str] = None) -> RowsContext:
+    """Read rows from XLSX file in read only mode so that rows are parsed as they are iterated rather than the whole
+    workbook being loaded. The first row is the header and completely empty rows are skipped. The file is passed to
+    openpyxl as a file object so that it need not have an XLSX extension.
+
+    Args:
+        path (str): Path to XLSX file
+        sheet (Optional[str]): Name of sheet. Defaults to None (the active sheet).
+
+    Returns:
+        Iterator[Tuple[List[str], Iterator[dict]]]: Context manager giving (field names, iterator of rows)
+    """
+    with open(path, 'rb') as f:
+        workbook = openpyxl.load_workbook(f, read_only=True, data_only=True)
+        try:
+            worksheet = workbook.active if sheet is None else workbook[sheet]
+            sheetrows = worksheet.iter_rows()
+            header = next(sheetrows, None)
+            if header is None:
+                yield list(), iter(())
+                return
+            values = [cell.value for cell in header]
+            while values and values[-1] is None:
+                values.pop()
+            fieldnames = ['' if value is None else str(value) for value in values]
+            number_fields = len(fieldnames)
+
+            def get_rows():
+                for sheetrow in sheetrows:
+                    values = [get_cell_value(cell.value) for cell in sheetrow[:number_fields]]
+                    if all(value is None for value in values):
+                        continue
+                    values.extend([None] * (number_fields - len(values)))
+                    yield dict(zip(fieldnames, values))
+
+            yield fieldnames, get_rows()
+        finally:
+            workbook.close()
+
+
+@contextmanager
+def read_csv(path: str) -> RowsContext:
+    """Read rows from CSV file with a header row
+
+    Args:
+        path (str): Path to CSV file
+
+    Returns:
+        Iterator[Tuple[List[str], Iterator[dict]]]: Context manager giving (field names, iterator of rows)
+    """
+    with open(path, 'rb') as f:
+        with read_csv_fileobj(f) as result:
+            yield result
+
+
+@contextmanager
+def read_jsonl(path: str, fieldnames: Optional[List[str]] = None) -> RowsContext:
+    """Read rows from JSON lines file. Unless fieldnames is given, the field names are the sorted keys of the first
+    object only (see read_jsonl_fileobj).
+
+    Args:
+        path (str): Path to JSON lines file
+        fieldnames (Optional[List[str]]): Field names. Defaults to None (sorted keys of first object).
+
+    Returns:
+        Iterator[Tuple[List[str], Iterator[dict]]]: Context manager giving (field names, iterator of rows)
+    """
+    with open(path, 'rb') as f:
+        with read_jsonl_fileobj(f, fieldnames) as result:
+            yield result
+
+
+@contextmanager
+def read_zip(path: str) -> RowsContext:
+    """Read rows from the first CSV or JSON lines member of a zip file, decompressing it as it is read
+
+    Args:
+        path (str): Path to zip file
+
+    Returns:
+        Iterator[Tuple[List[str], Iterator[dict]]]: Context manager giving (field names, iterator of rows)
+    """
+    with zipfile.ZipFile(path) as zf:
+        members = [info for info in zf.infolist() if not info.filename.endswith('/') and
+                   not info.filename.startswith('__MACOSX/') and not basename(info.filename).startswith('.')]
+        for info in members:
+            file_format = RowSource.get_format(info.filename)
+            if file_format in RowSource.fileobj_readers:
+                with zf.open(info) as f:
+                    with RowSource.fileobj_readers[file_format](f) as result:
+                        yield result
+                return
+        raise RowSourceError('No CSV or JSON lines file found in zip %s!' % path)
+
+
+class RowSource(object):
+    """Registry of streaming row readers keyed by file format. A reader is a function taking a path that returns a
+    context manager giving the field names and an iterator of rows (dictionaries). Readers that can read from a binary
+    file object are also registered in fileobj_readers so that they can be used for members of zip files. Formats are
+    given by the format of a resource or the file extension, and aliases map other names to the registered formats.
+    """
+    readers = {'csv': read_csv, 'xlsx': read_xlsx, 'zip': read_zip, 'jsonl': read_jsonl}
+    fileobj_readers = {'csv': read_csv_fileobj, 'jsonl': read_jsonl_fileobj}
+    aliases = {'text/csv': 'csv', 'xlsm': 'xlsx', 'zipped csv': 'zip',
+               'zipped_csv': 'zip', 'csv.zip': 'zip', 'ndjson': 'jsonl', 'json lines': 'jsonl',
+               'jsonlines': 'jsonl'}
+
+    @staticmethod
+    def register(file_format: str, reader: Callable[[str], RowsContext],
+                 fileobj_reader: Optional[Callable[[IO[bytes]], RowsContext]] = None) -> None:
+        """Register reader for file format
+
+        Args:
+            file_format (str): File format eg. csv
+            reader (Callable[[str], RowsContext]): Function taking a path and returning a context manager giving
+            (field names, iterator of rows)
+            fileobj_reader (Optional[Callable[[IO[bytes]], RowsContext]]): Equivalent function taking a binary file
+            object. Defaults to None.
+
+        Returns:
+            None
+        """
+        file_format = file_format.lower()
+        RowSource.readers[file_format] = reader
+        if fileobj_reader is not None:
+            RowSource.fileobj_readers[file_format] = fileobj_reader
+
+    @staticmethod
+    def get_format(name: Optional[str]) -> Optional[str]:
+        """Get registered file format from a format name (eg. a resource's format) or a path or url (from its
+        extension)
+
+        Args:
+            name (Optional[str]): Format name, path or url
+
+        Returns:
+            Optional[str]: Registered file format or None if not recognised
+        """
+        if not name:
+            return None
+        name = name.strip().lower()
+        name = RowSource.aliases.get(name, name)
+        if name in RowSource.readers:
+            return name
+        path = urlparse(name).path if '://' in name else name
+        filename = basename(path)
+        for alias, file_format in RowSource.aliases.items():
+            if filename.endswith('.%s' % alias):
+                return file_format
+        extension = splitext(filename)[1][1:]
+        extension = RowSource.aliases.get(extension, extension)
+        if extension in RowSource.readers:
+            return extension
+        return None
+
+    @staticmethod
+    def get_reader(*names: Optional[str]) -> Callable[[str], RowsContext]:
+        """Get reader for the first of the given format names, paths or urls that is a recognised format, defaulting
+        to CSV
+
+        Args:
+            *names (Optional[str]): Format names, paths or urls in order of precedence
+
+        Returns:
+            Callable[[str], RowsContext]: Reader
+        """
+        for name in names:
+            file_format = RowSource.get_format(name)
+            if file_format is not None:
+                return RowSource.readers[file_format]
+        return RowSource.readers['csv']
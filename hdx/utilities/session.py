@@ -0,0 +1,33 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Session utilities for http requests"""
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3 import Retry
+
+
+def get_session(pool_connections: Optional[int] = 10, pool_maxsize: Optional[int] = 10,
+                retries: Optional[Retry] = None, raise_on_status: Optional[bool] = True) -> requests.Session:
+    """Get a requests session with keep-alive connection pools of the given size mounted for http and https
+
+    Args:
+        pool_connections (Optional[int]): Number of connection pools (one per host) to cache. Defaults to 10.
+        pool_maxsize (Optional[int]): Maximum number of connections to keep in each pool. Defaults to 10.
+        retries (Optional[Retry]): Retry configuration. Defaults to None (5 retries with backoff on 5xx errors).
+        raise_on_status (Optional[bool]): For the default retry configuration, whether to raise RetryError once
+        retries on 5xx errors are exhausted rather than return the last response. Defaults to True.
+
+    Returns:
+        requests.Session: Session with pooled adapters mounted
+    """
+    if retries is None:
+        retries = Retry(total=5, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504], raise_on_redirect=True,
+                        raise_on_status=raise_on_status)
+    s = requests.Session()
+    s.mount('http://', HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                                   max_retries=retries))
+    s.mount('https://', HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                                    max_retries=retries))
+    return s
@@ -0,0 +1,358 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Inference of datastore column types and coercion of values to them"""
+import logging
+import math
+import warnings
+from typing import List, Iterable, Optional, Any, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BOOL_VALUES = {'true': True, 't': True, 'yes': True, 'y': True, 'false': False, 'f': False, 'no': False, 'n': False}
+BOOL_BYTES = sorted({variant.encode('ascii') for value in BOOL_VALUES
+                     for variant in (value, value.upper(), value.title())})
+# Candidate types in order of preference ie. the first type that all values of a column parse as is chosen
+CANDIDATE_TYPES = ['bool', 'int', 'float', 'timestamp']
+# Datastore types that values are coerced for
+TYPE_ALIASES = {'bool': 'bool', 'boolean': 'bool',
+                'int': 'int', 'int4': 'int', 'int8': 'int', 'integer': 'int', 'bigint': 'int',
+                'float': 'float', 'float8': 'float', 'numeric': 'float', 'double precision': 'float',
+                'timestamp': 'timestamp', 'date': 'timestamp'}
+# Range of integers that can be stored without loss of precision (PostgreSQL bigint)
+INT64_MIN = -2 ** 63
+INT64_MAX = 2 ** 63 - 1
+
+
+def get_array(values: List[Any]) -> Optional[np.ndarray]:
+    """Convert column values to a NumPy byte string array of the non empty values stripped of whitespace. Byte
+    strings are used as NumPy parses them several times faster than unicode strings and any value that is not ASCII
+    cannot be a bool, int, float or timestamp anyway.
+
+    Args:
+        values (List[Any]): Column values
+
+    Returns:
+        Optional[np.ndarray]: Array of non empty stripped values or None if any value is not ASCII
+    """
+    if None in values:
+        values = [value for value in values if value is not None]
+    try:
+        array = np.char.strip(np.array(values, dtype='S'))
+    except UnicodeEncodeError:
+        return None
+    return array[array != b'']
+
+
+def has_leading_zeros(array: np.ndarray) -> bool:
+    """Check if any value in a NumPy byte string array is a number with leading zeros eg. 00123 or -012. Such values
+    are codes (eg. P-codes) that would lose their zeros if stored as numbers.
+
+    Args:
+        array (np.ndarray): Array of non empty stripped values from get_array
+
+    Returns:
+        bool: True if any value has leading zeros, False if not
+    """
+    unsigned = np.char.lstrip(array, b'+-')
+    # only the few values starting with 0 need their second character checked
+    return any(value[1:2].isdigit() for value in unsigned[np.char.startswith(unsigned, b'0')].tolist())
+
+
+def has_large_integers(array: np.ndarray) -> bool:
+    """Check if any value in a NumPy byte string array is an integer too large for int64. Such values would lose
+    precision if stored as floats.
+
+    Args:
+        array (np.ndarray): Array of non empty stripped values from get_array
+
+    Returns:
+        bool: True if any value is an integer outside the range of int64, False if not
+    """
+    integers = array[np.char.isdigit(np.char.lstrip(array, b'+-'))]
+    try:
+        integers.astype(np.int64)
+    except (ValueError, OverflowError):
+        return True
+    return False
+
+
+def is_type(array: np.ndarray, column_type: str) -> bool:
+    """Check if all values in a NumPy byte string array parse as type. Numbers must not contain underscores (which
+    NumPy accepts as digit separators eg. 1_000). Timestamps must be ISO 8601 ie. start with YYYY- (NumPy would
+    otherwise read integers as years).
+
+    Args:
+        array (np.ndarray): Array of non empty stripped values from get_array
+        column_type (str): One of bool, int, float or timestamp
+
+    Returns:
+        bool: True if all values parse as type, False if not
+    """
+    try:
+        if column_type == 'bool':
+            return bool(np.isin(array, BOOL_BYTES).all())
+        if column_type in ('int', 'float') and (np.char.find(array, b'_') != -1).any():
+            return False
+        if column_type == 'int':
+            array.astype(np.int64)
+            return True
+        if column_type == 'float':
+            return bool(np.isfinite(array.astype(np.float64)).all())
+        if column_type == 'timestamp':
+            if not (np.char.find(array, b'-') == 4).all():
+                return False
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                return not bool(np.isnat(array.astype('datetime64[us]')).any())
+    except (ValueError, OverflowError, TypeError):
+        return False
+    return False
+
+
+def to_bool(value: str) -> bool:
+    """Convert string to bool
+
+    Args:
+        value (str): String eg. true, F, yes, N
+
+    Returns:
+        bool: Converted value
+    """
+    try:
+        return BOOL_VALUES[value.strip().lower()]
+    except KeyError:
+        raise ValueError('invalid literal for bool: %r' % value)
+
+
+def coerce_strings(strings: List[str], column_type: str) -> List[Any]:
+    """Convert non empty strings to the Python type corresponding to datastore type. Timestamps are validated with
+    vectorized NumPy parsing and stripped. Numbers and bools are converted by mapping the built in parsers over the
+    strings, which is faster than NumPy's string parsing when Python objects are needed for serialisation. As in
+    is_type, numbers with underscores are rejected, as are integers outside the range of int64.
+
+    Args:
+        strings (List[str]): Non empty strings
+        column_type (str): One of bool, int, float or timestamp
+
+    Returns:
+        List[Any]: Converted values
+    """
+    if column_type == 'timestamp':
+        array = get_array(strings)
+        if array is None or len(array) != len(strings) or (len(array) != 0 and not is_type(array, 'timestamp')):
+            for value in strings:
+                array = get_array([value])
+                if array is None or len(array) == 0 or not is_type(array, 'timestamp'):
+                    raise ValueError('Cannot convert value to timestamp: %r' % value)
+        return list(map(str.strip, strings))
+    converter = {'bool': to_bool, 'int': int, 'float': float}[column_type]
+    if column_type != 'bool' and '_' in ''.join(strings):
+        raise ValueError('Cannot convert value to %s: %r' % (column_type, next(x for x in strings if '_' in x)))
+    try:
+        converted = list(map(converter, strings))
+    except ValueError as e:
+        raise ValueError('Cannot convert value to %s: %s' % (column_type, e)) from e
+    if column_type == 'float' and not all(map(math.isfinite, converted)):
+        raise ValueError('Cannot convert value to float: %s' % next(x for x in converted if not math.isfinite(x)))
+    if column_type == 'int' and converted and (min(converted) < INT64_MIN or max(converted) > INT64_MAX):
+        raise ValueError('Cannot convert value to int: %s' % next(x for x in converted
+                                                                  if x < INT64_MIN or x > INT64_MAX))
+    return converted
+
+
+def coerce_column(values: List[Any], column_type: str) -> List[Any]:
+    """Convert column values in bulk to the Python type corresponding to datastore type (see coerce_strings). Empty
+    values (None or blank) become None. Columns of text or unknown types are returned unchanged. Columns with empty
+    values are stripped and masked with NumPy so that only the non empty values are converted.
+
+    Args:
+        values (List[Any]): Column values
+        column_type (str): Datastore type eg. int, float, timestamp, bool
+
+    Returns:
+        List[Any]: Converted values
+    """
+    column_type = TYPE_ALIASES.get(column_type.lower())
+    if column_type is None:
+        return values
+    if None not in values and '' not in values:
+        try:
+            return coerce_strings(list(map(str, values)), column_type)
+        except ValueError:
+            # there may be blank values so mask them before converting again
+            pass
+    strings = np.char.strip(np.array(['' if value is None else value for value in values], dtype='U'))
+    nonempty = strings != ''
+    converted = coerce_strings(strings[nonempty].tolist(), column_type)
+    result = np.full(len(values), None, dtype=object)
+    result[nonempty] = converted
+    return result.tolist()
+
+
+def coerce_column_lenient(values: List[Any], column_type: str) -> Tuple[List[Any], List[Any]]:
+    """Convert column values one at a time to the Python type corresponding to datastore type, turning values that
+    cannot be converted into None rather than failing. This is much slower than coerce_column so is only used for
+    columns that coerce_column has rejected.
+
+    Args:
+        values (List[Any]): Column values
+        column_type (str): Datastore type eg. int, float, timestamp, bool
+
+    Returns:
+        Tuple[List[Any], List[Any]]: (Converted values, Values that could not be converted)
+    """
+    converted = list()
+    invalid = list()
+    for value in values:
+        try:
+            converted.append(coerce_column([value], column_type)[0])
+        except ValueError:
+            converted.append(None)
+            invalid.append(value)
+    return converted, invalid
+
+
+def coerce_rows(rows: List[dict], schema: List[dict], strict: bool = True) -> List[dict]:
+    """Convert values of rows in place to the Python types of the datastore types in schema one column at a time. If
+    strict is False, values that cannot be converted become None and a warning is logged (eg. for a schema inferred
+    from a sample of the rows, where later values may not fit the inferred types).
+
+    Args:
+        rows (List[dict]): Rows
+        schema (List[dict]): List of fields and types of form {'id': 'FIELD', 'type': 'TYPE'}
+        strict (bool): Whether to raise an error if a value cannot be converted. Defaults to True.
+
+    Returns:
+        List[dict]: Rows with converted values
+    """
+    for field in schema:
+        fieldname = field['id']
+        if TYPE_ALIASES.get(field.get('type', 'text').lower()) is None:
+            continue
+        values = [row.get(fieldname) for row in rows]
+        try:
+            values = coerce_column(values, field['type'])
+        except ValueError as e:
+            if strict:
+                raise ValueError('Column %s: %s' % (fieldname, e)) from e
+            values, invalid = coerce_column_lenient(values, field['type'])
+            if invalid:
+                logger.warning('Column %s: %d values could not be converted to %s and were set to null eg. %r' %
+                               (fieldname, len(invalid), field['type'], invalid[0]))
+        for row, value in zip(rows, values):
+            row[fieldname] = value
+    return rows
+
+
+class TypeInferrer(object):
+    """Infers the datastore type (bool, int, float, timestamp or text) of each column from batches of rows. Each
+    column keeps a list of candidate types that all its values have parsed as so far. Every batch is parsed a column
+    at a time with vectorized NumPy conversions and candidates that fail are dropped, so columns found to be text are
+    no longer parsed. Columns with numbers that have leading zeros (eg. 00123 or P-codes) are not numeric so that the
+    zeros are kept, and columns with integers too large for int64 are not numeric so that no precision is lost. Empty
+    values are ignored and columns with no values are text.
+
+    Args:
+        fieldnames (List[str]): Field names in column order
+    """
+
+    def __init__(self, fieldnames: List[str]):
+        self.fieldnames = list(fieldnames)
+        self.candidates = {fieldname: list(CANDIDATE_TYPES) for fieldname in self.fieldnames}
+        self.has_values = {fieldname: False for fieldname in self.fieldnames}
+        self.number_rows = 0
+
+    def update_column(self, fieldname: str, values: List[Any]) -> None:
+        """Narrow candidate types of column using a batch of its values
+
+        Args:
+            fieldname (str): Field name
+            values (List[Any]): Column values
+
+        Returns:
+            None
+        """
+        candidates = self.candidates[fieldname]
+        if not candidates:
+            return
+        array = get_array(values)
+        if array is None:
+            self.has_values[fieldname] = True
+            self.candidates[fieldname] = list()
+            return
+        if len(array) == 0:
+            return
+        self.has_values[fieldname] = True
+        remaining = list()
+        for candidate in candidates:
+            # integers are always valid floats so there is no need to parse them again
+            if candidate == 'float' and 'int' in remaining:
+                remaining.append(candidate)
+            elif is_type(array, candidate):
+                remaining.append(candidate)
+        if ('int' in remaining or 'float' in remaining) and has_leading_zeros(array):
+            remaining = [candidate for candidate in remaining if candidate not in ('int', 'float')]
+        if 'float' in remaining and 'int' not in remaining and has_large_integers(array):
+            remaining.remove('float')
+        self.candidates[fieldname] = remaining
+
+    def update(self, rows: List[dict]) -> None:
+        """Narrow candidate types of all columns using a batch of rows
+
+        Args:
+            rows (List[dict]): Rows
+
+        Returns:
+            None
+        """
+        for fieldname in self.fieldnames:
+            if self.candidates[fieldname]:
+                self.update_column(fieldname, [row.get(fieldname) for row in rows])
+        self.number_rows += len(rows)
+
+    def get_type(self, fieldname: str) -> str:
+        """Get inferred type of column
+
+        Args:
+            fieldname (str): Field name
+
+        Returns:
+            str: One of bool, int, float, timestamp or text
+        """
+        candidates = self.candidates[fieldname]
+        if not candidates or not self.has_values[fieldname]:
+            return 'text'
+        return candidates[0]
+
+    def get_schema(self) -> List[dict]:
+        """Get schema of inferred types in the form used by hdx_datasource_topline.yml
+
+        Returns:
+            List[dict]: List of fields and types of form {'id': 'FIELD', 'type': 'TYPE'}
+        """
+        return [{'id': fieldname, 'type': self.get_type(fieldname)} for fieldname in self.fieldnames]
+
+    @staticmethod
+    def infer_schema(rows: Iterable[dict], fieldnames: List[str], batch_size: Optional[int] = 10000) -> List[dict]:
+        """Infer schema from rows read in batches
+
+        Args:
+            rows (Iterable[dict]): Rows eg. from csv.DictReader
+            fieldnames (List[str]): Field names in column order
+            batch_size (Optional[int]): Number of rows parsed together. Defaults to 10000.
+
+        Returns:
+            List[dict]: List of fields and types of form {'id': 'FIELD', 'type': 'TYPE'}
+        """
+        inferrer = TypeInferrer(fieldnames)
+        batch = list()
+        for row in rows:
+            batch.append(row)
+            if len(batch) == batch_size:
+                inferrer.update(batch)
+                batch = list()
+        if batch:
+            inferrer.update(batch)
+        return inferrer.get_schema()
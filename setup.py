@@ -47,6 +47,8 @@ requirements = ['ckanapi',
                 'colorlog',
                 'geonamescache',
                 'ndg-httpsclient',
+                'numpy',
+                'openpyxl',
                 'pyaml',
                 'pyasn1',
                 'pyOpenSSL',
@@ -66,6 +68,12 @@ setup(
     author_email='rans@email.com',
     description='HDX Python Library',
 
+    classifiers=[
+        'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3 :: Only',
+        'Programming Language :: Python :: 3.5',
+    ],
+    python_requires='>=3.5',
     install_requires=requirements,
     package_data={
         # Include version.txt and if any package contains *.yml files, include them:
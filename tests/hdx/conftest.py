@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+"""Shared test fixtures"""
+import json
+import threading
+
+import pytest
+import requests
+
+
+class PostRecorder(object):
+    """Records the CKAN actions posted through requests.Session.post, passing them on to the post already in place
+    (usually a mock set up by another fixture). Calls are recorded as (action, data dictionary) once their response
+    has been returned, so with concurrent uploads they are in order of completion.
+
+    Args:
+        monkeypatch: pytest monkeypatch fixture
+    """
+
+    def __init__(self, monkeypatch):
+        self.monkeypatch = monkeypatch
+        self.calls = list()
+        self.condition = threading.Condition()
+
+    def record(self, match='', intercept=None):
+        """Start recording actions
+
+        Args:
+            match (str): Text that action names must contain to be recorded. Defaults to '' (all actions).
+            intercept: Function called with action and data dictionary before posting. It can return replacement
+            data as bytes or a response to return instead of posting. Defaults to None.
+
+        Returns:
+            List[Tuple[str, dict]]: List to which calls are appended
+        """
+        post = requests.Session.post
+
+        def recordpost(url, data=None, **kwargs):
+            action = url.rsplit('/', 1)[-1]
+            if match not in action:
+                return post(url, data=data, **kwargs)
+            datadict = json.loads(data.decode('utf-8'))
+            response = None
+            if intercept is not None:
+                response = intercept(action, datadict)
+                if isinstance(response, bytes):
+                    data = response
+                    response = None
+            if response is None:
+                response = post(url, data=data, **kwargs)
+            with self.condition:
+                self.calls.append((action, datadict))
+                self.condition.notify_all()
+            return response
+
+        self.monkeypatch.setattr(requests.Session, 'post', staticmethod(recordpost))
+        return self.calls
+
+    def wait_for_calls(self, number, timeout=10):
+        """Wait until at least number calls have been recorded
+
+        Args:
+            number (int): Number of calls
+            timeout (float): Timeout in seconds. Defaults to 10.
+
+        Returns:
+            None
+        """
+        with self.condition:
+            assert self.condition.wait_for(lambda: len(self.calls) >= number, timeout)
+
+
+@pytest.fixture(scope='function')
+def post_recorder(monkeypatch):
+    return PostRecorder(monkeypatch)
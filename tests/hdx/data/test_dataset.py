@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 # -*- coding: UTF-8 -*-
 """Dataset Tests"""
+import asyncio
 import copy
 import datetime
 import json
@@ -12,6 +13,7 @@ import requests
 from hdx.configuration import Configuration
 from hdx.data.dataset import Dataset
 from hdx.data.hdxobject import HDXError
+from hdx.remoteckan import RemoteCKANRegistry, ResponseCache
 from hdx.utilities.dictionary import merge_two_dictionaries
 from hdx.utilities.loader import load_yaml
 
@@ -225,7 +227,7 @@ class TestDataset():
             datadict = json.loads(data.decode('utf-8'))
             return mockshow(url, datadict)
 
-        monkeypatch.setattr(requests, 'post', mockreturn)
+        monkeypatch.setattr(requests.Session, 'post', staticmethod(mockreturn))
 
     @pytest.fixture(scope='function')
     def post_create(self, monkeypatch):
@@ -255,7 +257,7 @@ class TestDataset():
             return MockResponse(404,
                                 '{"success": false, "error": {"message": "Not found", "__type": "Not Found Error"}, "help": "http://test-data.humdata.org/api/3/action/help_show?name=dataset_create"}')
 
-        monkeypatch.setattr(requests, 'post', mockreturn)
+        monkeypatch.setattr(requests.Session, 'post', staticmethod(mockreturn))
 
     @pytest.fixture(scope='function')
     def post_update(self, monkeypatch):
@@ -263,7 +265,7 @@ class TestDataset():
             datadict = json.loads(data.decode('utf-8'))
             if 'show' in url or 'related_list' in url:
                 return mockshow(url, datadict)
-            if 'update' not in url:
+            if 'update' not in url and 'patch' not in url:
                 return MockResponse(404,
                                     '{"success": false, "error": {"message": "TEST ERROR: Not update", "__type": "TEST ERROR: Not Update Error"}, "help": "http://test-data.humdata.org/api/3/action/help_show?name=dataset_update"}')
             if 'related' in url:
@@ -281,20 +283,20 @@ class TestDataset():
                                 break
 
                 result = json.dumps(resultdictcopy)
-                if datadict['name'] == 'MyDataset1':
+                if resultdictcopy['name'] == 'MyDataset1':
                     return MockResponse(200,
                                         '{"success": true, "result": %s, "help": "http://test-data.humdata.org/api/3/action/help_show?name=dataset_update"}' % result)
-                if datadict['name'] == 'MyDataset2':
+                if resultdictcopy['name'] == 'MyDataset2':
                     return MockResponse(404,
                                         '{"success": false, "error": {"message": "Not found", "__type": "Not Found Error"}, "help": "http://test-data.humdata.org/api/3/action/help_show?name=dataset_update"}')
-                if datadict['name'] == 'MyDataset3':
+                if resultdictcopy['name'] == 'MyDataset3':
                     return MockResponse(200,
                                         '{"success": false, "error": {"message": "Not found", "__type": "Not Found Error"}, "help": "http://test-data.humdata.org/api/3/action/help_show?name=dataset_update"}')
 
             return MockResponse(404,
                                 '{"success": false, "error": {"message": "Not found", "__type": "Not Found Error"}, "help": "http://test-data.humdata.org/api/3/action/help_show?name=dataset_update"}')
 
-        monkeypatch.setattr(requests, 'post', mockreturn)
+        monkeypatch.setattr(requests.Session, 'post', staticmethod(mockreturn))
 
     @pytest.fixture(scope='function')
     def post_delete(self, monkeypatch):
@@ -317,7 +319,7 @@ class TestDataset():
             return MockResponse(404,
                                 '{"success": false, "error": {"message": "Not found", "__type": "Not Found Error"}, "help": "http://test-data.humdata.org/api/3/action/help_show?name=dataset_delete"}')
 
-        monkeypatch.setattr(requests, 'post', mockreturn)
+        monkeypatch.setattr(requests.Session, 'post', staticmethod(mockreturn))
 
     @pytest.fixture(scope='function')
     def search(self, monkeypatch):
@@ -325,9 +327,46 @@ class TestDataset():
             datadict = json.loads(data.decode('utf-8'))
             return mocksearch(url, datadict)
 
-        monkeypatch.setattr(requests, 'post', mockreturn)
+        monkeypatch.setattr(requests.Session, 'post', staticmethod(mockreturn))
 
 
+    @pytest.fixture(scope='function')
+    def search_counted(self, monkeypatch):
+        def mockreturn(url, data, headers, files, allow_redirects, auth):
+            datadict = json.loads(data.decode('utf-8'))
+            TestDataset.search_urls.append(url)
+            return mocksearch(url, datadict)
+
+        TestDataset.search_urls = list()
+        monkeypatch.setattr(requests.Session, 'post', staticmethod(mockreturn))
+
+    @pytest.fixture(scope='function')
+    def search_paged(self, monkeypatch):
+        def mockreturn(url, data, headers, files, allow_redirects, auth):
+            datadict = json.loads(data.decode('utf-8'))
+            if 'search' not in url or datadict['q'] != 'ACLED':
+                return mocksearch(url, datadict)
+            TestDataset.search_starts.append(datadict['start'])
+            start = datadict['start']
+            result = {'count': searchdict['count'],
+                      'results': searchdict['results'][start:start + datadict['rows']]}
+            return MockResponse(200,
+                                '{"success": true, "result": %s, "help": "http://test-data.humdata.org/api/3/action/help_show?name=package_search"}' % json.dumps(result))
+
+        TestDataset.search_starts = list()
+        monkeypatch.setattr(requests.Session, 'post', staticmethod(mockreturn))
+
+    @pytest.fixture(scope='function')
+    def read_many(self, monkeypatch):
+        def mockreturn(url, data, headers, files, allow_redirects, auth):
+            datadict = json.loads(data.decode('utf-8'))
+            if datadict['id'] == 'TESTERROR':
+                return MockResponse(409,
+                                    '{"success": false, "error": {"message": "Validation Error", "__type": "Validation Error"}, "help": "http://test-data.humdata.org/api/3/action/help_show?name=dataset_show"}')
+            return mockshow(url, datadict)
+
+        monkeypatch.setattr(requests.Session, 'post', staticmethod(mockreturn))
+
     @pytest.fixture(scope='class')
     def configuration(self):
         hdx_key_file = join('fixtures', '.hdxkey')
@@ -346,6 +385,30 @@ class TestDataset():
         dataset = Dataset.read_from_hdx(configuration, 'TEST3')
         assert dataset is None
 
+    def test_read_many_from_hdx(self, configuration, read_many):
+        identifiers = ['TEST2', 'TEST1', 'TESTERROR', 'TEST3', 'TEST1']
+        datasets, not_found, errors = Dataset.read_many_from_hdx(configuration, identifiers, max_workers=3)
+        assert [None if dataset is None else dataset['id'] for dataset in datasets] == \
+            [None, '6f36a41c-f126-4b18-aaaf-6c2ddfbc5d4d', None, None, '6f36a41c-f126-4b18-aaaf-6c2ddfbc5d4d']
+        assert len(datasets[1].resources) == 2
+        assert not_found == ['TEST2', 'TEST3']
+        assert list(errors.keys()) == ['TESTERROR']
+        assert isinstance(errors['TESTERROR'], HDXError)
+        assert Dataset.read_many_from_hdx(configuration, []) == ([], [], {})
+
+    def test_aread_from_hdx(self, configuration, read):
+        async def read_all():
+            return await asyncio.gather(*[Dataset.aread_from_hdx(configuration, identifier)
+                                          for identifier in ['TEST1', 'TEST2', 'TEST1']])
+
+        loop = asyncio.new_event_loop()
+        datasets = loop.run_until_complete(read_all())
+        loop.close()
+        assert datasets[0]['name'] == 'MyDataset1'
+        assert len(datasets[0].resources) == 2
+        assert datasets[1] is None
+        assert datasets[2]['id'] == '6f36a41c-f126-4b18-aaaf-6c2ddfbc5d4d'
+
     def test_create_in_hdx(self, configuration, post_create):
         dataset = Dataset(configuration)
         with pytest.raises(HDXError):
@@ -401,7 +464,7 @@ class TestDataset():
         dataset['dataset_date'] = '02/26/2016'
         dataset['id'] = 'TEST1'
         dataset['name'] = 'MyDataset1'
-        dataset.update_in_hdx()
+        assert dataset.update_in_hdx() == 'patched'
         assert dataset['id'] == 'TEST1'
         assert dataset['dataset_date'] == '02/26/2016'
 
@@ -428,6 +491,60 @@ class TestDataset():
         assert len(dataset.resources) == 2
         assert len(dataset.gallery) == 1
 
+    def test_update_in_hdx_unchanged(self, configuration, monkeypatch):
+        written = list()
+
+        def mockreturn(url, data, headers, files, allow_redirects, auth):
+            datadict = json.loads(data.decode('utf-8'))
+            if 'related_show' in url:
+                result = json.dumps(TestDataset.gallery_data[0])
+                return MockResponse(200,
+                                    '{"success": true, "result": %s, "help": "http://test-data.humdata.org/api/3/action/help_show?name=related_show"}' % result)
+            if 'show' in url or 'related_list' in url:
+                return mockshow(url, {'id': 'TEST1'})
+            written.append((url, datadict))
+            resultdictcopy = copy.deepcopy(resultdict)
+            resultdictcopy.update(datadict)
+            result = json.dumps(resultdictcopy)
+            return MockResponse(200,
+                                '{"success": true, "result": %s, "help": "http://test-data.humdata.org/api/3/action/help_show?name=dataset_patch"}' % result)
+
+        monkeypatch.setattr(requests.Session, 'post', staticmethod(mockreturn))
+        dataset = Dataset.read_from_hdx(configuration, 'TEST1')
+        assert dataset.update_in_hdx() == 'unchanged'
+        assert written == []
+        assert dataset['tags'] == resulttags
+        assert dataset['groups'] == resultgroups
+
+        # a dataset built through the public API only has names for tags and locations
+        datasetdata = copy.deepcopy(dataset.data)
+        del datasetdata['tags']
+        del datasetdata['groups']
+        dataset = Dataset(configuration, datasetdata)
+        dataset.add_tags(['political violence', 'conflict'])
+        dataset.add_country_locations(['DZA', 'Zimbabwe'])
+        assert dataset.update_in_hdx() == 'unchanged'
+        assert written == []
+        assert dataset['tags'] == resulttags
+
+        # by default local lists are appended to those in HDX
+        dataset = Dataset.read_from_hdx(configuration, 'TEST1')
+        dataset['tags'] = [{'name': 'protests'}]
+        assert dataset.update_in_hdx() == 'patched'
+        assert len(written) == 1
+        url, datadict = written[0]
+        assert 'package_patch' in url
+        assert sorted(datadict.keys()) == ['id', 'tags']
+        assert datadict['tags'] == resulttags + [{'name': 'protests'}]
+
+        dataset = Dataset.read_from_hdx(configuration, 'TEST1')
+        dataset['tags'] = [{'name': 'protests'}]
+        assert dataset.update_in_hdx(replace_lists=True) == 'patched'
+        assert len(written) == 2
+        url, datadict = written[1]
+        assert 'package_patch' in url
+        assert datadict['tags'] == [{'name': 'protests'}]
+
     def test_delete_from_hdx(self, configuration, post_delete):
         dataset = Dataset.read_from_hdx(configuration, 'TEST1')
         dataset.delete_from_hdx()
@@ -507,6 +624,102 @@ class TestDataset():
         with pytest.raises(HDXError):
             Dataset.search_in_hdx(configuration, '"')
 
+    def test_search_gallery(self, configuration, search_counted, monkeypatch):
+        remoteckan = RemoteCKANRegistry.get_remoteckan(configuration)
+        call_count = remoteckan.call_count
+        datasets = Dataset.search_in_hdx(configuration, 'ACLED')
+        assert len(TestDataset.search_urls) == 1
+        assert remoteckan.call_count == call_count + 1
+        assert datasets.calls == 1
+        gallery = datasets[0].get_gallery()
+        assert len(gallery) == 1
+        assert gallery[0]['title'] == 'MyGalleryItem1'
+        assert len(TestDataset.search_urls) == 2
+        assert 'related_list' in TestDataset.search_urls[1]
+        datasets[0].get_gallery()
+        assert len(TestDataset.search_urls) == 2
+        assert Dataset.load_galleries(datasets, 3) == 9
+        assert len(TestDataset.search_urls) == 11
+        assert all(len(dataset.get_gallery()) == 1 for dataset in datasets)
+        assert len(TestDataset.search_urls) == 11
+        TestDataset.search_urls = list()
+        datasets = Dataset.search_in_hdx(configuration, 'ACLED', bulk_gallery=True, max_workers=4)
+        assert len(TestDataset.search_urls) == 11
+        assert datasets.calls == 11
+        assert all(len(dataset.gallery) == 1 for dataset in datasets)
+        # a search answered by the response cache makes no calls
+        monkeypatch.setattr(remoteckan, 'response_cache', ResponseCache(maxsize=10, ttl=60))
+        assert Dataset.search_in_hdx(configuration, 'ACLED').calls == 1
+        datasets = Dataset.search_in_hdx(configuration, 'ACLED')
+        assert datasets.calls == 0
+        assert len(datasets) == 10
+        searchiterator = Dataset.iter_search_in_hdx(configuration, 'ACLED')
+        assert len(list(searchiterator)) == 10
+        assert searchiterator.calls == 1
+        searchiterator = Dataset.iter_search_in_hdx(configuration, 'ACLED')
+        assert len(list(searchiterator)) == 10
+        assert searchiterator.calls == 0
+        monkeypatch.setattr(remoteckan, 'response_cache', None)
+        TestDataset.search_urls = list()
+        searchiterator = Dataset.iter_search_in_hdx(configuration, 'ACLED', bulk_gallery=True)
+        datasets = list(searchiterator)
+        assert len(TestDataset.search_urls) == 11
+        assert searchiterator.calls == 11
+        assert all(len(dataset.gallery) == 1 for dataset in datasets)
+        # the gallery attribute is loaded on first access like get_gallery
+        TestDataset.search_urls = list()
+        datasets = Dataset.search_in_hdx(configuration, 'ACLED')
+        assert len(TestDataset.search_urls) == 1
+        assert datasets[0].gallery[0]['title'] == 'MyGalleryItem1'
+        assert len(TestDataset.search_urls) == 2
+        TestDataset.search_urls = list()
+        datasets = Dataset.search_in_hdx(configuration, 'ACLED')
+        datasets[1].delete_galleryitem('NOTEXIST')
+        assert len(datasets[1].gallery) == 1
+        datasets[2].add_update_galleryitem(TestDataset.gallery_data[0])
+        assert len(datasets[2].gallery) == 1
+        assert len(TestDataset.search_urls) == 3
+
+    def test_asearch_in_hdx(self, configuration, search_paged):
+        async def search():
+            datasets = await Dataset.asearch_in_hdx(configuration, 'ajyhgr')
+            assert len(datasets) == 0
+            names = list()
+            async for dataset in Dataset.aiter_search(configuration, 'ACLED', page_size=4):
+                names.append(dataset['name'])
+            return names
+
+        loop = asyncio.new_event_loop()
+        names = loop.run_until_complete(search())
+        loop.close()
+        assert names == [result['name'] for result in searchdict['results']]
+        assert TestDataset.search_starts == [0, 4, 8]
+
+    def test_iter_search_in_hdx(self, configuration, search_paged):
+        datasets = list(Dataset.iter_search_in_hdx(configuration, 'ACLED', page_size=3))
+        assert len(datasets) == 10
+        assert [dataset['id'] for dataset in datasets] == [result['id'] for result in searchdict['results']]
+        assert TestDataset.search_starts == [0, 3, 6, 9]
+        assert len(datasets[0].get_gallery()) == 1
+        TestDataset.search_starts = list()
+        datasets = list(Dataset.iter_search_in_hdx(configuration, 'ACLED', page_size=4, prefetch=False, start=2,
+                                                   rows=5))
+        assert [dataset['id'] for dataset in datasets] == [result['id'] for result in searchdict['results'][2:7]]
+        assert TestDataset.search_starts == [2, 6]
+        TestDataset.search_starts = list()
+        iterator = Dataset.iter_search_in_hdx(configuration, 'ACLED', page_size=5)
+        next(iterator)
+        iterator.close()
+        assert TestDataset.search_starts[0] == 0
+        assert len(TestDataset.search_starts) <= 2
+        datasets = list(Dataset.iter_search_in_hdx(configuration, 'ajyhgr'))
+        assert len(datasets) == 0
+        assert list(Dataset.iter_search_in_hdx(configuration, 'ACLED', rows=0)) == []
+        with pytest.raises(HDXError):
+            list(Dataset.iter_search_in_hdx(configuration, '"'))
+        with pytest.raises(HDXError):
+            list(Dataset.iter_search_in_hdx(configuration, 'ACLED', page_size=0))
+
     def test_get_all_resources(self, configuration, search):
         datasets = Dataset.search_in_hdx(configuration, 'ACLED')
         resources = Dataset.get_all_resources(datasets)
@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 # -*- coding: UTF-8 -*-
 """GalleryItem Tests"""
+import asyncio
 import copy
 import json
 from os.path import join
@@ -80,7 +81,7 @@ class TestGalleryItem():
             datadict = json.loads(data.decode('utf-8'))
             return mockshow(url, datadict)
 
-        monkeypatch.setattr(requests, 'post', mockreturn)
+        monkeypatch.setattr(requests.Session, 'post', staticmethod(mockreturn))
 
     @pytest.fixture(scope='function')
     def post_create(self, monkeypatch):
@@ -106,7 +107,7 @@ class TestGalleryItem():
             return MockResponse(404,
                                 '{"success": false, "error": {"message": "Not found", "__type": "Not Found Error"}, "help": "http://test-data.humdata.org/api/3/action/help_show?name=related_create"}')
 
-        monkeypatch.setattr(requests, 'post', mockreturn)
+        monkeypatch.setattr(requests.Session, 'post', staticmethod(mockreturn))
 
     @pytest.fixture(scope='function')
     def post_update(self, monkeypatch):
@@ -134,7 +135,7 @@ class TestGalleryItem():
             return MockResponse(404,
                                 '{"success": false, "error": {"message": "Not found", "__type": "Not Found Error"}, "help": "http://test-data.humdata.org/api/3/action/help_show?name=related_update"}')
 
-        monkeypatch.setattr(requests, 'post', mockreturn)
+        monkeypatch.setattr(requests.Session, 'post', staticmethod(mockreturn))
 
     @pytest.fixture(scope='function')
     def post_delete(self, monkeypatch):
@@ -153,7 +154,7 @@ class TestGalleryItem():
             return MockResponse(404,
                                 '{"success": false, "error": {"message": "Not found", "__type": "Not Found Error"}, "help": "http://test-data.humdata.org/api/3/action/help_show?name=related_delete"}')
 
-        monkeypatch.setattr(requests, 'post', mockreturn)
+        monkeypatch.setattr(requests.Session, 'post', staticmethod(mockreturn))
 
     @pytest.fixture(scope='class')
     def configuration(self):
@@ -237,6 +238,19 @@ class TestGalleryItem():
         with pytest.raises(HDXError):
             galleryitem.delete_from_hdx()
 
+    def test_async(self, configuration, post_delete):
+        async def read_delete():
+            galleryitem = await GalleryItem.aread_from_hdx(configuration, 'TEST1')
+            assert galleryitem['title'] == 'MyGalleryItem1'
+            await galleryitem.adelete_from_hdx()
+            del galleryitem['id']
+            with pytest.raises(HDXError):
+                await galleryitem.adelete_from_hdx()
+
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(read_delete())
+        loop.close()
+
     def test_update_yaml(self, configuration, static_yaml):
         galleryitem_data = copy.deepcopy(TestGalleryItem.galleryitem_data)
         galleryitem = GalleryItem(configuration, galleryitem_data)
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+"""Metadata Cache Tests"""
+import json
+import re
+from os.path import join
+
+import pytest
+import requests
+
+from hdx.configuration import Configuration
+from hdx.data.metadatacache import MetadataCache
+
+
+class MockResponse:
+    def __init__(self, status_code, text):
+        self.status_code = status_code
+        self.text = text
+
+    def json(self):
+        return json.loads(self.text)
+
+
+def make_dataset(number, metadata_modified):
+    return {'id': 'id%d' % number, 'name': 'dataset%d' % number, 'metadata_modified': metadata_modified,
+            'title': 'Dataset %d' % number,
+            'resources': [{'id': 'res%d' % number, 'package_id': 'id%d' % number, 'name': 'Resource %d' % number}]}
+
+
+class TestMetadataCache():
+    hdx_datasets = dict()
+    calls = list()
+
+    @pytest.fixture(scope='function')
+    def hdx(self, monkeypatch):
+        TestMetadataCache.hdx_datasets = {'id%d' % i: make_dataset(i, '2016-06-01T00:00:00') for i in range(1, 6)}
+        TestMetadataCache.hdx_datasets['id5']['private'] = True
+        TestMetadataCache.calls = list()
+
+        def mockreturn(url, data, headers, files, allow_redirects, auth):
+            datadict = json.loads(data.decode('utf-8'))
+            TestMetadataCache.calls.append((url.rsplit('/', 1)[-1], datadict))
+            if 'package_search' in url:
+                values = re.findall(r'"([^"]*)"', datadict['fq'])
+                results = [dataset for dataset in TestMetadataCache.hdx_datasets.values()
+                           if (datadict.get('include_private') or not dataset.get('private')) and
+                           (dataset['id'] in values or dataset['name'] in values)]
+                if 'fl' in datadict:
+                    fields = datadict['fl'].split(',')
+                    results = [{field: dataset[field] for field in fields} for dataset in results]
+                result = json.dumps({'count': len(results), 'results': results[:datadict['rows']]})
+                return MockResponse(200,
+                                    '{"success": true, "result": %s, "help": "http://test-data.humdata.org/api/3/action/help_show?name=package_search"}' % result)
+            if 'package_show' in url:
+                for dataset in TestMetadataCache.hdx_datasets.values():
+                    if datadict['id'] in (dataset['id'], dataset['name']):
+                        return MockResponse(200,
+                                            '{"success": true, "result": %s, "help": "http://test-data.humdata.org/api/3/action/help_show?name=package_show"}' % json.dumps(dataset))
+            if 'resource_show' in url:
+                for dataset in TestMetadataCache.hdx_datasets.values():
+                    for resource in dataset['resources']:
+                        if datadict['id'] == resource['id']:
+                            return MockResponse(200,
+                                                '{"success": true, "result": %s, "help": "http://test-data.humdata.org/api/3/action/help_show?name=resource_show"}' % json.dumps(resource))
+            return MockResponse(404,
+                                '{"success": false, "error": {"message": "Not found", "__type": "Not Found Error"}, "help": "http://test-data.humdata.org/api/3/action/help_show?name=package_show"}')
+
+        monkeypatch.setattr(requests.Session, 'post', staticmethod(mockreturn))
+
+    @pytest.fixture(scope='class')
+    def configuration(self):
+        hdx_key_file = join('fixtures', '.hdxkey')
+        project_config_yaml = join('fixtures', 'config', 'project_configuration.yml')
+        return Configuration(hdx_key_file=hdx_key_file, project_config_yaml=project_config_yaml)
+
+    def test_get_filter_query(self):
+        assert MetadataCache.get_filter_query('id', ['a', 'b"c']) == 'id:("a" OR "b\\"c")'
+
+    def test_read_datasets(self, configuration, hdx, tmpdir):
+        path = str(tmpdir.join('metadata.db'))
+        cache = MetadataCache(path, batch_size=3)
+        identifiers = ['id1', 'dataset2', 'id3', 'id4', 'id5', 'NOTEXIST']
+        datasets, not_found = cache.read_datasets(configuration, identifiers)
+        assert [dataset['id'] for dataset in datasets] == ['id1', 'id2', 'id3', 'id4', 'id5']
+        assert not_found == ['NOTEXIST']
+        assert datasets[1].get_resources()[0]['id'] == 'res2'
+        assert 'resources' not in datasets[1].data
+        assert len(cache) == 5
+        # two full searches of 3 (including the private dataset) then package_show for the missing dataset
+        assert [call[0] for call in TestMetadataCache.calls] == ['package_search', 'package_search', 'package_show']
+        assert all(call[1]['include_private'] for call in TestMetadataCache.calls[:2])
+        cache.close()
+
+        cache = MetadataCache(path, batch_size=3)
+        TestMetadataCache.calls = list()
+        TestMetadataCache.hdx_datasets['id3'] = make_dataset(3, '2016-07-01T00:00:00')
+        TestMetadataCache.hdx_datasets['id3']['title'] = 'Changed'
+        datasets, not_found = cache.read_datasets(configuration, ['id1', 'dataset2', 'id3', 'id4', 'id5'])
+        assert [dataset['title'] for dataset in datasets] == ['Dataset 1', 'Dataset 2', 'Changed', 'Dataset 4',
+                                                              'Dataset 5']
+        assert not_found == []
+        # the unchanged private dataset is revalidated by search and not fetched again
+        assert [(call[0], call[1].get('fl')) for call in TestMetadataCache.calls] == [
+            ('package_search', 'id,metadata_modified'), ('package_search', 'id,metadata_modified'),
+            ('package_search', None)]
+        assert re.findall(r'"([^"]*)"', TestMetadataCache.calls[2][1]['fq']) == ['id3', 'id3']
+
+        TestMetadataCache.calls = list()
+        datasets, _ = cache.read_datasets(configuration, ['id1', 'id2', 'id3'])
+        assert len(datasets) == 3
+        assert len(TestMetadataCache.calls) == 1
+
+        del TestMetadataCache.hdx_datasets['id4']
+        assert cache.read_dataset(configuration, 'id4') is None
+        assert cache.get('id4') is None
+        assert cache.get('dataset1')['id'] == 'id1'
+        cache.close()
+
+    def test_read_resource(self, configuration, hdx):
+        cache = MetadataCache(':memory:')
+        resource = cache.read_resource(configuration, 'res1')
+        assert resource['name'] == 'Resource 1'
+        assert cache.get('id1') is not None
+        TestMetadataCache.calls = list()
+        resource = cache.read_resource(configuration, 'res1')
+        assert resource['package_id'] == 'id1'
+        assert len(TestMetadataCache.calls) == 1
+        assert cache.read_resource(configuration, 'NOTEXIST') is None
+        cache.clear()
+        assert len(cache) == 0
+        cache.close()
@@ -1,17 +1,25 @@
 #!/usr/bin/env python
 # -*- coding: UTF-8 -*-
 """Resource Tests"""
+import asyncio
 import copy
 import json
+import sqlite3
+import threading
+import zipfile
+from datetime import datetime
 from os import unlink
-from os.path import join
+from os.path import join, exists
 
+import openpyxl
 import pytest
 import requests
 
 from hdx.configuration import Configuration
 from hdx.data.hdxobject import HDXError
 from hdx.data.resource import Resource
+from hdx.remoteckan import ResponseCache, PooledRemoteCKAN
+from hdx.utilities.chunking import ByteBudgetChunker
 from hdx.utilities.dictionary import merge_two_dictionaries
 from hdx.utilities.downloader import DownloadError
 
@@ -97,7 +105,7 @@ def mockshow(url, datadict):
         return MockResponse(404,
                             '{"success": false, "error": {"message": "TEST ERROR: Not show", "__type": "TEST ERROR: Not Show Error"}, "help": "http://test-data.humdata.org/api/3/action/help_show?name=resource_show"}')
     result = json.dumps(resultdict)
-    if datadict['id'] == 'TEST1':
+    if datadict['id'] in ('TEST1', 'de6549d8-268b-4dfe-adaf-a4ae5c8510d5'):
         return MockResponse(200,
                             '{"success": true, "result": %s, "help": "http://test-data.humdata.org/api/3/action/help_show?name=resource_show"}' % result)
     if datadict['id'] == 'TEST2':
@@ -171,7 +179,7 @@ class TestResource():
             datadict = json.loads(data.decode('utf-8'))
             return mockshow(url, datadict)
 
-        monkeypatch.setattr(requests, 'post', mockreturn)
+        monkeypatch.setattr(requests.Session, 'post', staticmethod(mockreturn))
 
     @pytest.fixture(scope='function')
     def post_create(self, monkeypatch):
@@ -196,7 +204,7 @@ class TestResource():
             return MockResponse(404,
                                 '{"success": false, "error": {"message": "Not found", "__type": "Not Found Error"}, "help": "http://test-data.humdata.org/api/3/action/help_show?name=resource_create"}')
 
-        monkeypatch.setattr(requests, 'post', mockreturn)
+        monkeypatch.setattr(requests.Session, 'post', staticmethod(mockreturn))
 
     @pytest.fixture(scope='function')
     def post_update(self, monkeypatch):
@@ -204,27 +212,27 @@ class TestResource():
             datadict = json.loads(data.decode('utf-8'))
             if 'show' in url:
                 return mockshow(url, datadict)
-            if 'update' not in url:
+            if 'update' not in url and 'patch' not in url:
                 return MockResponse(404,
                                     '{"success": false, "error": {"message": "TEST ERROR: Not update", "__type": "TEST ERROR: Not Update Error"}, "help": "http://test-data.humdata.org/api/3/action/help_show?name=resource_update"}')
             resultdictcopy = copy.deepcopy(resultdict)
             merge_two_dictionaries(resultdictcopy, datadict)
 
             result = json.dumps(resultdictcopy)
-            if datadict['name'] == 'MyResource1':
+            if resultdictcopy['name'] == 'MyResource1':
                 return MockResponse(200,
                                     '{"success": true, "result": %s, "help": "http://test-data.humdata.org/api/3/action/help_show?name=resource_update"}' % result)
-            if datadict['name'] == 'MyResource2':
+            if resultdictcopy['name'] == 'MyResource2':
                 return MockResponse(404,
                                     '{"success": false, "error": {"message": "Not found", "__type": "Not Found Error"}, "help": "http://test-data.humdata.org/api/3/action/help_show?name=resource_update"}')
-            if datadict['name'] == 'MyResource3':
+            if resultdictcopy['name'] == 'MyResource3':
                 return MockResponse(200,
                                     '{"success": false, "error": {"message": "Not found", "__type": "Not Found Error"}, "help": "http://test-data.humdata.org/api/3/action/help_show?name=resource_update"}')
 
             return MockResponse(404,
                                 '{"success": false, "error": {"message": "Not found", "__type": "Not Found Error"}, "help": "http://test-data.humdata.org/api/3/action/help_show?name=resource_update"}')
 
-        monkeypatch.setattr(requests, 'post', mockreturn)
+        monkeypatch.setattr(requests.Session, 'post', staticmethod(mockreturn))
 
     @pytest.fixture(scope='function')
     def post_delete(self, monkeypatch):
@@ -243,7 +251,7 @@ class TestResource():
             return MockResponse(404,
                                 '{"success": false, "error": {"message": "Not found", "__type": "Not Found Error"}, "help": "http://test-data.humdata.org/api/3/action/help_show?name=resource_delete"}')
 
-        monkeypatch.setattr(requests, 'post', mockreturn)
+        monkeypatch.setattr(requests.Session, 'post', staticmethod(mockreturn))
 
     @pytest.fixture(scope='function')
     def post_datastore(self, monkeypatch):
@@ -271,7 +279,7 @@ class TestResource():
             return MockResponse(404,
                                 '{"success": false, "error": {"message": "Not found", "__type": "Not Found Error"}, "help": "http://test-data.humdata.org/api/3/action/help_show?name=resource_delete"}')
 
-        monkeypatch.setattr(requests, 'post', mockreturn)
+        monkeypatch.setattr(requests.Session, 'post', staticmethod(mockreturn))
 
     @pytest.fixture(scope='function')
     def search(self, monkeypatch):
@@ -279,7 +287,18 @@ class TestResource():
             datadict = json.loads(data.decode('utf-8'))
             return mocksearch(url, datadict)
 
-        monkeypatch.setattr(requests, 'post', mockreturn)
+        monkeypatch.setattr(requests.Session, 'post', staticmethod(mockreturn))
+
+    @pytest.fixture(scope='function')
+    def read_many(self, monkeypatch):
+        def mockreturn(url, data, headers, files, allow_redirects, auth):
+            datadict = json.loads(data.decode('utf-8'))
+            if datadict['id'] == 'TESTERROR':
+                return MockResponse(409,
+                                    '{"success": false, "error": {"message": "Validation Error", "__type": "Validation Error"}, "help": "http://test-data.humdata.org/api/3/action/help_show?name=resource_show"}')
+            return mockshow(url, datadict)
+
+        monkeypatch.setattr(requests.Session, 'post', staticmethod(mockreturn))
 
     @pytest.fixture(scope='class')
     def configuration(self):
@@ -297,6 +316,17 @@ class TestResource():
         resource = Resource.read_from_hdx(configuration, 'TEST3')
         assert resource is None
 
+    def test_read_many_from_hdx(self, configuration, read_many):
+        identifiers = ['TEST2', 'TEST1', 'TESTERROR', 'TEST3', 'TEST1']
+        resources, not_found, errors = Resource.read_many_from_hdx(configuration, identifiers, max_workers=3)
+        assert [None if resource is None else resource['id'] for resource in resources] == \
+            [None, 'de6549d8-268b-4dfe-adaf-a4ae5c8510d5', None, None, 'de6549d8-268b-4dfe-adaf-a4ae5c8510d5']
+        assert resources[1] is not resources[4]
+        assert not_found == ['TEST2', 'TEST3']
+        assert list(errors.keys()) == ['TESTERROR']
+        assert isinstance(errors['TESTERROR'], HDXError)
+        assert Resource.read_many_from_hdx(configuration, []) == ([], [], {})
+
     def test_create_in_hdx(self, configuration, post_create):
         resource = Resource(configuration)
         with pytest.raises(HDXError):
@@ -321,6 +351,50 @@ class TestResource():
         with pytest.raises(HDXError):
             resource.create_in_hdx()
 
+    def test_async(self, configuration, post_create):
+        async def read_create():
+            resource = await Resource.aread_from_hdx(configuration, 'TEST1')
+            assert resource['name'] == 'MyResource1'
+            assert await Resource.aread_from_hdx(configuration, 'TEST2') is None
+            resource = Resource(configuration, copy.deepcopy(TestResource.resource_data))
+            await resource.acreate_in_hdx()
+            assert resource['id'] == 'de6549d8-268b-4dfe-adaf-a4ae5c8510d5'
+            resource_data = copy.deepcopy(TestResource.resource_data)
+            resource_data['name'] = 'MyResource2'
+            resource = Resource(configuration, resource_data)
+            with pytest.raises(HDXError):
+                await resource.acreate_in_hdx()
+
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(read_create())
+        loop.close()
+
+        # blocking calls are offloaded to the client's dedicated thread pool and coroutine methods called from one of
+        # its threads run inline, so nesting does not deadlock even a pool of one thread
+        configuration1 = Configuration(hdx_key_file=join('fixtures', '.hdxkey'),
+                                       project_config_dict={'pool_maxsize': 1})
+
+        def nested():
+            assert PooledRemoteCKAN.in_executor_thread() is True
+            nested_loop = asyncio.new_event_loop()
+            try:
+                return nested_loop.run_until_complete(Resource.aread_from_hdx(configuration1, 'TEST1'))
+            finally:
+                nested_loop.close()
+
+        async def outer():
+            assert PooledRemoteCKAN.in_executor_thread() is False
+            return await Resource._run_async(configuration1, nested)
+
+        async def main():
+            return await asyncio.wait_for(outer(), 10)
+
+        loop = asyncio.new_event_loop()
+        resource = loop.run_until_complete(main())
+        loop.close()
+        assert PooledRemoteCKAN.in_executor_thread() is False
+        assert resource['name'] == 'MyResource1'
+
     def test_update_in_hdx(self, configuration, post_update):
         resource = Resource(configuration)
         resource['id'] = 'NOTEXIST'
@@ -357,6 +431,51 @@ class TestResource():
         assert resource['id'] == 'TEST1'
         assert resource['format'] == 'xlsx'
 
+    def test_response_cache(self, configuration, post_update, monkeypatch):
+        remoteckan = Resource(configuration).hdxpostsite
+        response_cache = ResponseCache(maxsize=10, ttl=60)
+        monkeypatch.setattr(remoteckan, 'response_cache', response_cache)
+        call_count = remoteckan.call_count
+        resource = Resource.read_from_hdx(configuration, 'TEST1')
+        resource['format'] = 'CSV'
+        resource2 = Resource.read_from_hdx(configuration, 'TEST1')
+        assert resource2['format'] == 'XLSX'
+        assert remoteckan.call_count == call_count + 1
+        statistics = response_cache.get_statistics()
+        assert statistics['hits'] == 1
+        assert statistics['misses'] == 1
+        resource['id'] = 'TEST1'
+        resource.update_in_hdx()
+        assert response_cache.get_statistics()['invalidations'] == 1
+        call_count = remoteckan.call_count
+        Resource.read_from_hdx(configuration, 'TEST1')
+        assert remoteckan.call_count == call_count + 1
+
+    def test_update_in_hdx_changes(self, configuration, post_update, post_recorder):
+        calls = post_recorder.record()
+
+        def writes():
+            return [call for call in calls if 'show' not in call[0]]
+
+        resource = Resource.read_from_hdx(configuration, 'TEST1')
+        assert resource.update_in_hdx() == 'unchanged'
+        assert writes() == []
+        assert resource['format'] == 'XLSX'
+
+        resource['format'] = 'CSV'
+        assert resource.update_in_hdx() == 'patched'
+        assert writes() == [('resource_patch', {'id': 'de6549d8-268b-4dfe-adaf-a4ae5c8510d5', 'format': 'CSV'})]
+        assert resource['format'] == 'CSV'
+
+        calls.clear()
+        for field in ('description', 'url', 'mimetype', 'hash', 'size', 'position'):
+            resource[field] = 'changed'
+        assert resource.update_in_hdx() == 'updated'
+        assert len(writes()) == 1
+        assert writes()[0][0] == 'resource_update'
+        assert writes()[0][1]['state'] == 'active'
+        assert resource['description'] == 'changed'
+
     def test_delete_from_hdx(self, configuration, post_delete):
         resource = Resource.read_from_hdx(configuration, 'TEST1')
         resource.delete_from_hdx()
@@ -402,6 +521,451 @@ class TestResource():
         with pytest.raises(DownloadError):
             resource.download()
 
+    def test_create_datastore_streaming(self, configuration, post_datastore, post_recorder, monkeypatch, tmpdir):
+        path = str(tmpdir.join('data.csv'))
+        with open(path, 'w') as f:
+            f.write('code,value\n')
+            for i in range(2500):
+                f.write('C%d,%d\n' % (i, i))
+        monkeypatch.setattr(Resource, 'download', lambda self, folder=None: ('http://lala/data.csv', path))
+        calls = post_recorder.record('datastore_upsert')
+        resource = Resource.read_from_hdx(configuration, 'TEST1')
+        resource.create_datastore(chunk_bytes=65536)
+        chunks = [call[1]['records'] for call in calls]
+        assert len(chunks) == 2
+        assert 60000 < len(json.dumps(chunks[0])) <= 65536
+        assert sum(len(chunk) for chunk in chunks) == 2500
+        assert chunks[0][0] == {'code': 'C0', 'value': '0'}
+        assert chunks[1][-1] == {'code': 'C2499', 'value': '2499'}
+        assert not exists(path)
+
+    def test_create_datastore_resume(self, configuration, post_datastore, post_recorder, monkeypatch, tmpdir):
+        journal_folder = str(tmpdir.join('journal'))
+        downloads = list()
+
+        def download(self, folder=None):
+            path = join(folder, 'data.csv')
+            with open(path, 'w') as f:
+                f.write('code,value\n')
+                for i in range(2500):
+                    f.write('C%d,%d\n' % (i, i))
+            downloads.append(folder)
+            return self.data['url'], path
+
+        monkeypatch.setattr(Resource, 'download', download)
+        fail = [True]
+
+        def intercept(action, datadict):
+            # fail the second upsert
+            if fail[0] and action == 'datastore_upsert' and 'datastore_upsert' in [x[0] for x in calls]:
+                return b'{"resource_id": "NOTEXIST"}'
+            return None
+
+        calls = post_recorder.record('datastore', intercept)
+
+        def counts():
+            return [(action, len(datadict.get('records', list()))) for action, datadict in calls]
+
+        resource = Resource.read_from_hdx(configuration, 'TEST1')
+        with pytest.raises(HDXError):
+            resource.create_datastore(chunk_bytes=65536, resume=True, journal_folder=journal_folder)
+        assert not calls
+        with pytest.raises(HDXError):
+            resource.create_datastore(primary_key='code', delete_first=1, chunk_bytes=65536, resume=True,
+                                      journal_folder=journal_folder)
+        journal_path = join(journal_folder, '%s.journal.json' % resource['id'])
+        source_path = join(journal_folder, '%s.source' % resource['id'])
+        with open(journal_path) as f:
+            journal = json.load(f)
+        committed = counts()[2][1]
+        assert journal['rows_committed'] == committed
+        assert journal['source_hash'] == Resource._get_file_hash(source_path)
+        assert [x[0] for x in calls] == ['datastore_delete', 'datastore_create', 'datastore_upsert',
+                                         'datastore_upsert']
+
+        calls.clear()
+        fail[0] = False
+        resource.create_datastore(primary_key='code', delete_first=1, chunk_bytes=65536, resume=True,
+                                  journal_folder=journal_folder)
+        assert len(downloads) == 1
+        assert all(x[0] == 'datastore_upsert' for x in calls)
+        assert sum(x[1] for x in counts()) == 2500 - committed
+        assert not exists(journal_path)
+        assert not exists(source_path)
+
+        # journal for a different url is discarded and the upload starts again
+        calls.clear()
+        fail[0] = True
+        with pytest.raises(HDXError):
+            resource.create_datastore(primary_key='code', chunk_bytes=65536, resume=True,
+                                      journal_folder=journal_folder)
+        fail[0] = False
+        calls.clear()
+        resource['url'] = 'http://lala/changed.csv'
+        resource.create_datastore(primary_key='code', chunk_bytes=65536, resume=True, journal_folder=journal_folder)
+        assert len(downloads) == 3
+        assert calls[0][0] == 'datastore_create'
+        assert sum(x[1] for x in counts()) == 2500
+
+    def test_upload_chunks_checkpoint(self, configuration, post_datastore, post_recorder):
+        def intercept(action, datadict):
+            # the first chunk only finishes once the later chunks have been uploaded
+            if datadict['records'][0]['code'] == 'A':
+                post_recorder.wait_for_calls(2)
+            return None
+
+        post_recorder.record('datastore_upsert', intercept)
+        resource = Resource.read_from_hdx(configuration, 'TEST1')
+        checkpoints = list()
+        chunks = iter([[{'code': 'A'}], [{'code': 'B'}, {'code': 'C'}], [{'code': 'D'}]])
+        uploaded = resource._upload_chunks(chunks, 'insert', max_workers=3, start_offset=10,
+                                           checkpoint=checkpoints.append)
+        assert uploaded == 4
+        # later chunks finish first but the committed offset only advances past contiguous chunks
+        assert checkpoints == [14]
+        checkpoints.clear()
+        chunks = iter([[{'code': 'B'}], [{'code': 'C'}, {'code': 'D'}]])
+        resource._upload_chunks(chunks, 'insert', checkpoint=checkpoints.append)
+        assert checkpoints == [1, 3]
+
+    def test_create_datastore_from_local(self, configuration, post_datastore, post_recorder, monkeypatch, tmpdir):
+        def download(self, folder=None):
+            raise AssertionError('Resource should not be downloaded')
+
+        monkeypatch.setattr(Resource, 'download', download)
+        calls = post_recorder.record('datastore')
+        resource = Resource.read_from_hdx(configuration, 'TEST1')
+        path = str(tmpdir.join('data.csv'))
+        with open(path, 'w') as f:
+            f.write('code,value\n')
+            for i in range(10):
+                f.write('C%d,%d\n' % (i, i))
+        assert resource.create_datastore_from_file(path, delete_first=2) == 10
+        assert exists(path)
+        assert [call[0] for call in calls] == ['datastore_delete', 'datastore_create', 'datastore_upsert']
+        assert calls[1][1]['fields'] == [{'id': 'code', 'type': 'text'}, {'id': 'value', 'type': 'text'}]
+        assert calls[2][1]['method'] == 'insert'
+        assert calls[2][1]['records'][9] == {'code': 'C9', 'value': '9'}
+
+        calls.clear()
+        schema = [{'id': 'code', 'type': 'text'}, {'id': 'value', 'type': 'int'}]
+        with open(path) as f:
+            assert resource.create_datastore_from_fileobj(f, schema, 'code', delete_first=2) == 10
+        assert [call[0] for call in calls] == ['datastore_create', 'datastore_upsert']
+        assert calls[0][1]['fields'] == schema
+        assert calls[0][1]['primary_key'] == 'code'
+        assert calls[1][1]['method'] == 'upsert'
+
+        calls.clear()
+        rows = ({'code': 'C%d' % i, 'value': i} for i in range(5))
+        assert resource.create_datastore_from_rows(rows, ['code', 'value'], delete_first=1) == 5
+        assert [call[0] for call in calls] == ['datastore_delete', 'datastore_create', 'datastore_upsert']
+        assert calls[2][1]['records'][4] == {'code': 'C4', 'value': 4}
+        with pytest.raises(HDXError):
+            resource.create_datastore_from_rows(iter([]))
+        with pytest.raises(HDXError):
+            resource.create_datastore_from_rows(iter([]), ['code'], delete_first=3)
+
+    def test_create_datastore_formats(self, configuration, post_datastore, post_recorder, monkeypatch, tmpdir):
+        xlsx_path = str(tmpdir.join('download'))
+        workbook = openpyxl.Workbook(write_only=True)
+        worksheet = workbook.create_sheet()
+        worksheet.append(['code', 'value', 'date'])
+        for i in range(5):
+            worksheet.append(['C%d' % i, i, datetime(2017, 1, i + 1)])
+        workbook.save(xlsx_path)
+
+        def download(self, folder=None):
+            return self.data['url'], xlsx_path
+
+        monkeypatch.setattr(Resource, 'download', download)
+        calls = post_recorder.record('datastore')
+        resource = Resource.read_from_hdx(configuration, 'TEST1')
+        resource['format'] = 'XLSX'
+        resource.create_datastore(infer_types=True)
+        assert not exists(xlsx_path)
+        assert calls[0][1]['fields'] == [{'id': 'code', 'type': 'text'}, {'id': 'value', 'type': 'int'},
+                                         {'id': 'date', 'type': 'timestamp'}]
+        assert calls[1][1]['records'][4] == {'code': 'C4', 'value': 4, 'date': '2017-01-05T00:00:00'}
+
+        calls.clear()
+        zip_path = str(tmpdir.join('resource2_csv.zip'))
+        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr('resource2.csv', 'code,value\nC1,1\nC2,2\n')
+        assert resource.create_datastore_from_file(zip_path) == 2
+        assert calls[1][1]['records'] == [{'code': 'C1', 'value': '1'}, {'code': 'C2', 'value': '2'}]
+
+        calls.clear()
+        jsonl_path = str(tmpdir.join('data'))
+        with open(jsonl_path, 'w') as f:
+            f.write('{"code": "C1", "value": 1}\n')
+        assert resource.create_datastore_from_file(jsonl_path, file_format='jsonl') == 1
+        assert calls[1][1]['records'] == [{'code': 'C1', 'value': 1}]
+
+    @pytest.fixture(scope='function')
+    def datastore_sql(self, configuration, post_datastore, monkeypatch):
+        resource = Resource.read_from_hdx(configuration, 'TEST1')
+        connection = sqlite3.connect(':memory:', check_same_thread=False)
+        connection.execute('CREATE TABLE "%s" ("_id" INTEGER PRIMARY KEY, "_full_text" TEXT, "code" TEXT, '
+                           '"country" TEXT, "value" INTEGER)' % resource['id'])
+        connection.executemany('INSERT INTO "%s" VALUES (?, ?, ?, ?, ?)' % resource['id'],
+                               [(i + 1, 'text', 'C%03d' % i, ['AFG', 'YEM', 'SOM'][i % 3], i) for i in range(250)])
+        sqls = list()
+        lock = threading.Lock()
+        post = requests.Session.post
+
+        def sqlpost(url, data=None, **kwargs):
+            if 'datastore_search_sql' in url:
+                sql = json.loads(data.decode('utf-8'))['sql']
+                with lock:
+                    sqls.append(sql)
+                    cursor = connection.execute(sql)
+                    names = [description[0] for description in cursor.description]
+                    records = [dict(zip(names, row)) for row in cursor.fetchall()]
+                return MockResponse(200, json.dumps({'success': True, 'result': {'records': records, 'sql': sql}}))
+            return post(url, data=data, **kwargs)
+
+        monkeypatch.setattr(requests.Session, 'post', staticmethod(sqlpost))
+        return resource, sqls
+
+    def test_iter_datastore_rows(self, datastore_sql):
+        resource, sqls = datastore_sql
+        rows = list(resource.iter_datastore_rows(page_size=100))
+        assert len(rows) == 250
+        assert rows[0] == {'_id': 1, 'code': 'C000', 'country': 'AFG', 'value': 0}
+        assert [row['_id'] for row in rows] == list(range(1, 251))
+        assert len(sqls) == 3
+        assert '"_id" > 100 ORDER BY "_id" LIMIT 100' in sqls[1]
+        assert not any('OFFSET' in sql for sql in sqls)
+
+        sqls.clear()
+        rows = list(resource.iter_datastore_rows(filters={'country': ['AFG', 'SOM']}, fields=['code'], page_size=50,
+                                                 key='code'))
+        assert rows == [{'code': 'C%03d' % i} for i in range(250) if i % 3 != 1]
+        assert len(sqls) == 4
+        assert sqls[1] == 'SELECT "code" FROM "%s" WHERE "country" IN (\'AFG\', \'SOM\') AND "code" > \'C074\' ' \
+                          'ORDER BY "code" LIMIT 50' % resource['id']
+
+        sqls.clear()
+        rows = list(resource.iter_datastore_rows(filters={'country': 'YEM'}, fields=['_id', 'value'], page_size=83,
+                                                 prefetch=False))
+        assert rows[-1] == {'_id': 248, 'value': 247}
+        assert len(rows) == 83
+        assert len(sqls) == 2
+
+        rows = resource.iter_datastore_rows(page_size=10)
+        assert next(rows)['code'] == 'C000'
+        rows.close()
+        with pytest.raises(HDXError):
+            next(resource.iter_datastore_rows(page_size=0))
+
+    def test_query_datastore_sql(self, datastore_sql):
+        resource, sqls = datastore_sql
+        sql = 'SELECT * FROM "%s" WHERE "country" = %%(country)s ORDER BY "_id";' % resource['id']
+        rows = list(resource.query_datastore_sql(sql, {'country': "AFG' OR 'a' = 'a"}))
+        assert rows == []
+        rows = list(resource.query_datastore_sql(sql, {'country': 'AFG'}, page_size=30))
+        assert len(rows) == 84
+        assert rows[1] == {'_id': 4, 'code': 'C003', 'country': 'AFG', 'value': 3}
+        assert sqls[-1].endswith('LIMIT 30 OFFSET 60')
+        assert len(sqls) == 4
+        sqls.clear()
+        sql = 'SELECT "code" FROM "%s" WHERE "value" < %%s AND "value" >= %%s ORDER BY "_id"' % resource['id']
+        rows = list(resource.query_datastore_sql(sql, [5, 3], page_size=None))
+        assert rows == [{'code': 'C003'}, {'code': 'C004'}]
+        assert sqls == ['SELECT "code" FROM "%s" WHERE "value" < 5 AND "value" >= 3 ORDER BY "_id"' % resource['id']]
+        with pytest.raises(HDXError):
+            list(resource.query_datastore_sql('SELECT * FROM "%s"' % resource['id']))
+
+        rows = list(resource.get_datastore_sums(['value'], ['country'], {'country': ['AFG', 'YEM']}))
+        assert rows == [{'country': 'AFG', 'value': sum(range(0, 250, 3))},
+                        {'country': 'YEM', 'value': sum(range(1, 250, 3))}]
+        assert list(resource.get_datastore_sums(['value'])) == [{'value': sum(range(250))}]
+        assert list(resource.get_datastore_counts(['country'])) == [{'country': 'AFG', 'count': 84},
+                                                                    {'country': 'SOM', 'count': 83},
+                                                                    {'country': 'YEM', 'count': 83}]
+        assert list(resource.get_datastore_counts(filters={'country': 'SOM'})) == [{'count': 83}]
+        # SQLite does not support DISTINCT ON so only check the SQL sent
+        sqls.clear()
+        with pytest.raises(HDXError):
+            list(resource.get_datastore_latest('value', ['country'], ['country', 'code']))
+        assert sqls[0] == 'SELECT DISTINCT ON ("country") "country", "code" FROM "%s" ORDER BY "country", ' \
+                          '"value" DESC NULLS LAST LIMIT 10000 OFFSET 0' % resource['id']
+
+    def test_create_datastore_infer_types(self, configuration, post_datastore, post_recorder, monkeypatch):
+        calls = post_recorder.record('datastore')
+        monkeypatch.setattr(Resource, 'infer_sample_rows', 3)
+        resource = Resource.read_from_hdx(configuration, 'TEST1')
+        rows = [{'code': 'C%d' % i, 'value': str(i), 'date': '2016-06-%02d' % (i + 1)} for i in range(5)]
+        rows[4]['value'] = ''
+        assert resource.create_datastore_from_rows(iter(rows), ['code', 'value', 'date'], infer_types=True) == 5
+        assert calls[0][1]['fields'] == [{'id': 'code', 'type': 'text'}, {'id': 'value', 'type': 'int'},
+                                         {'id': 'date', 'type': 'timestamp'}]
+        records = calls[1][1]['records']
+        assert [record['value'] for record in records] == [0, 1, 2, 3, None]
+
+        # values after the sample that do not fit the inferred type become null rather than failing the upload
+        calls.clear()
+        rows = [{'code': 'C%d' % i, 'value': str(i)} for i in range(5)]
+        rows[4]['value'] = '4.5'
+        assert resource.create_datastore_from_rows(iter(rows), ['code', 'value'], infer_types=True) == 5
+        assert calls[0][1]['fields'] == [{'id': 'code', 'type': 'text'}, {'id': 'value', 'type': 'int'}]
+        assert [record['value'] for record in calls[1][1]['records']] == [0, 1, 2, 3, None]
+        # but they fail the upload if the schema was provided
+        rows = [{'code': 'C%d' % i, 'value': str(i)} for i in range(5)]
+        rows[4]['value'] = '4.5'
+        schema = [{'id': 'code', 'type': 'text'}, {'id': 'value', 'type': 'int'}]
+        with pytest.raises(HDXError):
+            resource.create_datastore_from_rows(iter(rows), schema=schema, infer_types=True)
+        schema = [{'id': 'code', 'type': 'text'}, {'id': 'value', 'type': 'float'}]
+        calls.clear()
+        resource.create_datastore_from_rows(iter(rows), schema=schema, infer_types=True)
+        assert calls[0][1]['fields'] == schema
+        assert calls[1][1]['records'][4]['value'] == 4.5
+
+    def test_sync_datastore(self, configuration, post_datastore, post_recorder, monkeypatch, tmpdir, caplog):
+        calls = post_recorder.record('datastore')
+        resource = Resource.read_from_hdx(configuration, 'TEST1')
+        snapshot_path = str(tmpdir.join('snapshot.db'))
+        rows = [{'code': 'C%d' % i, 'value': str(i)} for i in range(100)]
+        assert resource.sync_datastore_from_rows(iter(rows), 'code', snapshot_path, ['code', 'value']) == (100, 0)
+        assert [call[0] for call in calls] == ['datastore_create', 'datastore_upsert']
+        assert calls[1][1]['method'] == 'upsert'
+
+        calls.clear()
+        rows[10]['value'] = 'changed'
+        rows = rows[:50] + rows[52:]
+        assert resource.sync_datastore_from_rows(iter(rows), 'code', snapshot_path, ['code', 'value']) == (1, 2)
+        assert [call[0] for call in calls] == ['datastore_upsert', 'datastore_delete']
+        assert calls[0][1]['records'] == [{'code': 'C10', 'value': 'changed'}]
+        assert calls[1][1]['filters'] == {'code': ['C50', 'C51']}
+
+        calls.clear()
+        assert resource.sync_datastore_from_rows(iter(rows), 'code', snapshot_path, ['code', 'value']) == (0, 0)
+        assert calls == []
+
+        # a different primary key resets the snapshot and creates the datastore again
+        calls.clear()
+        assert resource.sync_datastore_from_rows(iter(rows), 'value', snapshot_path, ['code', 'value']) == (98, 0)
+        assert [call[0] for call in calls] == ['datastore_create', 'datastore_upsert']
+        assert calls[0][1]['primary_key'] == 'value'
+
+        path = str(tmpdir.join('data.csv'))
+        with open(path, 'w') as f:
+            f.write('code,value\n')
+            for row in rows[1:]:
+                f.write('%s,%s\n' % (row['code'], row['value']))
+        monkeypatch.setattr(Resource, 'download', lambda self, folder=None: ('http://lala/data.csv', path))
+        calls.clear()
+        resource.update_datastore(primary_key='value', snapshot_path=snapshot_path)
+        assert [call[0] for call in calls] == ['datastore_delete']
+        assert calls[0][1]['filters'] == {'value': ['0']}
+        assert not exists(path)
+        with pytest.raises(HDXError):
+            resource.sync_datastore_from_rows(iter(rows), None, snapshot_path, ['code', 'value'])
+
+        # composite primary key
+        snapshot_path = str(tmpdir.join('snapshot2.db'))
+        rows = [{'code': 'C%d' % (i // 3), 'date': '2017-0%d' % (i % 3 + 1), 'value': str(i)} for i in range(9)]
+        calls.clear()
+        assert resource.sync_datastore_from_rows(iter(rows), 'code,date', snapshot_path,
+                                                 ['code', 'date', 'value']) == (9, 0)
+        rows[4]['value'] = 'changed'
+        rows = [row for i, row in enumerate(rows) if i not in (0, 1, 5)]
+        calls.clear()
+        assert resource.sync_datastore_from_rows(iter(rows), 'code,date', snapshot_path,
+                                                 ['code', 'date', 'value']) == (1, 3)
+        assert [call[0] for call in calls] == ['datastore_upsert', 'datastore_delete', 'datastore_delete']
+        assert calls[0][1]['records'] == [{'code': 'C1', 'date': '2017-02', 'value': 'changed'}]
+        assert [call[1]['filters'] for call in calls[1:]] == [{'code': 'C0', 'date': ['2017-01', '2017-02']},
+                                                              {'code': 'C1', 'date': ['2017-03']}]
+
+        # a first sync into an existing datastore cannot delete stale rows so warns
+        resource['datastore_active'] = True
+        calls.clear()
+        assert resource.sync_datastore_from_rows(iter(rows), 'code,date', str(tmpdir.join('snapshot3.db')),
+                                                 ['code', 'date', 'value']) == (6, 0)
+        assert any('already exists' in record.getMessage() for record in caplog.records)
+        assert [call[0] for call in calls] == ['datastore_create', 'datastore_upsert']
+
+    def test_upload_chunks_too_large(self, configuration, post_datastore, post_recorder):
+        def intercept(action, datadict):
+            if len(datadict['records']) > 3:
+                return MockResponse(413, '<html>Request Entity Too Large</html>')
+            return None
+
+        calls = post_recorder.record('datastore_upsert', intercept)
+
+        def sizes():
+            return [len(call[1]['records']) for call in calls]
+
+        resource = Resource.read_from_hdx(configuration, 'TEST1')
+        chunker = ByteBudgetChunker(target_bytes=100000, min_bytes=1000)
+        rows = [{'code': 'C%d' % i} for i in range(10)]
+        assert resource._upload_chunks(iter([rows]), 'insert', chunker=chunker) == 10
+        assert sizes() == [10, 5, 2, 3, 5, 2, 3]
+        assert chunker.budgets[:3] == [100000, 50000, 25000]
+        calls.clear()
+        with pytest.raises(HDXError):
+            resource._upload_chunks(iter([rows]), 'insert')
+        assert sizes() == [10]
+
+    def test_upload_chunks_parallel(self, configuration, post_datastore, post_recorder):
+        started = dict()
+
+        def number(datadict):
+            return int(datadict['records'][0]['chunk'])
+
+        def completed():
+            return [number(call[1]) for call in calls]
+
+        def intercept(action, datadict):
+            chunk = number(datadict)
+            started[chunk] = completed()
+            if chunk == 0:
+                # the first chunk is held until some later chunks have been uploaded
+                post_recorder.wait_for_calls(wait_for)
+            if datadict['records'][0]['code'] == 'FAIL':
+                return b'{"resource_id": "NOTEXIST"}'
+            return None
+
+        calls = post_recorder.record('datastore_upsert', intercept)
+        resource = Resource.read_from_hdx(configuration, 'TEST1')
+
+        def get_chunks(codes):
+            return iter([[{'chunk': str(i), 'code': code}] for i, code in enumerate(codes)])
+
+        wait_for = 5
+        uploaded = resource._upload_chunks(get_chunks(['A', 'B', 'C', 'D', 'E', 'F']), 'insert', max_workers=3,
+                                           max_in_flight=3)
+        assert uploaded == 6
+        assert sorted(completed()) == [0, 1, 2, 3, 4, 5]
+        assert completed()[-1] == 0
+
+        calls.clear()
+        started.clear()
+        wait_for = 1
+        uploaded = resource._upload_chunks(get_chunks(['A', 'B', 'A', 'C']), 'upsert', 'code', max_workers=3)
+        assert uploaded == 4
+        assert sorted(completed()) == [0, 1, 2, 3]
+        # chunk 1 does not wait for chunk 0 but chunk 2 shares key A with it so only starts once it is uploaded
+        assert completed()[:2] == [1, 0]
+        assert 0 in started[2]
+
+        calls.clear()
+        consumed = list()
+
+        def failing_chunks():
+            for i, code in enumerate(['A', 'FAIL'] + ['X%d' % i for i in range(20)]):
+                consumed.append(i)
+                yield [{'chunk': str(i), 'code': code}]
+
+        wait_for = 1
+        with pytest.raises(HDXError):
+            resource._upload_chunks(failing_chunks(), 'insert', max_workers=2, max_in_flight=2)
+        assert len(consumed) < 22
+        assert len(calls) < 22
+
     def test_datastore(self, configuration, post_datastore, topline_yaml, topline_json):
         resource = Resource.read_from_hdx(configuration, 'TEST1')
         resource.create_datastore(delete_first=0)
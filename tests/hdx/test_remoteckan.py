@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+"""Shared CKAN Client Tests"""
+import gzip
+import json
+import time
+from os.path import join
+
+import pytest
+
+from hdx.configuration import Configuration
+from hdx.data.dataset import Dataset
+from hdx.data.galleryitem import GalleryItem
+from hdx.data.resource import Resource
+from hdx.remoteckan import RemoteCKANRegistry, ResponseCache, PooledRemoteCKAN
+
+
+class MockResponse:
+    def __init__(self, status_code, text):
+        self.status_code = status_code
+        self.text = text
+
+
+class MockSession:
+    def __init__(self, accept_gzip=True):
+        self.accept_gzip = accept_gzip
+        self.posts = list()
+
+    def post(self, url, data=None, headers=None, files=None, allow_redirects=True, **kwargs):
+        self.posts.append((data, headers))
+        if headers.get('Content-Encoding') == 'gzip':
+            if not self.accept_gzip:
+                return MockResponse(400, '"Bad request - JSON Error: No request body data"')
+            data = gzip.decompress(data)
+        datadict = json.loads(data.decode('utf-8'))
+        if datadict.get('fail'):
+            return MockResponse(400, '{"success": false, "error": {"message": "Bad", "__type": "Validation Error"}}')
+        return MockResponse(200, '{"success": true, "result": %s}' % json.dumps(datadict))
+
+
+class TestRemoteCKAN():
+    @pytest.fixture(scope='class')
+    def hdx_key_file(self):
+        return join('fixtures', '.hdxkey')
+
+    @pytest.fixture(scope='class')
+    def project_config_yaml(self):
+        return join('fixtures', 'config', 'project_configuration.yml')
+
+    def test_get_remoteckan(self, hdx_key_file, project_config_yaml):
+        RemoteCKANRegistry.clear()
+        configuration = Configuration(hdx_key_file=hdx_key_file, project_config_yaml=project_config_yaml)
+        remoteckan = RemoteCKANRegistry.get_remoteckan(configuration)
+        assert remoteckan.address == 'https://test-data.humdata.org/'
+        assert remoteckan.apikey == '12345'
+        assert remoteckan.user_agent.startswith('HDXPythonLibrary/')
+        configuration2 = Configuration(hdx_key_file=hdx_key_file, project_config_yaml=project_config_yaml)
+        assert RemoteCKANRegistry.get_remoteckan(configuration2) is remoteckan
+        configuration3 = Configuration(hdx_site='prod', hdx_key_file=hdx_key_file,
+                                       project_config_yaml=project_config_yaml)
+        remoteckan3 = RemoteCKANRegistry.get_remoteckan(configuration3)
+        assert remoteckan3 is not remoteckan
+        assert remoteckan3.address == 'https://data.humdata.org/'
+        RemoteCKANRegistry.clear()
+        assert RemoteCKANRegistry.get_remoteckan(configuration) is not remoteckan
+        RemoteCKANRegistry.clear()
+        configuration4 = Configuration(hdx_key_file=hdx_key_file, project_config_dict={'pool_maxsize': 3})
+        remoteckan4 = RemoteCKANRegistry.get_remoteckan(configuration4)
+        adapter = remoteckan4.session.get_adapter('https://test-data.humdata.org/')
+        assert adapter._pool_maxsize == 3
+        # 5xx responses reach ckanapi once retries are exhausted rather than raising RetryError
+        assert adapter.max_retries.raise_on_status is False
+        assert remoteckan4.response_cache is None
+        RemoteCKANRegistry.clear()
+        configuration5 = Configuration(hdx_key_file=hdx_key_file, project_config_dict={'response_cache_maxsize': 50,
+                                                                                        'response_cache_ttl': 60})
+        remoteckan5 = RemoteCKANRegistry.get_remoteckan(configuration5)
+        assert remoteckan5.response_cache.maxsize == 50
+        assert remoteckan5.response_cache.ttl == 60
+        assert remoteckan5.compress_requests is False
+        configuration5b = Configuration(hdx_key_file=hdx_key_file, project_config_dict={'response_cache_maxsize': 50,
+                                                                                         'response_cache_ttl': 10})
+        remoteckan5b = RemoteCKANRegistry.get_remoteckan(configuration5b)
+        assert remoteckan5b is not remoteckan5
+        assert remoteckan5b.response_cache.ttl == 10
+        configuration5c = Configuration(hdx_key_file=hdx_key_file, project_config_dict={'response_cache_maxsize': 50,
+                                                                                         'response_cache_ttl': 60,
+                                                                                         'pool_maxsize': 3})
+        assert RemoteCKANRegistry.get_remoteckan(configuration5c) is not remoteckan5
+        configuration5d = Configuration(hdx_key_file=hdx_key_file, project_config_dict={'response_cache_maxsize': 50,
+                                                                                         'response_cache_ttl': 60})
+        assert RemoteCKANRegistry.get_remoteckan(configuration5d) is remoteckan5
+        RemoteCKANRegistry.clear()
+        configuration6 = Configuration(hdx_key_file=hdx_key_file, project_config_dict={'compress_requests': True,
+                                                                                        'compress_min_bytes': 100})
+        remoteckan6 = RemoteCKANRegistry.get_remoteckan(configuration6)
+        assert remoteckan6.compress_requests is True
+        assert remoteckan6.compress_min_bytes == 100
+        assert remoteckan6.compress_level == 6
+        configuration7 = Configuration(hdx_key_file=hdx_key_file, project_config_dict={'compress_requests': True,
+                                                                                        'compress_min_bytes': 100,
+                                                                                        'compress_level': 9})
+        remoteckan7 = RemoteCKANRegistry.get_remoteckan(configuration7)
+        assert remoteckan7 is not remoteckan6
+        assert remoteckan7.compress_level == 9
+        RemoteCKANRegistry.clear()
+
+    def test_hdxobjects_share_client(self, hdx_key_file, project_config_yaml):
+        configuration = Configuration(hdx_key_file=hdx_key_file, project_config_yaml=project_config_yaml)
+        dataset = Dataset(configuration)
+        resource = Resource(configuration)
+        galleryitem = GalleryItem(configuration)
+        assert dataset.hdxpostsite is resource.hdxpostsite
+        assert resource.hdxpostsite is galleryitem.hdxpostsite
+
+    def test_compress_requests(self):
+        PooledRemoteCKAN.reset_compression_rejections()
+        records = [{'code': 'C%d' % i, 'title': 'Indicator title', 'value': i} for i in range(100)]
+        session = MockSession()
+        remoteckan = PooledRemoteCKAN('http://lala/', session, apikey='12345', compress_requests=True)
+        assert remoteckan.call_action('datastore_upsert', {'records': records}) == {'records': records}
+        data, headers = session.posts[0]
+        assert headers['Content-Encoding'] == 'gzip'
+        assert headers['Content-Type'] == 'application/json'
+        assert json.loads(gzip.decompress(data).decode('utf-8')) == {'records': records}
+        remoteckan.call_action('package_show', {'id': 'small'})
+        assert 'Content-Encoding' not in session.posts[1][1]
+        statistics = remoteckan.get_compression_statistics()
+        assert statistics['requests'] == 1
+        assert statistics['bytes_before'] == len(json.dumps({'records': records}))
+        assert statistics['bytes_after'] == len(data)
+        assert statistics['bytes_saved'] == statistics['bytes_before'] - statistics['bytes_after']
+        assert statistics['ratio'] < 0.2
+        assert statistics['fallbacks'] == 0
+        # a validation error is not resent uncompressed
+        with pytest.raises(Exception):
+            remoteckan.call_action('datastore_upsert', {'records': records, 'fail': True})
+        assert len(session.posts) == 3
+        assert remoteckan.call_count == 3
+        assert PooledRemoteCKAN.accepts_compression('http://lala/api/action/datastore_upsert') is True
+        assert remoteckan.get_compression_statistics()['fallbacks'] == 0
+
+        session = MockSession(accept_gzip=False)
+        remoteckan = PooledRemoteCKAN('http://lala/', session, apikey='12345', compress_requests=True)
+        assert remoteckan.call_action('datastore_upsert', {'records': records}) == {'records': records}
+        assert [headers.get('Content-Encoding') for _, headers in session.posts] == ['gzip', None]
+        assert remoteckan.compress_requests is True
+        assert PooledRemoteCKAN.accepts_compression('http://LALA/') is False
+        remoteckan.call_action('datastore_upsert', {'records': records})
+        assert len(session.posts) == 3
+        assert 'Content-Encoding' not in session.posts[2][1]
+        assert remoteckan.get_compression_statistics()['fallbacks'] == 1
+        assert remoteckan.get_compression_statistics()['ratio'] == 1.0
+        # other hosts are still compressed
+        session = MockSession()
+        remoteckan = PooledRemoteCKAN('http://lala2/', session, apikey='12345', compress_requests=True)
+        remoteckan.call_action('datastore_upsert', {'records': records})
+        assert session.posts[0][1]['Content-Encoding'] == 'gzip'
+        PooledRemoteCKAN.reset_compression_rejections()
+
+    def test_response_cache(self):
+        assert ResponseCache.is_cacheable('package_show') is True
+        assert ResponseCache.is_cacheable('related_list') is True
+        assert ResponseCache.is_cacheable('package_search') is True
+        assert ResponseCache.is_cacheable('datastore_delete') is False
+        cache = ResponseCache(maxsize=2, ttl=60)
+        assert cache.get('package_show', {'id': 'a'}) == (False, None)
+        result = {'id': 'a1', 'name': 'a', 'resources': [{'id': 'r1', 'package_id': 'a1'}]}
+        cache.put('package_show', {'id': 'a'}, result)
+        found, cached = cache.get('package_show', {'id': 'a'})
+        assert found is True
+        assert cached == result
+        cached['name'] = 'changed'
+        assert cache.get('package_show', {'id': 'a'})[1]['name'] == 'a'
+        cache.put('package_show', {'id': 'b'}, {'id': 'b1', 'name': 'b'})
+        cache.get('package_show', {'id': 'a'})
+        cache.put('package_show', {'id': 'c'}, {'id': 'c1', 'name': 'c'})
+        assert cache.get('package_show', {'id': 'b'})[0] is False
+        assert cache.get('package_show', {'id': 'a'})[0] is True
+        assert cache.get_statistics() == {'size': 2, 'maxsize': 2, 'hits': 4, 'misses': 2, 'evictions': 1,
+                                          'invalidations': 0}
+        assert cache.invalidate({'id': 'r1', 'package_id': 'a1'}) == 1
+        assert cache.get('package_show', {'id': 'a'})[0] is False
+        assert cache.get('package_show', {'id': 'c'})[0] is True
+        cache.put('package_search', {'q': 'x', 'rows': 10}, {'count': 0, 'results': []})
+        assert cache.invalidate({'id': 'z'}) == 1
+        assert cache.get_statistics()['invalidations'] == 2
+        cache.clear()
+        assert cache.get_statistics()['size'] == 0
+        cache = ResponseCache(maxsize=10, ttl=0.05)
+        cache.put('resource_show', {'id': 'r'}, {'id': 'r'})
+        assert cache.get('resource_show', {'id': 'r'})[0] is True
+        time.sleep(0.1)
+        assert cache.get('resource_show', {'id': 'r'})[0] is False
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+"""Chunking Tests"""
+import json
+
+from hdx.utilities.chunking import ByteBudgetChunker
+
+
+class TestChunking():
+    def test_estimate_size(self):
+        row = {'code': 'C123', 'title': 'A title', 'value': '1.5'}
+        estimate = ByteBudgetChunker.estimate_size(row)
+        actual = len(json.dumps(row))
+        assert actual <= estimate <= actual * 1.5
+        assert ByteBudgetChunker.estimate_chunk_size([row, row]) >= len(json.dumps([row, row]))
+
+    def test_chunks(self):
+        consumed = list()
+
+        def rows():
+            for i in range(1000):
+                consumed.append(i)
+                yield {'code': 'C%04d' % i, 'value': 'x' * 100}
+
+        chunker = ByteBudgetChunker(target_bytes=10000, min_bytes=1000)
+        chunks = chunker.chunks(rows())
+        chunk = next(chunks)
+        assert len(json.dumps(chunk)) <= 10000
+        assert len(consumed) == len(chunk) + 1
+        chunks = [chunk] + list(chunks)
+        assert [row['code'] for chunk in chunks for row in chunk] == ['C%04d' % i for i in range(1000)]
+        assert all(len(chunk) == len(chunks[0]) for chunk in chunks[:-1])
+        assert chunker.number_chunks == len(chunks)
+        assert list(ByteBudgetChunker().chunks([])) == []
+        wide = {'field%d' % i: 'x' * 100 for i in range(20000)}
+        assert [len(chunk) for chunk in ByteBudgetChunker(target_bytes=1000, min_bytes=1000).chunks([wide, wide])] \
+            == [1, 1]
+
+    def test_adapt(self):
+        chunker = ByteBudgetChunker(target_bytes=100000, min_bytes=10000, max_bytes=400000, growth=2)
+        chunker.record(100000, 1.0)
+        assert chunker.target_bytes == 200000
+        chunker.record(200000, 1.0)
+        assert chunker.target_bytes == 400000
+        chunker.record(400000, 1.0)
+        assert chunker.target_bytes == 400000
+        chunker.record(400000, 2.0)
+        assert chunker.target_bytes == 400000
+        chunker.record(400000, 5.0)
+        assert chunker.target_bytes == 200000
+        assert chunker.back_off('request too large') == 100000
+        assert chunker.best_throughput is None
+        for i in range(10):
+            chunker.back_off()
+        assert chunker.target_bytes == 10000
+        assert chunker.budgets == [100000, 200000, 400000, 200000, 100000, 50000, 25000, 12500, 10000]
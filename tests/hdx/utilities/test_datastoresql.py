@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+"""Datastore SQL Tests"""
+import pytest
+
+from hdx.utilities.datastoresql import quote_identifier, quote_literal, get_conditions, get_select, format_sql, \
+    get_page_sql, get_sum, get_count, get_latest
+
+
+class TestDatastoreSQL():
+    def test_quote_identifier(self):
+        assert quote_identifier('code') == '"code"'
+        assert quote_identifier('my "field"') == '"my ""field"""'
+        with pytest.raises(ValueError):
+            quote_identifier('')
+        with pytest.raises(ValueError):
+            quote_identifier('a\x00b')
+        with pytest.raises(ValueError):
+            quote_identifier(None)
+
+    def test_quote_literal(self):
+        assert quote_literal(None) == 'NULL'
+        assert quote_literal(True) == 'TRUE'
+        assert quote_literal(3) == '3'
+        assert quote_literal(2.5) == '2.5'
+        assert quote_literal("O'Brien") == "'O''Brien'"
+        assert quote_literal('x\\\'; DROP TABLE y; --') == "'x\\''; DROP TABLE y; --'"
+        with pytest.raises(ValueError):
+            quote_literal(float('nan'))
+        with pytest.raises(ValueError):
+            quote_literal('a\x00')
+
+    def test_get_select(self):
+        conditions = get_conditions({'country': ['AFG', 'YEM'], 'year': 2016, 'notes': None, 'none': []})
+        assert conditions == ['"country" IN (\'AFG\', \'YEM\')', '"year" = 2016', '"notes" IS NULL', 'FALSE']
+        assert get_conditions(None) == []
+        assert get_select('abc') == 'SELECT * FROM "abc"'
+        assert get_select('abc', ['code', 'value'], ['"_id" > 10'], ['_id'], 100) == \
+            'SELECT "code", "value" FROM "abc" WHERE "_id" > 10 ORDER BY "_id" LIMIT 100'
+
+    def test_format_sql(self):
+        assert format_sql('SELECT 1 WHERE "a" LIKE \'x%\'') == 'SELECT 1 WHERE "a" LIKE \'x%\''
+        assert format_sql('SELECT * FROM "t" WHERE "a" = %(a)s AND "b" LIKE \'x%%\'', {'a': "it's"}) == \
+            'SELECT * FROM "t" WHERE "a" = \'it\'\'s\' AND "b" LIKE \'x%\''
+        assert format_sql('SELECT * FROM "t" WHERE "a" = %s AND "b" = %s', [1, None]) == \
+            'SELECT * FROM "t" WHERE "a" = 1 AND "b" = NULL'
+        assert get_page_sql('SELECT * FROM "t" ORDER BY "_id";\n', 100, 200) == \
+            'SELECT * FROM "t" ORDER BY "_id" LIMIT 100 OFFSET 200'
+        with pytest.raises(ValueError):
+            get_page_sql('SELECT * FROM (SELECT * FROM "t" ORDER BY "_id") AS "q"', 100, 0)
+        with pytest.raises(ValueError):
+            get_page_sql('SELECT * FROM "t" WHERE "a" = \'ORDER BY\' -- ORDER BY', 100, 0)
+        with pytest.raises(ValueError):
+            get_page_sql('SELECT * FROM "t" ORDER BY "_id" LIMIT 10', 100, 0)
+        assert get_page_sql('SELECT "order", ROW_NUMBER() OVER (ORDER BY "a") FROM "t" ORDER BY "_id"', 10, 0) == \
+            'SELECT "order", ROW_NUMBER() OVER (ORDER BY "a") FROM "t" ORDER BY "_id" LIMIT 10 OFFSET 0'
+
+    def test_aggregations(self):
+        assert get_sum('t', ['value']) == 'SELECT SUM("value") AS "value" FROM "t"'
+        assert get_sum('t', ['value', 'total'], ['country', 'year'], {'year': 2016}) == \
+            'SELECT "country", "year", SUM("value") AS "value", SUM("total") AS "total" FROM "t" WHERE "year" = 2016 ' \
+            'GROUP BY "country", "year" ORDER BY "country", "year"'
+        assert get_count('t') == 'SELECT COUNT(*) AS "count" FROM "t"'
+        assert get_count('t', ['country']) == \
+            'SELECT "country", COUNT(*) AS "count" FROM "t" GROUP BY "country" ORDER BY "country"'
+        assert get_latest('t', 'date', ['country'], filters={'code': 'C1'}) == \
+            'SELECT DISTINCT ON ("country") * FROM "t" WHERE "code" = \'C1\' ORDER BY "country", "date" DESC NULLS LAST'
+        with pytest.raises(ValueError):
+            get_latest('t', 'date', [])
+        with pytest.raises(ValueError):
+            get_sum('t', [], ['country'])
+        with pytest.raises(ValueError):
+            get_sum('t', ['value"; DROP TABLE t; --'], ['\x00'])
@@ -1,9 +1,11 @@
 #!/usr/bin/env python
 # -*- coding: UTF-8 -*-
 """Dictionary Tests"""
+import copy
+
 import pytest
 
-from hdx.utilities.dictionary import merge_dictionaries, dict_diff
+from hdx.utilities.dictionary import merge_dictionaries, merge_two_dictionaries, dict_diff, dict_diff_deep
 
 
 class TestDictionary():
@@ -18,6 +20,22 @@ class TestDictionary():
         assert result == {1: 1, 2: 6, 3: 3, 4: {8: '8', 'g': 3, 'b': 'c', 'a': 1}, 5: 7, 6: 9, 8: {'k': 'b', 3: 12},
                           9: {'e': 'h', 'c': 12}}
 
+    def test_merge_two_dictionaries_replace_lists(self):
+        d1 = {1: [1, 2], 2: {'a': [3]}, 3: 3}
+        d2 = {1: [1, 2], 2: {'a': [4]}}
+        assert merge_two_dictionaries(d1, d2) == {1: [1, 2, 1, 2], 2: {'a': [3, 4]}, 3: 3}
+        d1 = {1: [1, 2], 2: {'a': [3]}, 3: 3}
+        assert merge_two_dictionaries(d1, d2, replace_lists=True) == {1: [1, 2], 2: {'a': [4]}, 3: 3}
+        # dictionaries identified by id or name are merged into the full items they identify
+        full = [{'id': 'x1', 'name': 'a', 'state': 'active'}, {'id': 'x2', 'name': 'b', 'state': 'active'}]
+        d1 = {'tags': copy.deepcopy(full)}
+        assert merge_two_dictionaries(d1, {'tags': [{'name': 'b'}, {'name': 'a'}]}, replace_lists=True) == \
+            {'tags': full}
+        d1 = {'tags': copy.deepcopy(full)}
+        assert merge_two_dictionaries(d1, {'tags': [{'name': 'b', 'state': 'deleted'}, {'name': 'c'}]},
+                                      replace_lists=True) == \
+            {'tags': [{'id': 'x2', 'name': 'b', 'state': 'deleted'}, {'name': 'c'}]}
+
     def test_dict_diff(self):
         d1 = {1: 1, 2: 2, 3: 3, 4: {'a': 1, 'b': 'c'}}
         d2 = {4: {'a': 1, 'b': 'c'}, 2: 2, 3: 3, 1: 1}
@@ -33,3 +51,13 @@ class TestDictionary():
         del d1[4]
         diff = dict_diff(d1, d2)
         assert diff == {4: ('<KEYNOTFOUND>', {'a': 1, 'b': 'c'})}
+
+    def test_dict_diff_deep(self):
+        d1 = {1: 1, 2: [1, 2], 3: {'a': 1, 'b': {'c': 2, 'd': 3}}}
+        d2 = {1: 1, 2: [1, 2], 3: {'a': 1, 'b': {'c': 2, 'd': 3}}}
+        assert dict_diff_deep(d1, d2) == {}
+        d2[3]['b']['d'] = 4
+        d2[2] = [2, 1]
+        assert dict_diff_deep(d1, d2) == {2: ([1, 2], [2, 1]), 3: {'b': {'d': (3, 4)}}}
+        del d2[3]['a']
+        assert dict_diff_deep(d1, d2) == {2: ([1, 2], [2, 1]), 3: {'a': (1, '<KEYNOTFOUND>'), 'b': {'d': (3, 4)}}}
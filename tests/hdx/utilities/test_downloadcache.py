@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+"""Download Cache Tests"""
+from os.path import exists, join
+
+from hdx.utilities.downloadcache import DownloadCache
+
+
+class TestDownloadCache():
+    def put(self, cache, url, content, etag=None, last_modified=None):
+        temp_path = cache.get_temp_path(url)
+        with open(temp_path, 'wb') as f:
+            f.write(content)
+        return cache.put(url, temp_path, etag, last_modified)
+
+    def test_get_filename(self):
+        filename = DownloadCache.get_filename('http://lala/data.csv?x=1')
+        assert filename.endswith('.csv')
+        assert len(filename) == 44
+        assert filename != DownloadCache.get_filename('http://lala/data.csv?x=2')
+
+    def test_lru(self, tmpdir):
+        folder = str(tmpdir.join('cache'))
+        cache = DownloadCache(folder, max_bytes=250)
+        assert cache.get_conditional_headers('http://a/1.csv') == {}
+        path = self.put(cache, 'http://a/1.csv', b'1' * 100, '"1"')
+        assert path == join(folder, DownloadCache.get_filename('http://a/1.csv'))
+        self.put(cache, 'http://a/2.csv', b'2' * 100, last_modified='Wed, 21 Oct 2015 07:28:00 GMT')
+        assert cache.get_conditional_headers('http://a/1.csv') == {'If-None-Match': '"1"'}
+        assert cache.get_conditional_headers('http://a/2.csv') == \
+            {'If-Modified-Since': 'Wed, 21 Oct 2015 07:28:00 GMT'}
+        assert cache.record_hit('http://a/1.csv') == path
+        # 2.csv is least recently used so is evicted
+        self.put(cache, 'http://a/3.csv', b'3' * 100, '"3"')
+        assert cache.get_path('http://a/2.csv') is None
+        assert cache.get_path('http://a/1.csv') == path
+        assert cache.get_statistics() == {'entries': 2, 'bytes': 200, 'max_bytes': 250, 'hits': 1, 'misses': 3,
+                                          'revalidations': 2, 'evictions': 1}
+        # too large to cache
+        temp_path = cache.get_temp_path('http://a/4.csv')
+        with open(temp_path, 'wb') as f:
+            f.write(b'4' * 300)
+        assert cache.put('http://a/4.csv', temp_path, '"4"', None) is None
+        assert exists(temp_path)
+        cache.close()
+
+        cache = DownloadCache(folder, max_bytes=250)
+        assert cache.get_path('http://a/3.csv') is not None
+        cache.remove('http://a/3.csv')
+        assert cache.get_path('http://a/3.csv') is None
+        assert cache.record_hit('http://a/3.csv') is None
+        cache.clear()
+        assert not exists(path)
+        assert cache.get_statistics()['entries'] == 0
+        cache.close()
@@ -1,17 +1,126 @@
 #!/usr/bin/env python
 # -*- coding: UTF-8 -*-
 """Downloader Tests"""
+import errno
+import gzip
+import hashlib
+import json
+import os
 import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
 from os import unlink
-from os.path import join, abspath
+from os.path import join, abspath, exists, getsize
+from socketserver import ThreadingMixIn
+from threading import Thread, Lock
 
 import pytest
 
+from hdx.utilities.downloadcache import DownloadCache
 from hdx.utilities.downloader import Download, DownloadError
 from hdx.utilities.path import script_dir
 
 
+class LocalHandler(BaseHTTPRequestHandler):
+    """Serves files from memory. Byte ranges are supported (with ETag and If-Range) unless the path contains
+    noranges. Paths containing ignoreranges advertise ranges but always return the whole file, paths containing drop
+    close the connection half way through the whole file and paths ending in .gz.csv are gzip encoded. GETs of paths
+    containing slow are delayed and the most of them in progress at once is recorded for each Host header."""
+    protocol_version = 'HTTP/1.1'
+    files = dict()
+    requests = list()
+    active = dict()
+    max_active = dict()
+    lock = Lock()
+    last_modified = 'Wed, 21 Oct 2015 07:28:00 GMT'
+
+    def send_content(self, include_body):
+        path = self.path.split('?')[0]
+        content = self.files.get(path)
+        if content is None:
+            self.send_error(404)
+            return
+        self.requests.append((self.command, path, dict(self.headers)))
+        headers = {'Content-Type': 'text/csv'}
+        status = 200
+        if path.endswith('.gz.csv'):
+            content = gzip.compress(content)
+            headers['Content-Encoding'] = 'gzip'
+        elif 'noranges' not in path:
+            etag = '"%s"' % hashlib.md5(content).hexdigest()
+            headers['Accept-Ranges'] = 'bytes'
+            headers['ETag'] = etag
+            headers['Last-Modified'] = self.last_modified
+            if self.headers.get('If-None-Match', self.headers.get('If-Modified-Since')) in (etag, self.last_modified):
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            requested_range = self.headers.get('Range')
+            if requested_range and 'ignoreranges' not in path and self.headers.get('If-Range', etag) == etag:
+                start, end = requested_range.split('=')[1].split('-')
+                start = int(start)
+                end = min(int(end), len(content) - 1) if end else len(content) - 1
+                if start >= len(content):
+                    self.send_error(416)
+                    return
+                headers['Content-Range'] = 'bytes %d-%d/%d' % (start, end, len(content))
+                content = content[start:end + 1]
+                status = 206
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        if not include_body:
+            return
+        if 'drop' in path and status == 200:
+            self.wfile.write(content[:len(content) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(content)
+
+    def do_GET(self):
+        if 'slow' not in self.path:
+            self.send_content(True)
+            return
+        host = self.headers.get('Host')
+        with self.lock:
+            self.active[host] = self.active.get(host, 0) + 1
+            self.max_active[host] = max(self.max_active.get(host, 0), self.active[host])
+        try:
+            time.sleep(0.2)
+            self.send_content(True)
+        finally:
+            with self.lock:
+                self.active[host] -= 1
+
+    def do_HEAD(self):
+        self.send_content(False)
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
 class TestDownloader():
+    content = b''.join(b'C%d,Indicator title %d,%d\n' % (i, i, i * 2) for i in range(5000))
+
+    @pytest.fixture(scope='class')
+    def localurl(self):
+        LocalHandler.files = {'/data.csv': self.content, '/data.gz.csv': self.content,
+                              '/noranges.csv': self.content, '/ignoreranges.csv': self.content,
+                              '/drop.csv': self.content}
+        server = ThreadingServer(('127.0.0.1', 0), LocalHandler)
+        Thread(target=server.serve_forever, daemon=True).start()
+        yield 'http://127.0.0.1:%d/' % server.server_address[1]
+        server.shutdown()
+        server.server_close()
+
     @pytest.fixture
     def fixtureurl(self):
         return 'https://raw.githubusercontent.com/OCHA-DAP/hdx-python-api/master/tests/fixtures/test_data.csv'
@@ -64,3 +173,272 @@ class TestDownloader():
         with Download() as download:
             result = download.download(fixtureurl)
             assert result.headers['Content-Length'] == '479'
+
+    def test_buffered_stream(self, localurl, tmpdir):
+        md5hash = hashlib.md5(self.content).hexdigest()
+        for buffer_size in (1000, 65536, None):
+            for filename in ('data.csv', 'data.gz.csv'):
+                url = '%s%s' % (localurl, filename)
+                with Download(buffer_size=buffer_size) as download:
+                    path = download.download_file(url, str(tmpdir))
+                    with open(path, 'rb') as f:
+                        assert f.read() == self.content
+                    unlink(path)
+                    download.setup_stream(url)
+                    assert download.hash_stream(url) == md5hash
+        with Download() as download:
+            assert download.buffer_size == 1048576
+        with pytest.raises(ValueError):
+            Download(buffer_size=0)
+
+    def test_download_file_segmented(self, localurl, tmpdir):
+        folder = str(tmpdir)
+        with Download(buffer_size=4096) as download:
+            length, validator = download.get_range_support('%sdata.csv' % localurl)
+            assert length == len(self.content)
+            assert validator == '"%s"' % hashlib.md5(self.content).hexdigest()
+            assert download.get_range_support('%snoranges.csv' % localurl) == (None, None)
+            assert download.get_range_support('%sdata.gz.csv' % localurl) == (None, None)
+            assert download.get_range_support('%sNOTEXIST.csv' % localurl) == (None, None)
+
+            LocalHandler.requests.clear()
+            path = download.download_file_segmented('%sdata.csv' % localurl, folder, segments=4,
+                                                    min_segment_size=1000)
+            with open(path, 'rb') as f:
+                assert f.read() == self.content
+            unlink(path)
+            ranges = sorted(headers['Range'] for command, _, headers in LocalHandler.requests if command == 'GET')
+            assert len(ranges) == 4
+            assert ranges[0] == 'bytes=0-%d' % (-(-len(self.content) // 4) - 1)
+
+            for filename in ('noranges.csv', 'ignoreranges.csv', 'data.gz.csv'):
+                LocalHandler.requests.clear()
+                path = download.download_file('%s%s' % (localurl, filename), folder, segments=4)
+                with open(path, 'rb') as f:
+                    assert f.read() == self.content
+                unlink(path)
+                assert len(tmpdir.listdir()) == 0
+
+            # too small for two segments of the default minimum size
+            LocalHandler.requests.clear()
+            path = download.download_file_segmented('%sdata.csv' % localurl, folder)
+            assert [command for command, _, _ in LocalHandler.requests] == ['HEAD', 'GET']
+            unlink(path)
+            with pytest.raises(DownloadError):
+                download.download_file_segmented('%sNOTEXIST.csv' % localurl, folder)
+
+    def test_download_file_resumable(self, localurl, tmpdir):
+        folder = str(tmpdir)
+        url = '%sdrop.csv' % localurl
+        part_path, info_path = Download.get_part_paths(url, folder)
+        urlhash = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        assert part_path == join(folder, 'drop.csv.%s.part' % urlhash)
+        assert info_path == join(folder, 'drop.csv.%s.part.json' % urlhash)
+        otherurl = url.replace('127.0.0.1', 'localhost')
+        assert Download.get_part_paths(otherurl, folder)[0] != part_path
+        urlhash = hashlib.sha1(localurl.encode('utf-8')).hexdigest()
+        assert Download.get_part_paths(localurl, folder)[0] == join(folder, '%s.part' % urlhash)
+        with pytest.raises(ValueError), Download() as download:
+            download.download_file(url, folder, segments=2, resume=True)
+        etag = '"%s"' % hashlib.md5(self.content).hexdigest()
+        with Download(buffer_size=4096) as download:
+            LocalHandler.requests.clear()
+            with pytest.raises(DownloadError):
+                download.download_file_resumable(url, folder, attempts=1)
+            assert getsize(part_path) == len(self.content) // 2
+            with open(info_path) as f:
+                assert json.load(f) == {'url': url, 'validator': etag, 'length': len(self.content)}
+            path = download.download_file(url, folder, resume=True)
+            assert path == join(folder, 'drop.csv')
+            with open(path, 'rb') as f:
+                assert f.read() == self.content
+            assert not exists(part_path)
+            assert not exists(info_path)
+            headers = LocalHandler.requests[-1][2]
+            assert headers['Range'] == 'bytes=%d-' % (len(self.content) // 2)
+            assert headers['If-Range'] == etag
+            unlink(path)
+
+            # retried within one call
+            path = download.download_file_resumable(url, folder, attempts=2)
+            with open(path, 'rb') as f:
+                assert f.read() == self.content
+            unlink(path)
+
+            # file changed since partial download so started again
+            url = '%sdata.csv' % localurl
+            part_path, info_path = Download.get_part_paths(url, folder)
+            with open(part_path, 'wb') as f:
+                f.write(b'changed')
+            with open(info_path, 'w') as f:
+                json.dump({'url': url, 'validator': '"old"', 'length': 1000}, f)
+            LocalHandler.requests.clear()
+            path = download.download_file_resumable(url, folder)
+            with open(path, 'rb') as f:
+                assert f.read() == self.content
+            assert LocalHandler.requests[0][2]['If-Range'] == '"old"'
+            unlink(path)
+
+            # partial file for a different url is discarded
+            with open(part_path, 'wb') as f:
+                f.write(b'other')
+            with open(info_path, 'w') as f:
+                json.dump({'url': 'http://other/data.csv', 'validator': '"old"', 'length': 1000}, f)
+            LocalHandler.requests.clear()
+            path = download.download_file_resumable(url, folder)
+            with open(path, 'rb') as f:
+                assert f.read() == self.content
+            assert 'Range' not in LocalHandler.requests[0][2]
+            unlink(path)
+
+            # no validator so not resumable
+            path = download.download_file_resumable('%snoranges.csv' % localurl, folder)
+            with open(path, 'rb') as f:
+                assert f.read() == self.content
+            unlink(path)
+            with pytest.raises(DownloadError):
+                download.download_file_resumable('%sNOTEXIST.csv' % localurl, folder)
+            assert len(tmpdir.listdir()) == 0
+
+    def test_download_file_cached(self, localurl, tmpdir, monkeypatch):
+        folder = str(tmpdir.mkdir('downloads'))
+        cache = DownloadCache(str(tmpdir.join('cache')), max_bytes=len(self.content) * 2)
+        url = '%sdata.csv' % localurl
+        LocalHandler.files['/changing.csv'] = b'version 1'
+        try:
+            with Download(cache=cache) as download:
+                LocalHandler.requests.clear()
+                path = download.download_file(url, folder)
+                with open(path, 'rb') as f:
+                    assert f.read() == self.content
+                assert 'If-None-Match' not in LocalHandler.requests[-1][2]
+                unlink(path)
+                path = download.download_file(url, folder)
+                assert download.response.status_code == 304
+                assert LocalHandler.requests[-1][2]['If-None-Match'] == '"%s"' % hashlib.md5(self.content).hexdigest()
+                with open(path, 'rb') as f:
+                    assert f.read() == self.content
+                assert cache.get_statistics() == {'entries': 1, 'bytes': len(self.content),
+                                                  'max_bytes': len(self.content) * 2, 'hits': 1, 'misses': 1,
+                                                  'revalidations': 1, 'evictions': 0}
+
+                changing_url = '%schanging.csv' % localurl
+                path = download.download_file(changing_url, folder)
+                LocalHandler.files['/changing.csv'] = b'version 2'
+                path2 = download.download_file(changing_url, folder)
+                assert path2 != path
+                with open(path2, 'rb') as f:
+                    assert f.read() == b'version 2'
+                # served file is a link so deleting it leaves the cache intact
+                unlink(path2)
+                with open(cache.get_path(changing_url), 'rb') as f:
+                    assert f.read() == b'version 2'
+                statistics = cache.get_statistics()
+                assert statistics['misses'] == 3
+                assert statistics['revalidations'] == 2
+
+                # not cacheable without ETag or Last-Modified
+                path = download.download_file('%snoranges.csv' % localurl, folder)
+                with open(path, 'rb') as f:
+                    assert f.read() == self.content
+                assert cache.get_path('%snoranges.csv' % localurl) is None
+                assert cache.get_statistics()['misses'] == 4
+                with pytest.raises(DownloadError):
+                    download.download_file('%sNOTEXIST.csv' % localurl, folder)
+        finally:
+            del LocalHandler.files['/changing.csv']
+            cache.close()
+
+        # a file larger than the cache is moved out of the cache folder even if it is on another filesystem
+        def cross_device(move):
+            def crossing_move(src, dst, *args, **kwargs):
+                if src.startswith(cache_folder) and not dst.startswith(cache_folder):
+                    raise OSError(errno.EXDEV, 'Invalid cross-device link')
+                return move(src, dst, *args, **kwargs)
+            return crossing_move
+
+        cache_folder = str(tmpdir.join('smallcache'))
+        cache = DownloadCache(cache_folder, max_bytes=len(self.content) // 2)
+        monkeypatch.setattr(os, 'rename', cross_device(os.rename))
+        monkeypatch.setattr(os, 'replace', cross_device(os.replace))
+        try:
+            with Download(cache=cache) as download:
+                path = download.download_file(url, folder)
+                with open(path, 'rb') as f:
+                    assert f.read() == self.content
+                assert cache.get_path(url) is None
+                assert cache.get_statistics()['entries'] == 0
+                assert not [name for name in os.listdir(cache_folder) if name.endswith('.tmp')]
+        finally:
+            cache.close()
+
+    def test_hashes(self, localurl, tmpdir):
+        expected = {algorithm: hashlib.new(algorithm, self.content).hexdigest()
+                    for algorithm in ('md5', 'sha1', 'sha256')}
+        for filename in ('data.csv', 'data.gz.csv'):
+            url = '%s%s' % (localurl, filename)
+            with Download(buffer_size=4096) as download:
+                download.setup_stream(url)
+                path, digests = download.stream_file_with_hashes(url, ['md5', 'sha1', 'SHA256'], str(tmpdir))
+                assert digests == expected
+                with open(path, 'rb') as f:
+                    assert f.read() == self.content
+                unlink(path)
+                download.setup_stream(url)
+                assert download.hash_stream(url, ['sha256', 'md5']) == {'sha256': expected['sha256'],
+                                                                         'md5': expected['md5']}
+                download.setup_stream(url)
+                assert download.hash_stream(url, ['sha1']) == {'sha1': expected['sha1']}
+                download.setup_stream(url)
+                assert download.hash_stream(url) == expected['md5']
+                for algorithms in (['notahash'], ['shake_128'], ['md5', 'SHAKE_256']):
+                    with pytest.raises(ValueError):
+                        download.stream_file_with_hashes(url, algorithms, str(tmpdir))
+                    with pytest.raises(ValueError):
+                        download.hash_stream(url, algorithms)
+
+    def test_download_many(self, localurl, tmpdir):
+        otherurl = localurl.replace('127.0.0.1', 'localhost')
+        hosts = [localurl.split('/')[2], otherurl.split('/')[2]]
+        slowfiles = ['/slow%d.csv' % i for i in range(1, 8)]
+        for slowfile in slowfiles:
+            LocalHandler.files[slowfile] = self.content
+        LocalHandler.max_active = dict()
+        folder = str(tmpdir)
+        try:
+            urls = ['%sslow%d.csv' % (localurl, i) for i in range(1, 5)] + \
+                   ['%sslow%d.csv' % (otherurl, i) for i in range(5, 8)] + ['%sNOTEXIST.csv' % localurl]
+            with Download() as download:
+                results = download.download_many(urls, folder, max_workers=8, per_host_limit=2)
+            assert [url for url, _, _ in results] == urls
+            for i, (url, path, error) in enumerate(results[:7], 1):
+                assert error is None
+                assert path == join(folder, 'slow%d.csv' % i)
+                with open(path, 'rb') as f:
+                    assert f.read() == self.content
+            url, path, error = results[7]
+            assert path is None
+            assert isinstance(error, DownloadError)
+            assert LocalHandler.max_active == {hosts[0]: 2, hosts[1]: 2}
+
+            # files yielded as they complete and downloads to the same file name get their own paths
+            urls = ['%sslow1.csv' % otherurl, '%sdata.csv' % localurl, '%sdata.csv' % localurl,
+                    '%sdata.csv' % otherurl]
+            subfolder = tmpdir.mkdir('many')
+            with Download() as download:
+                completed = list(download.iter_download_many(urls, str(subfolder)))
+            assert [index for index, _, _, _ in completed][-1] == 0
+            assert sorted(index for index, _, _, _ in completed) == [0, 1, 2, 3]
+            paths = [path for _, _, path, _ in completed[:3]]
+            assert sorted(paths) == [join(str(subfolder), filename)
+                                     for filename in ('data.csv', 'data1.csv', 'data2.csv')]
+            for path in paths:
+                with open(path, 'rb') as f:
+                    assert f.read() == self.content
+            with pytest.raises(ValueError), Download() as download:
+                download.download_many(urls, folder, max_workers=0)
+            with pytest.raises(ValueError), Download() as download:
+                download.download_many(urls, folder, per_host_limit=0)
+        finally:
+            for slowfile in slowfiles:
+                del LocalHandler.files[slowfile]
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+"""Row Snapshot Tests"""
+from hdx.utilities.rowsnapshot import RowSnapshot
+
+
+class TestRowSnapshot():
+    def test_get_hash(self):
+        assert RowSnapshot.get_hash({'a': '1', 'b': '2'}) == RowSnapshot.get_hash({'b': '2', 'a': '1'})
+        assert RowSnapshot.get_hash({'a': '1', 'b': '2'}) != RowSnapshot.get_hash({'a': '1', 'b': '3'})
+        assert RowSnapshot.get_hash({'a': '1', 'b': '2'}) != RowSnapshot.get_hash({'a': '1\x1fb', 'b': '2'})
+        assert len(RowSnapshot.get_hash({'a': '1'})) == 8
+
+    def test_changed_rows(self, tmpdir):
+        path = str(tmpdir.join('snapshot.db'))
+        snapshot = RowSnapshot(path, batch_size=3)
+        rows = [{'code': 'C%d' % i, 'value': str(i)} for i in range(10)]
+        assert list(snapshot.changed_rows(rows, 'code')) == rows
+        assert list(snapshot.deleted_keys()) == []
+        assert len(snapshot) == 0
+        snapshot.commit()
+        assert len(snapshot) == 10
+        snapshot.set_meta('primary_key', 'code')
+        snapshot.close()
+
+        snapshot = RowSnapshot(path, batch_size=3)
+        assert snapshot.get_meta('primary_key') == 'code'
+        assert snapshot.get_meta('resource_id') is None
+        rows[2]['value'] = 'changed'
+        del rows[5]
+        del rows[7]
+        rows.append({'code': 'NEW', 'value': '1'})
+        changed = list(snapshot.changed_rows(iter(rows), 'code'))
+        assert [row['code'] for row in changed] == ['C2', 'NEW']
+        assert snapshot.number_rows == 9
+        assert snapshot.number_changed == 2
+        assert [key for keys in snapshot.deleted_keys() for key in keys] == ['C5', 'C8']
+        # not committed so snapshot unchanged
+        snapshot.close()
+
+        snapshot = RowSnapshot(path, batch_size=3)
+        assert len(list(snapshot.changed_rows(iter(rows), 'code'))) == 2
+        snapshot.commit()
+        assert list(snapshot.changed_rows(iter(rows), 'code')) == []
+        assert list(snapshot.deleted_keys()) == []
+        snapshot.clear()
+        assert len(snapshot) == 0
+        snapshot.close()
+
+    def test_composite_key(self):
+        snapshot = RowSnapshot(':memory:', batch_size=3)
+        assert RowSnapshot.get_key_fields('code, date') == ['code', 'date']
+        rows = [{'code': 'C%d' % (i // 2), 'date': '2017-0%d' % (i % 2 + 1), 'value': str(i)} for i in range(8)]
+        assert list(snapshot.changed_rows(rows, 'code,date')) == rows
+        snapshot.commit()
+        rows[3]['value'] = 'changed'
+        del rows[4]
+        del rows[0]
+        assert list(snapshot.changed_rows(rows, 'code,date')) == [rows[2]]
+        assert [key for keys in snapshot.deleted_keys('code,date') for key in keys] == [('C0', '2017-01'),
+                                                                                         ('C2', '2017-01')]
+        snapshot.close()
+
+    def test_lookup_variables(self):
+        snapshot = RowSnapshot(':memory:')
+        assert snapshot.batch_size <= RowSnapshot.max_variables
+        snapshot.close()
+        # batches larger than the number of SQL variables allowed are looked up in several queries
+        snapshot = RowSnapshot(':memory:', batch_size=5)
+        snapshot.max_variables = 2
+        rows = [{'code': 'C%d' % i, 'value': str(i)} for i in range(7)]
+        assert list(snapshot.changed_rows(rows, 'code')) == rows
+        snapshot.commit()
+        rows[4]['value'] = 'changed'
+        assert list(snapshot.changed_rows(rows, 'code')) == [rows[4]]
+        snapshot.close()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+"""Row Source Tests"""
+import io
+import zipfile
+from datetime import datetime
+
+import openpyxl
+import pytest
+
+from hdx.utilities.rowsource import RowSource, RowSourceError, read_csv, read_xlsx, read_zip, read_jsonl
+
+
+class TestRowSource():
+    @pytest.fixture(scope='function')
+    def xlsx_path(self, tmpdir):
+        path = str(tmpdir.join('data.xlsx'))
+        workbook = openpyxl.Workbook(write_only=True)
+        worksheet = workbook.create_sheet('Data')
+        worksheet.append(['code', 'value', 'date', None])
+        worksheet.append(['C1', 1, datetime(2017, 1, 2, 3, 4, 5)])
+        worksheet.append([None, None, None])
+        worksheet.append(['C2', 2.5, None, 'ignored'])
+        workbook.save(path)
+        return path
+
+    def test_get_format(self):
+        assert RowSource.get_format('CSV') == 'csv'
+        assert RowSource.get_format('XLSX') == 'xlsx'
+        assert RowSource.get_format('zipped csv') == 'zip'
+        assert RowSource.get_format('text/csv') == 'csv'
+        assert RowSource.get_format('http://test-data.humdata.org/resource2_csv.zip') == 'zip'
+        assert RowSource.get_format('http://x/y.jsonl?download=1') == 'jsonl'
+        assert RowSource.get_format('/tmp/data.csv.zip') == 'zip'
+        assert RowSource.get_format('/tmp/Data.XLSM') == 'xlsx'
+        assert RowSource.get_format('PDF') is None
+        assert RowSource.get_format(None) is None
+        assert RowSource.get_reader(None, 'PDF', 'http://x/y.xlsx') == read_xlsx
+        assert RowSource.get_reader('json lines', 'y.xlsx') == read_jsonl
+        assert RowSource.get_reader(None, 'unknown') == read_csv
+
+    def test_register(self):
+        readers = dict(RowSource.readers)
+        try:
+            RowSource.register('TSV', read_csv)
+            assert RowSource.get_format('data.tsv') == 'tsv'
+            assert RowSource.get_reader('tsv') == read_csv
+        finally:
+            RowSource.readers = readers
+
+    def test_read_csv(self, tmpdir):
+        path = str(tmpdir.join('data.csv'))
+        with open(path, 'wb') as f:
+            f.write('﻿code,value\r\nC1,"1,5"\r\nC2,é\r\n'.encode('utf-8'))
+        with read_csv(path) as (fieldnames, rows):
+            assert fieldnames == ['code', 'value']
+            assert [dict(row) for row in rows] == [{'code': 'C1', 'value': '1,5'}, {'code': 'C2', 'value': 'é'}]
+
+    def test_read_xlsx(self, xlsx_path, tmpdir):
+        with read_xlsx(xlsx_path) as (fieldnames, rows):
+            assert fieldnames == ['code', 'value', 'date']
+            assert list(rows) == [{'code': 'C1', 'value': 1, 'date': '2017-01-02T03:04:05'},
+                                  {'code': 'C2', 'value': 2.5, 'date': None}]
+        with read_xlsx(xlsx_path, 'Data') as (fieldnames, rows):
+            assert len(list(rows)) == 2
+        with pytest.raises(KeyError):
+            with read_xlsx(xlsx_path, 'NOTEXIST'):
+                pass
+        path = str(tmpdir.join('corrupt.xlsx'))
+        with open(path, 'w') as f:
+            f.write('code,value\n')
+        with pytest.raises(Exception):
+            with read_xlsx(path):
+                pass
+
+    def test_read_jsonl(self, tmpdir):
+        path = str(tmpdir.join('data.jsonl'))
+        with open(path, 'w') as f:
+            f.write('{"code": "C1", "value": 1}\n\n{"code": "C2", "value": null}\n')
+        with read_jsonl(path) as (fieldnames, rows):
+            assert fieldnames == ['code', 'value']
+            assert list(rows) == [{'code': 'C1', 'value': 1}, {'code': 'C2', 'value': None}]
+        with open(path, 'w') as f:
+            f.write('{"value": 1, "code": "C1"}\n{"code": "C2", "value": 2, "extra": 3}\n')
+        with read_jsonl(path) as (fieldnames, rows):
+            assert fieldnames == ['code', 'value']
+            assert len(list(rows)) == 2
+        with read_jsonl(path, ['code', 'value', 'extra']) as (fieldnames, rows):
+            assert fieldnames == ['code', 'value', 'extra']
+        with open(path, 'w') as f:
+            f.write('{"code": "C1"}\n[1, 2]\n')
+        with read_jsonl(path) as (fieldnames, rows):
+            with pytest.raises(RowSourceError):
+                list(rows)
+        with open(path, 'w') as f:
+            f.write('')
+        with read_jsonl(path) as (fieldnames, rows):
+            assert fieldnames == []
+            assert list(rows) == []
+
+    def test_read_zip(self, tmpdir):
+        path = str(tmpdir.join('data.zip'))
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr('__MACOSX/._data.csv', b'junk')
+            zf.writestr('README.txt', b'readme')
+            zf.writestr('folder/', b'')
+            zf.writestr('folder/data.csv', 'code,value\nC1,1\nC2,2\n')
+        with read_zip(path) as (fieldnames, rows):
+            assert fieldnames == ['code', 'value']
+            assert [dict(row) for row in rows] == [{'code': 'C1', 'value': '1'}, {'code': 'C2', 'value': '2'}]
+        with zipfile.ZipFile(path, 'w') as zf:
+            zf.writestr('data.jsonl', '{"code": "C1"}\n')
+        with read_zip(path) as (fieldnames, rows):
+            assert list(rows) == [{'code': 'C1'}]
+        with zipfile.ZipFile(path, 'w') as zf:
+            zf.writestr('README.txt', b'readme')
+        with pytest.raises(RowSourceError):
+            with read_zip(path):
+                pass
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+"""Type Inference Tests"""
+import csv
+from os.path import join
+
+import pytest
+
+from hdx.utilities.loader import load_yaml
+from hdx.utilities.path import script_dir_plus_file
+from hdx.utilities.typeinference import TypeInferrer, coerce_column, coerce_column_lenient, coerce_rows
+
+
+class TestTypeInference():
+    def test_infer_schema(self):
+        rows = [{'code': 'C1', 'count': '1', 'value': '1.5', 'date': '2016-06-01', 'flag': 'true', 'empty': '',
+                 'year': '2016', 'mixed': '1'},
+                {'code': 'C2', 'count': ' 22 ', 'value': '2', 'date': '2016-06-02 12:30:00', 'flag': 'False',
+                 'empty': None, 'year': '2017', 'mixed': 'x'},
+                {'code': 'C3', 'count': '', 'value': '-3e2', 'date': '', 'flag': 'T', 'empty': '', 'year': '2018',
+                 'mixed': '2'}]
+        fieldnames = ['code', 'count', 'value', 'date', 'flag', 'empty', 'year', 'mixed']
+        schema = TypeInferrer.infer_schema(rows, fieldnames, batch_size=2)
+        assert schema == [{'id': 'code', 'type': 'text'}, {'id': 'count', 'type': 'int'},
+                          {'id': 'value', 'type': 'float'}, {'id': 'date', 'type': 'timestamp'},
+                          {'id': 'flag', 'type': 'bool'}, {'id': 'empty', 'type': 'text'},
+                          {'id': 'year', 'type': 'int'}, {'id': 'mixed', 'type': 'text'}]
+        inferrer = TypeInferrer(['value'])
+        inferrer.update([{'value': '1'}])
+        assert inferrer.get_type('value') == 'int'
+        inferrer.update([{'value': '1.5'}])
+        assert inferrer.get_type('value') == 'float'
+        inferrer.update([{'value': 'nan'}])
+        assert inferrer.get_type('value') == 'text'
+        inferrer.update([{'value': '1'}])
+        assert inferrer.get_type('value') == 'text'
+        assert inferrer.number_rows == 4
+        # integers are not years and non ASCII values are text
+        assert TypeInferrer.infer_schema([{'a': '20160601', 'b': 'today', 'c': 'caf\u00e9'}], ['a', 'b', 'c']) == [
+            {'id': 'a', 'type': 'int'}, {'id': 'b', 'type': 'text'}, {'id': 'c', 'type': 'text'}]
+        # NumPy accepts underscores in numbers but they are text
+        assert TypeInferrer.infer_schema([{'a': '1_000', 'b': '1_000.5', 'c': '1000'}], ['a', 'b', 'c']) == [
+            {'id': 'a', 'type': 'text'}, {'id': 'b', 'type': 'text'}, {'id': 'c', 'type': 'int'}]
+        # codes with leading zeros keep their zeros
+        rows = [{'pcode': '00123', 'signed': '-012', 'zero': '0', 'fraction': '0.5'},
+                {'pcode': '456', 'signed': '1', 'zero': '10', 'fraction': '1.5'}]
+        assert TypeInferrer.infer_schema(rows, ['pcode', 'signed', 'zero', 'fraction']) == [
+            {'id': 'pcode', 'type': 'text'}, {'id': 'signed', 'type': 'text'}, {'id': 'zero', 'type': 'int'},
+            {'id': 'fraction', 'type': 'float'}]
+        # integers too large for int64 would lose precision as floats
+        rows = [{'big': '99999999999999999999', 'max': '9223372036854775807', 'mixed': '1.5'},
+                {'big': '1', 'max': '-9223372036854775808', 'mixed': '-99999999999999999999'}]
+        assert TypeInferrer.infer_schema(rows, ['big', 'max', 'mixed']) == [
+            {'id': 'big', 'type': 'text'}, {'id': 'max', 'type': 'int'}, {'id': 'mixed', 'type': 'text'}]
+
+    def test_topline(self):
+        topline = load_yaml(script_dir_plus_file(join('..', 'hdx_datasource_topline.yml'), TypeInferrer))
+        rows = [{'code': 'code%d' % i, 'title': 'Title %d' % i, 'value': '%d.5' % i,
+                 'latest_date': '2016-06-%02d' % (i + 1), 'source': 'Source', 'source_link': 'http://lala',
+                 'notes': '', 'explore': '', 'units': 'ratio'} for i in range(10)]
+        fieldnames = [field['id'] for field in topline['schema']]
+        assert TypeInferrer.infer_schema(rows, fieldnames) == topline['schema']
+        with open(join('fixtures', 'test_data.csv')) as f:
+            reader = csv.DictReader(f)
+            schema = TypeInferrer.infer_schema(reader, reader.fieldnames)
+        assert [field['type'] for field in schema] == ['text', 'text', 'text', 'int']
+
+    def test_coerce(self):
+        assert coerce_column(['1', ' 2', '', None], 'int') == [1, 2, None, None]
+        assert coerce_column(['1.5', '2'], 'float') == [1.5, 2.0]
+        assert coerce_column(['yes', 'F'], 'bool') == [True, False]
+        assert coerce_column([' 2016-06-01 ', ''], 'timestamp') == ['2016-06-01', None]
+        assert coerce_column(['a', ''], 'text') == ['a', '']
+        assert type(coerce_column(['1'], 'int8')[0]) == int
+        assert coerce_column([1, '2', 3.0], 'float') == [1.0, 2.0, 3.0]
+        assert coerce_column([None, ''], 'int') == [None, None]
+        assert coerce_column([], 'float') == []
+        with pytest.raises(ValueError):
+            coerce_column(['1', '1.5'], 'int')
+        with pytest.raises(ValueError):
+            coerce_column(['inf'], 'float')
+        with pytest.raises(ValueError):
+            coerce_column(['maybe'], 'bool')
+        with pytest.raises(ValueError):
+            coerce_column(['2016-06-01', '06/01/2016'], 'timestamp')
+        with pytest.raises(ValueError):
+            coerce_column([2.5], 'int')
+        with pytest.raises(ValueError):
+            coerce_column(['1_000'], 'int')
+        with pytest.raises(ValueError):
+            coerce_column(['1', '9223372036854775808'], 'int')
+        assert coerce_column_lenient(['1', '-9223372036854775809'], 'int') == ([1, None], ['-9223372036854775809'])
+        rows = [{'code': 'C1', 'value': '1.5'}, {'code': 'C2', 'value': ''}]
+        schema = [{'id': 'code', 'type': 'text'}, {'id': 'value', 'type': 'float'}]
+        assert coerce_rows(rows, schema) == [{'code': 'C1', 'value': 1.5}, {'code': 'C2', 'value': None}]
+        with pytest.raises(ValueError) as e:
+            coerce_rows([{'code': 'C1', 'value': 'x'}], schema)
+        assert 'value' in str(e.value)
+        rows = [{'code': 'C1', 'value': '1.5'}, {'code': 'C2', 'value': 'x'}, {'code': 'C3', 'value': ' '}]
+        assert coerce_rows(rows, schema, strict=False) == [{'code': 'C1', 'value': 1.5}, {'code': 'C2', 'value': None},
+                                                           {'code': 'C3', 'value': None}]
+        assert coerce_column_lenient(['1', 'n/a', None], 'int') == ([1, None, None], ['n/a'])